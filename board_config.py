@@ -131,7 +131,12 @@ try:
 except ImportError:
 	wifi_type = None  # support dmcomm-python by itself
 if wifi_type == "picow":
-	from wificom.wifi_picow import Wifi as WifiCls
+	def WifiCls():  # pylint: disable=invalid-name
+		'''
+		Import the WiFi module when first needed, so other modes start faster.
+		'''
+		from wificom.wifi_picow import Wifi  # pylint: disable=import-outside-toplevel
+		return Wifi()
 elif wifi_type == "nina":
 	from wificom.wifi_nina import Wifi as WifiCls
 else:
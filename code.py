@@ -3,8 +3,11 @@ code.py
 WiFiCom on supported boards (see board_config.py).
 '''
 
-import pwmio
-import board_config
+from wificom import boot_profile
+boot_profile.start()
+import pwmio  # pylint: disable=wrong-import-position
+import board_config  # pylint: disable=wrong-import-position
+boot_profile.step("import board_config")
 
 # Light LED dimly here so it comes on as soon as possible.
 led_pwm = pwmio.PWMOut(board_config.led_pin,
@@ -0,0 +1,69 @@
+'''
+boot_profile.py
+Records the time and heap used by each step of startup.
+'''
+
+import gc
+import time
+
+_steps = []  # (name, seconds, bytes)
+_time_start = None
+_time_last = None
+_free_last = None
+
+def start():
+	'''
+	Start (or restart) timing from now.
+	'''
+	global _time_start, _time_last, _free_last  #pylint:disable=global-statement
+	_steps.clear()
+	_time_start = time.monotonic()
+	_time_last = _time_start
+	_free_last = gc.mem_free()
+
+def step(name):
+	'''
+	Record and print the time and heap used since the previous step.
+	Heap is not collected first, so includes garbage.
+	'''
+	global _time_last, _free_last  #pylint:disable=global-statement
+	if _time_start is None:
+		start()
+	now = time.monotonic()
+	free = gc.mem_free()
+	item = (name, now - _time_last, _free_last - free)
+	_steps.append(item)
+	_time_last = now
+	_free_last = free
+	print(_format(item))
+
+def _format(item):
+	(name, seconds, used) = item
+	return f"Boot {name}: {seconds * 1000:.0f}ms {used}B"
+
+def total():
+	'''
+	Seconds since start.
+	'''
+	return _time_last - _time_start
+
+def lines():
+	'''
+	Return the steps as text lines, then the total.
+	'''
+	result = [_format(item) for item in _steps]
+	result.append(f"Boot total: {total() * 1000:.0f}ms, {_free_last}B free")
+	return result
+
+def save(filename):
+	'''
+	Write the profile to a file. Return True if successful.
+	'''
+	try:
+		with open(filename, "w", encoding="utf-8") as f:
+			for line in lines():
+				f.write(line + "\r\n")
+		return True
+	except OSError as e:
+		print("Cannot write boot profile: " + repr(e))
+		return False
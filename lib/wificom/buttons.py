@@ -0,0 +1,117 @@
+'''
+buttons.py
+Turns button readings into debounced press/release/long-press/repeat events.
+'''
+
+import time
+
+PRESS = "press"
+RELEASE = "release"
+LONG_PRESS = "long"
+REPEAT = "repeat"
+
+DEBOUNCE_TIME = 0.02
+LONG_PRESS_TIME = 1
+REPEAT_DELAY = 0.5
+REPEAT_INTERVAL = 0.15
+SCAN_INTERVAL = 0.01
+QUEUE_SIZE = 8
+
+class _Button:  #pylint:disable=too-few-public-methods
+	'''
+	State of one button.
+	'''
+	def __init__(self, pressed, now):
+		self.raw = pressed
+		self.raw_time = now
+		self.pressed = pressed
+		self.pressed_time = now
+		self.long_sent = True  # no long press or repeat for a button held at the start
+		self.next_repeat = None
+
+class ButtonEvents:
+	'''
+	Scans buttons with `is_pressed(name)` and queues events as (name, kind) tuples,
+	where kind is PRESS, RELEASE, LONG_PRESS (once, after holding for LONG_PRESS_TIME)
+	or REPEAT (while held, after REPEAT_DELAY then every REPEAT_INTERVAL).
+
+	A change only counts once the reading has been stable for DEBOUNCE_TIME.
+	Buttons which are held when scanning starts, or at `clear`, must be released first.
+	'''
+	def __init__(self, is_pressed, names, clock=None, sleep=None):
+		self._is_pressed = is_pressed
+		self._names = names
+		self._clock = time.monotonic if clock is None else clock
+		self._sleep = time.sleep if sleep is None else sleep
+		self._queue = []
+		self._buttons = {}
+		self.dropped = 0
+		self.clear()
+	def clear(self):
+		'''
+		Discard queued events and take the current state as the starting point.
+		'''
+		self._queue.clear()
+		now = self._clock()
+		for name in self._names:
+			self._buttons[name] = _Button(self._is_pressed(name), now)
+	def _put(self, name, kind):
+		if len(self._queue) >= QUEUE_SIZE:
+			self._queue.pop(0)
+			self.dropped += 1
+		self._queue.append((name, kind))
+	def scan(self):
+		'''
+		Read the buttons once and queue any events.
+		'''
+		for name in self._names:
+			button = self._buttons[name]
+			raw = self._is_pressed(name)
+			now = self._clock()
+			if raw != button.raw:
+				button.raw = raw
+				button.raw_time = now
+			if raw != button.pressed and now - button.raw_time >= DEBOUNCE_TIME:
+				button.pressed = raw
+				if raw:
+					button.pressed_time = now
+					button.long_sent = False
+					button.next_repeat = now + REPEAT_DELAY
+					self._put(name, PRESS)
+				else:
+					self._put(name, RELEASE)
+			elif button.pressed:
+				if not button.long_sent and now - button.pressed_time >= LONG_PRESS_TIME:
+					button.long_sent = True
+					self._put(name, LONG_PRESS)
+				if button.next_repeat is not None and now >= button.next_repeat:
+					button.next_repeat = max(button.next_repeat + REPEAT_INTERVAL, now)
+					self._put(name, REPEAT)
+	def get(self):
+		'''
+		Scan, then return the oldest event, or None if there is none.
+		'''
+		self.scan()
+		if len(self._queue) == 0:
+			return None
+		return self._queue.pop(0)
+	def wait(self, timeout=None):
+		'''
+		Return the next event, sleeping between scans, or None after `timeout` seconds.
+		'''
+		time_start = self._clock()
+		while True:
+			event = self.get()
+			if event is not None:
+				return event
+			if timeout is not None and self._clock() - time_start >= timeout:
+				return None
+			self._sleep(SCAN_INTERVAL)
+	def held(self, name):
+		'''
+		Seconds that `name` has been held down (debounced), or 0 if not.
+		'''
+		button = self._buttons[name]
+		if not button.pressed:
+			return 0
+		return self._clock() - button.pressed_time
@@ -0,0 +1,125 @@
+'''
+console.py
+Buffered console output, so that a slow or absent USB host can't stall the main loop.
+
+Lines are queued in a fixed-size buffer and `pump` writes as much as the host takes
+without waiting, once per loop. Under back-pressure:
+* a line repeating the previous one, while that is still queued, is counted instead,
+	and the count is shown when a different line arrives;
+* a line which doesn't fit in the buffer is dropped, and the number dropped is shown
+	once there is room again.
+Notes of repeats and drops are queued before the next line, or by `pump`.
+'''
+
+import time
+
+BUFFER_SIZE = 1024
+FLUSH_TIMEOUT = 1
+
+class BufferedConsole:
+	'''
+	Queues lines for `write(data)`, which writes bytes to the host without blocking
+	and returns how many it took (or None for none).
+	'''
+	def __init__(self, write, size=BUFFER_SIZE, clock=None, sleep=None):
+		self._write = write
+		self._size = size
+		self._clock = time.monotonic if clock is None else clock
+		self._sleep = time.sleep if sleep is None else sleep
+		self._buffer = bytearray()
+		self._last_line = None
+		self._repeats = 0
+		self._dropped_pending = 0
+		self.lines = 0
+		self.written = 0
+		self.coalesced = 0
+		self.dropped = 0
+		self.pumps = 0
+		self.pump_time = 0
+		self.max_pump_time = 0
+	def __len__(self):
+		return len(self._buffer)
+	def _fits(self, data):
+		return len(self._buffer) + len(data) <= self._size
+	def _queue_notes(self):
+		'''
+		Queue the notes of repeated and dropped lines, if any and if they fit.
+		Return True if none are left.
+		'''
+		if self._repeats > 0:
+			data = f"(repeated {self._repeats} times)\r\n".encode("utf-8")
+			if not self._fits(data):
+				return False
+			self._buffer.extend(data)
+			self._repeats = 0
+		if self._dropped_pending > 0:
+			data = f"({self._dropped_pending} lines dropped)\r\n".encode("utf-8")
+			if not self._fits(data):
+				return False
+			self._buffer.extend(data)
+			self._dropped_pending = 0
+		return True
+	def put(self, text):
+		'''
+		Queue a line of text.
+		'''
+		self.lines += 1
+		if text == self._last_line:
+			self._repeats += 1
+			self.coalesced += 1
+			return
+		data = text.encode("utf-8") + b"\r\n"
+		if self._queue_notes() and self._fits(data):
+			self._buffer.extend(data)
+			self._last_line = text
+			return
+		# Notes go before the next line, so if they don't fit, neither does the line
+		self._last_line = None
+		self.dropped += 1
+		self._dropped_pending += 1
+	def print(self, *args):
+		'''
+		Queue the arguments as a line, like `print`.
+		'''
+		self.put(" ".join(str(arg) for arg in args))
+	def pump(self):
+		'''
+		Write as much of the queue as the host takes now. Return the number of bytes written.
+		'''
+		self._queue_notes()
+		if len(self._buffer) == 0:
+			return 0
+		time_start = self._clock()
+		count = self._write(self._buffer)
+		if count is None:
+			count = 0
+		del self._buffer[0:count]
+		self.written += count
+		if len(self._buffer) == 0:
+			self._last_line = None  # Keeping up, so show the next line even if the same
+		elapsed = self._clock() - time_start
+		self.pumps += 1
+		self.pump_time += elapsed
+		if elapsed > self.max_pump_time:
+			self.max_pump_time = elapsed
+		return count
+	def flush(self, timeout=FLUSH_TIMEOUT):
+		'''
+		Pump until the queue is empty, or `timeout` seconds have passed.
+		Return True if emptied.
+		'''
+		time_start = self._clock()
+		while True:
+			self.pump()
+			if len(self._buffer) == 0:
+				return True
+			if self._clock() - time_start >= timeout:
+				return False
+			self._sleep(0.01)
+	def stats(self):
+		'''
+		Return a short text summary.
+		'''
+		mean = self.pump_time / self.pumps if self.pumps > 0 else 0
+		return (f"Console: {self.lines} lines, {self.coalesced} coalesced, {self.dropped} dropped,"
+			+ f" {self.written} bytes; write mean {mean:.4f}s max {self.max_pump_time:.4f}s")
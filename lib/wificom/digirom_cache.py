@@ -0,0 +1,82 @@
+'''
+digirom_cache.py
+Keeps recently parsed DigiROMs, so repeated commands are not parsed again.
+'''
+
+class DigiROMCache:
+	'''
+	Least-recently-used cache of up to `size` commands parsed with `parse(text)`.
+
+	A cached command is handed out again with its result cleared.
+	Execution prepares a new result, so earlier results which are still referenced
+	are not affected, but the same object is shared by everyone parsing the same text.
+	'''
+	def __init__(self, parse, size=8):
+		self._parse = parse
+		self._size = size
+		self._keys = []  # least recently used first
+		self._commands = {}
+		self.hits = 0
+		self.misses = 0
+	def __len__(self):
+		return len(self._keys)
+	def parse(self, text):
+		'''
+		Return the parsed command for `text`. Parse errors are raised and not cached.
+		'''
+		command = self._commands.get(text)
+		if command is not None:
+			self.hits += 1
+			if self._keys[-1] != text:
+				self._keys.remove(text)
+				self._keys.append(text)
+			command.result = None
+			return command
+		self.misses += 1
+		command = self._parse(text)
+		if len(self._keys) >= self._size:
+			del self._commands[self._keys.pop(0)]
+		self._keys.append(text)
+		self._commands[text] = command
+		return command
+	def clear(self):
+		'''
+		Forget all cached commands.
+		'''
+		self._keys.clear()
+		self._commands.clear()
+	def stats(self):
+		'''
+		Counters as a dictionary.
+		'''
+		return {
+			"size": len(self._keys),
+			"hits": self.hits,
+			"misses": self.misses,
+		}
+
+_cache = None
+
+def parse_command(text):
+	'''
+	Parse a dmcomm command through the shared cache, importing the parser on first use.
+	'''
+	global _cache  #pylint:disable=global-statement
+	if _cache is None:
+		import dmcomm.protocol  #pylint:disable=import-outside-toplevel
+		_cache = DigiROMCache(dmcomm.protocol.parse_command)
+	return _cache.parse(text)
+
+def stats():
+	'''
+	Counters of the shared cache as a dictionary.
+	'''
+	if _cache is None:
+		return {"size": 0, "hits": 0, "misses": 0}
+	return _cache.stats()
+
+def toml():
+	'''
+	Counters of the shared cache as TOML lines.
+	'''
+	return "\r\n".join(f"digirom_cache_{key} = {value}" for (key, value) in stats().items())
@@ -0,0 +1,122 @@
+'''
+heap_metrics.py
+Samples free memory in the main loops, to help diagnose fragmentation.
+
+`sample` is cheap enough to call on every loop iteration: it updates the running
+minimums and GC count each time, and records into a fixed-size ring at most once
+per RECORD_INTERVAL seconds. CircuitPython has no API for these, so:
+* collections are counted as the times free memory went up between calls;
+* the largest free block is found by trial allocation, on every LARGEST_EVERY-th record.
+'''
+
+import array
+import gc
+import time
+
+RING_SIZE = 32
+RECORD_INTERVAL = 1
+LARGEST_EVERY = 8
+
+_times = array.array("f", [0] * RING_SIZE)
+_free = array.array("I", [0] * RING_SIZE)
+_largest = array.array("I", [0] * RING_SIZE)
+_gcs = array.array("I", [0] * RING_SIZE)
+_modes = bytearray(RING_SIZE)
+
+class _State:  #pylint:disable=too-few-public-methods
+	'''
+	Running values.
+	'''
+	def __init__(self):
+		self.count = 0  # samples recorded in ring
+		self.next_record = 0
+		self.last_free = None
+		self.last_largest = 0
+		self.gcs = 0
+		self.min_free = None
+		self.min_largest = None
+
+_state = _State()
+
+def largest_block(upper=None):
+	'''
+	Find roughly the largest block we can allocate, in bytes, by binary search.
+	'''
+	low = 0
+	high = gc.mem_free() if upper is None else upper
+	while high - low > 64:
+		size = (low + high) // 2
+		try:
+			block = bytearray(size)
+			del block
+			low = size
+		except MemoryError:
+			high = size
+	return low
+
+def sample(mode):
+	'''
+	Take a sample in `mode` (a one-character string such as modes.MODE_WIFI).
+	'''
+	free = gc.mem_free()
+	if _state.last_free is not None and free > _state.last_free:
+		_state.gcs += 1
+	_state.last_free = free
+	if _state.min_free is None or free < _state.min_free:
+		_state.min_free = free
+	now = time.monotonic()
+	if now < _state.next_record:
+		return
+	_state.next_record = now + RECORD_INTERVAL
+	if _state.count % LARGEST_EVERY == 0:
+		_state.last_largest = largest_block(free)
+		_state.last_free = gc.mem_free()
+		if _state.min_largest is None or _state.last_largest < _state.min_largest:
+			_state.min_largest = _state.last_largest
+	i = _state.count % RING_SIZE
+	_times[i] = now
+	_free[i] = free
+	_largest[i] = _state.last_largest
+	_gcs[i] = _state.gcs
+	_modes[i] = ord(mode)
+	_state.count += 1
+
+def summary():
+	'''
+	Latest and minimum figures as a dictionary.
+	'''
+	return {
+		"free": _state.last_free,
+		"min_free": _state.min_free,
+		"largest": _state.last_largest,
+		"min_largest": _state.min_largest,
+		"gcs": _state.gcs,
+	}
+
+def samples(count=RING_SIZE):
+	'''
+	Up to `count` latest recorded samples, oldest first, as [(time, mode, free, largest, gcs)].
+	'''
+	first = max(0, _state.count - min(count, RING_SIZE))
+	result = []
+	for n in range(first, _state.count):
+		i = n % RING_SIZE
+		result.append((_times[i], chr(_modes[i]), _free[i], _largest[i], _gcs[i]))
+	return result
+
+def toml():
+	'''
+	Summary as TOML lines.
+	'''
+	return "\r\n".join(f"heap_{key} = {value}" for (key, value) in summary().items()
+		if value is not None)
+
+def lines(count=RING_SIZE):
+	'''
+	Summary and up to `count` latest samples as text lines, for the log.
+	'''
+	result = [" ".join(f"{key}={value}" for (key, value) in summary().items())]
+	result.append("Heap samples (time mode free largest gcs):")
+	for (sample_time, mode, free, largest, gcs) in samples(count):
+		result.append(f"{sample_time:.1f} {mode} {free} {largest} {gcs}")
+	return result
@@ -0,0 +1,233 @@
+'''
+log.py
+Leveled log, kept in a ring buffer in RAM and written to flash in batches.
+
+Logging is cheap enough for the main loops: a record below the level is dropped straight away,
+and otherwise the time, level, message and arguments go into a fixed-size ring.
+The message is only formatted with its arguments (`message % args`) when the record
+is echoed to the console, written to the file or dumped.
+
+* Records at the console level and above are echoed to the console as they are logged.
+* Records at the file level and above are appended to the log file by `flush`,
+	at most once per FLUSH_INTERVAL seconds unless forced.
+	The file moves on to the next of SEGMENTS files when it reaches SEGMENT_SIZE bytes.
+* Records below ERROR are dropped when logged faster than RATE_LIMIT per second,
+	after a burst of up to RATE_BURST, so that a loop going wrong can't flood the ring.
+'''
+
+import array
+import os
+import time
+
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+
+LEVEL_NAMES = {DEBUG: "D", INFO: "I", WARNING: "W", ERROR: "E"}
+
+RING_SIZE = 64
+FLUSH_INTERVAL = 60
+SEGMENT_SIZE = 4000
+SEGMENTS = 3
+RATE_LIMIT = 10
+RATE_BURST = 20
+
+_times = array.array("f", [0] * RING_SIZE)
+_levels = bytearray(RING_SIZE)
+_messages = [None] * RING_SIZE
+_args = [None] * RING_SIZE
+
+class _State:  #pylint:disable=too-few-public-methods
+	'''
+	Running values.
+	'''
+	def __init__(self):
+		self.count = 0  # records put in the ring
+		self.written = 0  # records before this count need no writing
+		self.level = DEBUG
+		self.console_level = INFO
+		self.console = print
+		self.file_level = WARNING
+		self.filename = None
+		self.next_flush = 0
+		self.tokens = RATE_BURST
+		self.tokens_time = None
+		self.dropped = 0
+		self.lost = 0  # overwritten before they were written
+		self.write_error = None
+
+_state = _State()
+
+def set_level(level):
+	'''
+	Drop records below `level` when they are logged.
+	'''
+	_state.level = level
+
+def set_console(console, level=INFO):
+	'''
+	Echo records at `level` and above with `console(text)`, or not at all if `console` is None.
+	'''
+	_state.console = console
+	_state.console_level = level
+
+def set_file(filename, level=WARNING):
+	'''
+	Write records at `level` and above to `filename`, or not at all if `filename` is None.
+	'''
+	_state.filename = filename
+	_state.file_level = level
+
+def segment_name(n):
+	'''
+	Name of log file segment `n`: 0 is the current file, then older ones, such as "log_1.txt".
+	'''
+	if n == 0:
+		return _state.filename
+	dot = _state.filename.rfind(".")
+	if dot < 0:
+		return f"{_state.filename}_{n}"
+	return f"{_state.filename[:dot]}_{n}{_state.filename[dot:]}"
+
+def log(level, message, *args):
+	'''
+	Log `message` at `level`, formatted with `args` (if any) when needed.
+	'''
+	if level < _state.level:
+		return
+	now = time.monotonic()
+	if level < ERROR:
+		if _state.tokens_time is not None:
+			_state.tokens = min(RATE_BURST,
+				_state.tokens + (now - _state.tokens_time) * RATE_LIMIT)
+		_state.tokens_time = now
+		if _state.tokens < 1:
+			_state.dropped += 1
+			return
+		_state.tokens -= 1
+	i = _state.count % RING_SIZE
+	if _state.count - _state.written >= RING_SIZE:
+		# Overwriting a record which was not written yet
+		if _state.filename is not None and _levels[i] >= _state.file_level:
+			_state.lost += 1
+		_state.written += 1
+	_times[i] = now
+	_levels[i] = level
+	_messages[i] = message
+	_args[i] = args
+	_state.count += 1
+	if _state.console is not None and level >= _state.console_level:
+		_state.console(_text(i))
+
+def debug(message, *args):
+	'''
+	Log at DEBUG level.
+	'''
+	log(DEBUG, message, *args)
+
+def info(message, *args):
+	'''
+	Log at INFO level.
+	'''
+	log(INFO, message, *args)
+
+def warning(message, *args):
+	'''
+	Log at WARNING level.
+	'''
+	log(WARNING, message, *args)
+
+def error(message, *args):
+	'''
+	Log at ERROR level.
+	'''
+	log(ERROR, message, *args)
+
+def _text(i):
+	message = _messages[i]
+	args = _args[i]
+	if len(args) == 0:
+		return str(message)
+	try:
+		return message % args
+	except (TypeError, ValueError):
+		return f"{message} {args!r}"
+
+def _line(i):
+	return f"{_times[i]:.1f} {LEVEL_NAMES.get(_levels[i], _levels[i])} {_text(i)}"
+
+def lines(level=DEBUG, count=RING_SIZE):
+	'''
+	Up to `count` latest records at `level` and above, oldest first,
+	as text lines "time level message".
+	'''
+	first = max(0, _state.count - RING_SIZE)
+	indexes = [n % RING_SIZE for n in range(first, _state.count)
+		if _levels[n % RING_SIZE] >= level]
+	return [_line(i) for i in indexes[max(0, len(indexes) - count):]]
+
+def stats():
+	'''
+	Return a short text summary.
+	'''
+	return (f"Log: {_state.count} records, {_state.dropped} dropped, {_state.lost} lost"
+		+ ("" if _state.write_error is None else ", " + _state.write_error))
+
+def dump(level=DEBUG):
+	'''
+	Summary and the records at `level` and above, as text.
+	'''
+	return "\r\n".join([stats()] + lines(level))
+
+def _rotate():
+	try:
+		size = os.stat(_state.filename)[6]
+	except OSError:
+		return
+	if size < SEGMENT_SIZE:
+		return
+	try:
+		os.remove(segment_name(SEGMENTS - 1))
+	except OSError:
+		pass  # Not there yet
+	for n in range(SEGMENTS - 2, -1, -1):
+		try:
+			os.rename(segment_name(n), segment_name(n + 1))
+		except OSError:
+			pass  # Not there yet
+
+def flush(force=False):
+	'''
+	Append records at the file level and above, which were not written yet, to the log file,
+	if the flush interval has passed or if `force`. Return True if written.
+	Records stay pending if writing fails, and `write_error` is set.
+	'''
+	if _state.filename is None or _state.written == _state.count:
+		return False
+	now = time.monotonic()
+	if not force and now < _state.next_flush:
+		return False
+	pending = [n % RING_SIZE for n in range(_state.written, _state.count)
+		if _levels[n % RING_SIZE] >= _state.file_level]
+	if len(pending) == 0:
+		_state.written = _state.count
+		return False
+	_state.next_flush = now + FLUSH_INTERVAL
+	try:
+		_rotate()
+		with open(_state.filename, "a", encoding="utf-8") as log_file:
+			for i in pending:
+				log_file.write(_line(i) + "\r\n")
+	except OSError as e:
+		_state.write_error = "Cannot write log: " + repr(e)
+		return False
+	_state.written = _state.count
+	_state.write_error = None
+	return True
+
+def write_error():
+	'''
+	Why the latest flush failed, or None if it didn't.
+	'''
+	return _state.write_error
@@ -10,116 +10,130 @@ import os
 import random
 import traceback
 
+from wificom import boot_profile
 import digitalio
 import displayio
 import microcontroller
 import supervisor
 import usb_cdc
+boot_profile.step("import system modules")
 
-from adafruit_minimqtt.adafruit_minimqtt import MMQTTException
 from dmcomm import CommandError, ReceiveError
 import dmcomm.hardware as hw
-import dmcomm.protocol
-import wificom.realtime as rt
+boot_profile.step("import dmcomm.hardware")
 import wificom.settings
 import wificom.status
 import wificom.ui
+from wificom import buttons
+from wificom.console import BufferedConsole
+from wificom import digirom_cache
+from wificom import heap_metrics
+from wificom import log
 from wificom import modes
-from wificom import mqtt
-from wificom.mqtt import rtb
-from wificom import punchbag
+from wificom import outcome
+from wificom.stats_store import StatsStore
+from wificom.serial_lines import LineReader
+from wificom.throughput import Throughput
 from wificom import version
-from wificom.import_secrets import secrets_imported, secrets_error, secrets_error_display
 import board_config
+boot_profile.step("import wificom")
+
+# Loaded when first needed, by load_wifi / load_punchbag / parse_command
+# pylint: disable=invalid-name
+mqtt = None
+rtb = None
+rt = None
+rtb_types = None
+import_secrets = None
+MMQTTException = None
+Reconnector = None
+Scheduler = None
+punchbag = None
+# pylint: enable=invalid-name
 
 DIGIROMS_FILENAME = "digiroms.txt"
+DIGIROMS_INDEX_FILENAME = "digiroms_index.bin"
 CONFIG_FILENAME = "config.json"
+STATS_FILENAME = "stats.json"
 LOG_FILENAME = "wificom_log.txt"
-LOG_FILENAME_OLD = "wificom_log_old.txt"
-LOG_MAX_SIZE = 2000
+LOG_HEAP_SAMPLES = 10
+BOOT_PROFILE_FILENAME = "boot_profile.txt"
+SEARCH_PREFIX = "?"
+LOG_PREFIX = "!"
+PATH_PREFIX = "/"
+SEARCH_LIMIT = 5
+DIGIROM_LOOP_TIME = 5
+RTB_HEARTBEAT_TIME = 10
+REDRAW_TIME = 5
+BUTTON_POLL_TIME = 0.05
+MQTT_PUMP_TIME = 0.25
+POLL_TIME = 0.1
+STATS_FLUSH_TIME = 300
+# Console log level for each verbosity setting
+VERBOSITY_LOG_LEVELS = (log.WARNING, log.INFO, log.DEBUG)
 startup_mode = None
 controller = None
 settings = None
 ui = None  #pylint: disable=invalid-name
 status_display = None
-done_wifi_before = False
+stats_store = None
+wifi_connection = None
 serial = usb_cdc.console
+serial_reader = LineReader(serial)
+throughput = Throughput()
 
 COMMAND_DIGIROM = 0
 COMMAND_ERROR = 1
 COMMAND_P = 2
 COMMAND_I = 3
+COMMAND_SEARCH = 4
+COMMAND_LOG = 5
 
 def serial_readline():
 	'''
-	Custom version of serial.readline() which accepts CR as well as LF.
-	Also converts to string and strips result. Prints errors.
-	Returns None on error or if stripped result is empty.
+	Return the next line received on serial, stripped, without blocking.
+	Accepts CR, LF or NUL as line endings. Prints errors.
+	Returns None if no complete non-empty line is available yet.
 	'''
-	if serial.in_waiting == 0:
-		return None
-	data_received = bytearray()
-	while True:
-		item = serial.read(1)
-		if len(item) == 0:
-			print(f"too slow: {bytes(data_received)}")
-			return None
-		if item in (b"\r", b"\n"):
-			break
-		data_received.append(item[0])
-	try:
-		serial_str = data_received.decode("utf-8")
-	except UnicodeError:
-		print(f"UnicodeError: {bytes(data_received)}")
-		return None
-	serial_str = serial_str.strip().strip("\0")
-	if serial_str == "":
-		return None
-	return serial_str
+	return serial_reader.readline()
 
 def execute_digirom(rom, do_led=True, do_beep=True):
 	'''
-	Execute the digirom and report results.
+	Execute the digirom and report results. Returns the Outcome.
 	'''
-	#pylint: disable=too-many-branches
+	error = None
 	try:
 		controller.execute(rom)
-		result = str(rom.result)
 	except (CommandError, ReceiveError) as e:
-		result = str(rom.result)
-		if len(result) > 0:
-			result += " "
-		result += repr(e)
+		error = e
+	result = outcome.Outcome(rom, error)
 	if do_led:
 		ui.led_bright()
-	if serial == usb_cdc.data:
+	if serial == usb_cdc.data or mqtt is None:
 		print(result)
 	else:
 		mqtt.handle_result(result)
+	status_display.outcome(result.code)
+	stats_store.record("sig:" + rom.signal_type, result.code)
 	if do_beep:
-		if "Error" in result:
+		if result.code == outcome.ERROR or result.code == outcome.PARTIAL:
 			ui.beep_error()
-		elif "r:" in result:
-			if len(rom.result) < 2 * len(rom):
-				ui.beep_error()
-			elif rom.turn == 1 and " t" in result:
-				ui.beep_error()
-			else:
-				ui.beep_ready()
+		elif result.code == outcome.COMPLETE:
+			ui.beep_ready()
 	if do_led:
-		if "r:" in result or "Error" in result:
-			time.sleep(0.2)
-		else:
+		if result.code == outcome.NO_REPLY:
 			time.sleep(0.05)
+		else:
+			time.sleep(0.2)
 		ui.led_dim()
 	return result
 
-def execute_digirom_loop(rom, is_wifi):
+def execute_digirom_once(rom, is_wifi, button_time=DIGIROM_LOOP_TIME):
 	'''
-	Handle digirom execution timing etc.
+	Execute the digirom once (waiting up to `button_time` for a button press if configured),
+	and queue the result to send if on WiFi. Returns the Outcome, or None if not executed.
 	'''
 	time_start = time.monotonic()
-	loop_time = 5
 	was_c_pressed = False
 	button_timed_out = False
 	if rom.turn == 1 and settings.turn_1_button:
@@ -129,22 +143,44 @@ def execute_digirom_loop(rom, is_wifi):
 			if ui.is_c_pressed():
 				was_c_pressed = True
 				break
-			if time.monotonic() - time_start > loop_time:
+			if time.monotonic() - time_start > button_time:
 				button_timed_out = True
 				break
 	result = None
 	if not button_timed_out and not was_c_pressed:
 		result = execute_digirom(rom)
 	if is_wifi and not was_c_pressed:
-		mqtt.send_digirom_output(result)
-		ui.led_off()
-		mqtt.loop()
-		ui.led_dim()
-		if mqtt.get_subscribed_output(False) is not None:
-			return
-	seconds_passed = time.monotonic() - time_start
-	if seconds_passed < loop_time:
-		time.sleep(loop_time - seconds_passed)
+		send_status(result, settings.heartbeat_time, None if result is None else result.code)
+	return result
+
+def send_status(output, keepalive_time=0, outcome_code=None):
+	'''
+	Send output on MQTT; with delta heartbeats, only if changed, otherwise as a keepalive
+	after `keepalive_time`.
+	'''
+	if settings.delta_heartbeats:
+		mqtt.send_digirom_output_delta(output, keepalive_time, outcome_code)
+	else:
+		mqtt.send_digirom_output(output, outcome_code)
+
+def execute_digirom_paced(rom, is_wifi, time_start=None, stats_key=None):
+	'''
+	Execute the digirom once, and return how many seconds to wait before the next execution,
+	according to the signal type and whether the exchange was complete.
+	The period counts from `time_start` (when this execution was due) if specified
+	and less than a period ago, otherwise from now.
+	The outcome is also counted for `stats_key` if specified.
+	'''
+	time_now = time.monotonic()
+	result = execute_digirom_once(rom, is_wifi)
+	complete = result is not None and result.complete
+	throughput.record(None if result is None else result.code)
+	if result is not None and stats_key is not None:
+		stats_store.record(stats_key, result.code)
+	period = settings.digirom_period(rom.signal_type, complete)
+	if time_start is None or time_start + period <= time_now:
+		time_start = time_now
+	return max(0, time_start + period - time.monotonic())
 
 def process_new_digirom(command):
 	'''
@@ -152,14 +188,22 @@ def process_new_digirom(command):
 
 	Returns (command_type, output) where:
 	command_type=    output=
-	COMMAND_DIGIROM  DigiROM object
+	COMMAND_DIGIROM  DigiROM object (also for a punchbag path starting with PATH_PREFIX)
 	COMMAND_ERROR    error string
 	COMMAND_P        "[pause]"
 	COMMAND_I        version info string
+	COMMAND_SEARCH   punchbag search results
+	COMMAND_LOG      log records
 	'''
+	if command.startswith(SEARCH_PREFIX):
+		return search_punchbag(command[len(SEARCH_PREFIX):])
+	if command.startswith(LOG_PREFIX):
+		return log_records(command[len(LOG_PREFIX):])
 	try:
-		digirom = dmcomm.protocol.parse_command(command)
-	except CommandError as e:
+		if command.startswith(PATH_PREFIX):
+			command = punchbag_digirom(command[len(PATH_PREFIX):])
+		digirom = parse_command(command)
+	except (CommandError, OSError, ValueError) as e:
 		ui.beep_error()
 		return (COMMAND_ERROR, repr(e))
 	if digirom.signal_type is None:
@@ -169,14 +213,29 @@ def process_new_digirom(command):
 			return (COMMAND_P, "[pause]")
 		elif digirom.op == "I":
 			new_digirom_alert()
-			return (COMMAND_I, version.toml())
+			return (COMMAND_I, "\r\n".join([version.toml(),
+				heap_metrics.toml(), digirom_cache.toml(), throughput.toml(),
+				stats_store.toml()]))
 		else:
 			ui.beep_error()
 			return (COMMAND_ERROR, "NotImplementedError:op=" + digirom.op)
 	# It's a DigiROM
+	throughput.reset()
 	new_digirom_alert()
 	return (COMMAND_DIGIROM, digirom)
 
+def log_records(level_name):
+	'''
+	Returns (COMMAND_LOG, text) with the log summary and the records in the buffer
+	at the level named by `level_name` ("D", "I", "W" or "E") and above, or all if empty.
+	'''
+	level_name = level_name.strip().upper()
+	level = log.DEBUG
+	for (value, name) in log.LEVEL_NAMES.items():
+		if name == level_name:
+			level = value
+	return (COMMAND_LOG, log.dump(level))
+
 def new_digirom_alert():
 	'''
 	Beep once and blink LED 3 times for new DigiROM.
@@ -188,18 +247,55 @@ def new_digirom_alert():
 		ui.led_dim()
 		time.sleep(0.05)
 
-rtb_types = {
-	("legendz", "host"): rt.RealTimeHostTalis,
-	("legendz", "guest"): rt.RealTimeGuestTalis,
-	("digimon-penx-battle", "host"): rt.RealTimeHostPenXBattle,
-	("digimon-penx-battle", "guest"): rt.RealTimeGuestPenXBattle,
-}
+def load_wifi():
+	'''
+	Import the modules for WiFi mode, if not done yet.
+	'''
+	# pylint: disable=global-statement,invalid-name,import-outside-toplevel,redefined-outer-name
+	global mqtt, rtb, rt, rtb_types, import_secrets, MMQTTException, Reconnector, Scheduler
+	if mqtt is not None:
+		return
+	boot_profile.step("before WiFi imports")
+	from adafruit_minimqtt.adafruit_minimqtt import MMQTTException
+	boot_profile.step("import adafruit_minimqtt")
+	from wificom import import_secrets
+	from wificom import mqtt
+	from wificom.mqtt import rtb
+	boot_profile.step("import mqtt")
+	import wificom.realtime as rt
+	boot_profile.step("import realtime")
+	from wificom.reconnect import Reconnector
+	from wificom.scheduler import Scheduler
+	boot_profile.step("import scheduler")
+	rtb_types = {
+		("legendz", "host"): rt.RealTimeHostTalis,
+		("legendz", "guest"): rt.RealTimeGuestTalis,
+		("digimon-penx-battle", "host"): rt.RealTimeHostPenXBattle,
+		("digimon-penx-battle", "guest"): rt.RealTimeGuestPenXBattle,
+	}
+
+def load_punchbag():
+	'''
+	Import the punchbag module, if not done yet.
+	'''
+	# pylint: disable=global-statement,invalid-name,import-outside-toplevel,redefined-outer-name
+	global punchbag
+	if punchbag is None:
+		from wificom import punchbag
+		boot_profile.step("import punchbag")
+
+def parse_command(text):
+	'''
+	Parse a dmcomm command, reusing a recent parse of the same text.
+	'''
+	return digirom_cache.parse_command(text)
+
 def rtb_send_callback(message):
 	'''
 	Called when a RTB object sends a message.
 	'''
 	mqtt.send_rtb_digirom_output(message)
-	print("RTB sent message:", message)
+	log.debug("RTB sent message: %s", message)
 def rtb_receive_callback():
 	'''
 	Called when a RTB object checks for messages received.
@@ -220,11 +316,23 @@ def rtb_status_callback(status, changed):
 	if status in (rt.STATUS_IDLE, rt.STATUS_WAIT):
 		ui.led_dim()
 
+def rtb_outcome_callback(code, timeline):
+	'''
+	Called when a RTB object reports the outcome of a battle, with its timeline.
+	'''
+	stats_store.record("rtb:" + rtb.battle_type, code)
+	if len(timeline) > 0:
+		if timeline.dropped > 0:
+			log.warning("RTB timeline full, %d events dropped", timeline.dropped)
+		items = timeline.items()
+		log.info("RTB %s after %dms", code, items[-1][0])
+		mqtt.send_rtb_timeline(code, items)
+
 def main_menu(play_startup_sound=True):
 	'''
 	Show the main menu.
 	'''
-	print("Main menu")
+	log.info("Main menu")
 	if play_startup_sound:
 		ui.beep_ready()
 	options = []
@@ -257,187 +365,388 @@ def run_wifi():
 	'''
 	Do the normal WiFiCom things.
 	'''
-	# pylint: disable=too-many-branches,too-many-statements
-
-	print("Running WiFi")
+	log.info("Running WiFi")
 	gc.collect()
-	print("Free memory before WiFi:", gc.mem_free())
+	log.info("Free memory before WiFi: %d", gc.mem_free())
 
-	digirom = None
-	rtb_was_active = False
-	rtb_type_id = None
-	rtb_last_ping = 0
-
-	if not secrets_imported:
-		print(secrets_error)
-		failure_alert(secrets_error_display)
-
-	global done_wifi_before  # pylint: disable=global-statement
-	if done_wifi_before:
-		if startup_mode != modes.MODE_DEV:
-			# Reconnect after reboot for wifi mode but not dev mode
-			modes.set_mode(modes.MODE_WIFI)
-		print("*** Soft reboot to reinitialize WiFi ***")
-		ui.display_text("Soft reboot...")
-		time.sleep(0.8)
-		supervisor.reload()
-	done_wifi_before = True
+	load_wifi()
+	if not import_secrets.secrets_imported:
+		log.warning(import_secrets.secrets_error)
+		failure_alert(import_secrets.secrets_error_display)
 
-	# Connect to WiFi and MQTT
 	ui.led_fast_blink()
+	connect_wifi()
+	ui.led_dim()
+	ui.beep_ready()
+	status_display.change("WiFi", None, "Hold C to exit", "Paused")
+
+	scheduler = Scheduler()
+	reconnector = Reconnector(wifi_connection.is_joined, wifi_connection.join, mqtt.reconnect)
+	WifiTasks(scheduler, reconnector)
+	console = start_buffered_console()
+	if console is not None:
+		scheduler.add("console", console.pump, BUTTON_POLL_TIME, 0)
+	try:
+		scheduler.run()
+		for line in scheduler.stats():
+			log.info(line)
+		log.info("Outbound queue: %s", mqtt.outbound_stats())
+		log.info(reconnector.stats())
+		log.info("DigiROM cache: %s", digirom_cache.stats())
+		log.info(throughput.stats())
+	finally:
+		stop_buffered_console(console)
+	flush_records()
+	mqtt.quit_rtb()
+	mqtt.disconnect_from_mqtt()
+
+def connect_wifi():
+	'''
+	Connect to WiFi and MQTT, or resume the session if we have been here before.
+	Reboots if that fails.
+	'''
+	global wifi_connection  # pylint: disable=global-statement
+	if wifi_connection is not None:
+		# Been here before: resume the session rather than rebooting
+		ui.display_text("Reconnecting")
+		try:
+			resumed = (wifi_connection.is_joined() or wifi_connection.join()) and mqtt.reconnect()
+		except (ConnectionError, MMQTTException, OSError) as e:
+			log.warning("Failed to reconnect: %r", e)
+			resumed = False
+		if not resumed:
+			if startup_mode != modes.MODE_DEV:
+				# Reconnect after reboot for wifi mode but not dev mode
+				modes.set_mode(modes.MODE_WIFI)
+			log.warning("*** Soft reboot to reinitialize WiFi ***")
+			ui.display_text("Soft reboot...")
+			time.sleep(0.8)
+			supervisor.reload()
+		return
+	# Connect to WiFi and MQTT
 	ui.display_text("Connecting to WiFi")
-	wifi = board_config.WifiCls()
-	mqtt_client = wifi.connect()
+	wifi_connection = board_config.WifiCls()
+	mqtt_client = wifi_connection.connect()
 	if mqtt_client is None:
 		failure_alert("WiFi failed", reconnect=True)
 	ui.display_text("Connecting to MQTT")
 	mqtt_connect = mqtt.connect_to_mqtt(mqtt_client)
 	if mqtt_connect is False:
 		failure_alert("MQTT failed", reconnect=True)
-	ui.led_dim()
-	ui.beep_ready()
-	status_display.change("WiFi", None, "Hold C to exit", "Paused")
-	while not ui.is_c_pressed():
-		time_start = time.monotonic()
+
+class WifiTasks:
+	'''
+	The tasks of WiFi mode, added to `scheduler`, sharing the current digirom and RTB.
+	'''
+	def __init__(self, scheduler, reconnector):
+		self.scheduler = scheduler
+		self.reconnector = reconnector
+		self.digirom = None
+		self.rtb_runner = None
+		self.rtb_type_id = None
+		scheduler.add("buttons", self.check_buttons, BUTTON_POLL_TIME, 0)
+		scheduler.add("mqtt", self.pump_mqtt, MQTT_PUMP_TIME, 0)
+		self.command_task = scheduler.add("command", self.handle_command, 1, 0)
+		self.digirom_task = scheduler.add("digirom", self.run_digirom, DIGIROM_LOOP_TIME)
+		self.heartbeat_task = scheduler.add("heartbeat", self.heartbeat,
+			settings.heartbeat_time, 0)
+		scheduler.add("rtb", self.run_rtb, POLL_TIME, 0)
+		scheduler.add("redraw", status_display.redraw, REDRAW_TIME, REDRAW_TIME)
+		scheduler.add("stats", stats_store.flush, STATS_FLUSH_TIME, STATS_FLUSH_TIME)
+		scheduler.add("log", log.flush, log.FLUSH_INTERVAL, log.FLUSH_INTERVAL)
+	def pump_mqtt(self):
+		'''
+		Publish queued messages and take in new ones, or try to reconnect.
+		'''
+		heap_metrics.sample(modes.MODE_WIFI)
+		if not self.reconnector.connected:
+			if not self.reconnector.step():
+				return
+			ui.led_dim()
+		try:
+			if mqtt.pending_messages() > 0:
+				if not rtb.active:
+					ui.led_off()
+				mqtt.flush()
+				if not rtb.active:
+					ui.led_dim()
+			mqtt.loop()
+		except (ConnectionError, MMQTTException, OSError) as e:
+			# Digirom and RTB state are kept, and results are queued meanwhile
+			self.reconnector.lost(e)
+			ui.led_fast_blink()
+		if mqtt.get_subscribed_output(False) is not None:
+			self.scheduler.wake(self.command_task)
+	def check_buttons(self):
+		'''
+		Stop on C.
+		'''
+		if ui.is_c_pressed():
+			self.scheduler.stop()
+	def handle_command(self):
+		'''
+		Take up a new command from MQTT, if any.
+		'''
+		age = mqtt.get_subscribed_output_age()
 		new_command = mqtt.get_subscribed_output()
-		if new_command is not None:
-			digirom = None
-			(command_type, output) = process_new_digirom(new_command)
-			if command_type == COMMAND_DIGIROM:
-				digirom = output
-				status_display.do(digirom)
-				time.sleep(settings.initial_delay(digirom.turn, False))
-			elif command_type in [COMMAND_ERROR, COMMAND_P, COMMAND_I]:
-				print(output)
-				mqtt.send_digirom_output(output)
-				status_display.do("Paused")
+		if new_command is None:
+			return
+		log.info("Command picked up after %.3fs", age)
+		self.digirom = None
+		self.scheduler.cancel(self.digirom_task)
+		(command_type, output) = process_new_digirom(new_command)
+		if command_type == COMMAND_DIGIROM:
+			self.digirom = output
+			status_display.do(self.digirom)
+			self.scheduler.schedule(self.digirom_task,
+				settings.initial_delay(self.digirom.turn, False))
+		elif command_type in [COMMAND_ERROR, COMMAND_P, COMMAND_I, COMMAND_SEARCH, COMMAND_LOG]:
+			log.info("%s", output)
+			mqtt.send_digirom_output(output)
+			status_display.do("Paused")
+	def run_digirom(self):
+		'''
+		Execute the current digirom, unless in a RTB.
+		'''
+		if self.digirom is None:
+			self.scheduler.cancel(self.digirom_task)
+		elif not rtb.active:
+			self.scheduler.schedule(self.digirom_task,
+				execute_digirom_paced(self.digirom, True, self.digirom_task.due))
+			if mqtt.get_subscribed_output(False) is not None:
+				self.scheduler.wake(self.command_task)
+	def heartbeat(self):
+		'''
+		Send the status if there is nothing else to send.
+		'''
 		if rtb.active:
-			rtb_type_id_new = (rtb.battle_type, rtb.user_type)
-			if not rtb_was_active or rtb_type_id_new != rtb_type_id:
-				new_digirom_alert()
-				rtb_type_id = rtb_type_id_new
-				if rtb_type_id in rtb_types:
-					rtb_runner = rtb_types[rtb_type_id](
-						execute_digirom,
-						rtb_send_callback,
-						rtb_receive_callback,
-						rtb_status_callback,
-					)
-					rtb_status_callback(rtb_runner.status, True)
-					status_display.do("RTB: follow LED")
-				else:
-					print(rtb.battle_type + " not implemented")
-					status_display.do("Paused")
-			rtb_was_active = True
-			# Heartbeat approx every 10 seconds
-			if time_start - rtb_last_ping > 10:
-				mqtt.send_digirom_output("RTB")
-				rtb_last_ping = time_start
-			mqtt.loop()
+			send_status("RTB")
+		elif self.digirom is None:
+			send_status(None)  # Ping
+	def run_rtb(self):
+		'''
+		Start, stop or update the real-time battle.
+		'''
+		if not rtb.active:
+			if self.rtb_type_id is not None:
+				ui.led_dim()
+				self.rtb_runner = None
+				self.rtb_type_id = None
+				self.heartbeat_task.period = settings.heartbeat_time
+			return
+		rtb_type_id = (rtb.battle_type, rtb.user_type)
+		if rtb_type_id != self.rtb_type_id:
+			self.start_rtb(rtb_type_id)
+		if self.rtb_runner is not None:
 			try:
-				rtb_runner.loop()
+				self.rtb_runner.loop()
 			except CommandError as e:
-				print(repr(e))
+				log.warning("%r", e)
+	def start_rtb(self, rtb_type_id):
+		'''
+		Make the RTB object for (battle type, user type), if implemented.
+		'''
+		new_digirom_alert()
+		self.rtb_type_id = rtb_type_id
+		self.rtb_runner = None
+		if rtb_type_id in rtb_types:
+			self.rtb_runner = rtb_types[rtb_type_id](
+				execute_digirom,
+				rtb_send_callback,
+				rtb_receive_callback,
+				rtb_status_callback,
+				rtb_outcome_callback,
+			)
+			rtb_status_callback(self.rtb_runner.status, True)
+			status_display.do("RTB: follow LED")
 		else:
-			if rtb_was_active:
-				ui.led_dim()
-			rtb_was_active = False
-			if digirom is not None:
-				execute_digirom_loop(digirom, True)
-			else:
-				mqtt.send_digirom_output(None)  # Ping
-				while True:
-					mqtt.loop()
-					if mqtt.get_subscribed_output(False) is not None:
-						break
-					if time.monotonic() - time_start >= 5:
-						break
-					time.sleep(0.1)
-		status_display.redraw()
-	mqtt.quit_rtb()
+			log.warning("%s not implemented", rtb.battle_type)
+			status_display.do("Paused")
+		self.heartbeat_task.period = RTB_HEARTBEAT_TIME
+		self.scheduler.wake(self.heartbeat_task)
+
+def start_buffered_console():
+	'''
+	Send log output to the USB console through a buffer which never waits for the host.
+	Returns the BufferedConsole to pump, or None if there is no USB console.
+	'''
+	if usb_cdc.console is None:
+		return None
+	usb_cdc.console.write_timeout = 0
+	console = BufferedConsole(usb_cdc.console.write)
+	log.set_console(console.put, VERBOSITY_LOG_LEVELS[settings.verbosity])
+	return console
+
+def stop_buffered_console(console):
+	'''
+	Write out what is left in `console` (if not None), then print log output directly again.
+	'''
+	if console is None:
+		return
+	console.flush()
+	usb_cdc.console.write_timeout = None
+	log.set_console(print, VERBOSITY_LOG_LEVELS[settings.verbosity])
+	log.info(console.stats())
+
+def flush_records():
+	'''
+	Write the interaction stats if changed and any pending log records, and log a summary.
+	'''
+	stats_store.flush(force=True)
+	log.flush(force=True)
+	log.info("Stats: %s", stats_store.stats())
+	if stats_store.error is not None:
+		log.warning(stats_store.error)
 
 def run_serial():
 	'''
 	Run in serial mode.
 	'''
-	print("Running serial")
+	log.info("Running serial")
 	# Discard backlog
-	while serial.in_waiting > 0:
-		serial.read(1)
+	serial_reader.clear()
 	digirom = None
+	next_time = 0
 	status_display.change("Serial", None, "Hold C to exit", "Paused", show_battery=False)
 	while not ui.is_c_pressed():
+		heap_metrics.sample(modes.MODE_SERIAL)
 		serial_str = serial_readline()
 		if serial_str is not None:
 			digirom = None
+			next_time = 0
 			(command_type, output) = process_new_digirom(serial_str)
-			if command_type != COMMAND_I:
+			if command_type not in [COMMAND_I, COMMAND_SEARCH, COMMAND_LOG]:
 				print(f"got {len(serial_str)} bytes: {serial_str} -> ", end="")
 			if command_type == COMMAND_DIGIROM:
 				digirom = output
 				print(f"{digirom.signal_type}{digirom.turn}-[{len(digirom)} packets]")
 				status_display.do(digirom)
 				time.sleep(settings.initial_delay(digirom.turn, True))
-			elif command_type in [COMMAND_ERROR, COMMAND_P, COMMAND_I]:
+			elif command_type in [COMMAND_ERROR, COMMAND_P, COMMAND_I, COMMAND_SEARCH, COMMAND_LOG]:
 				print(output)
 				status_display.do("Paused")
-		if digirom is not None:
-			execute_digirom_loop(digirom, False)
+		if digirom is not None and time.monotonic() >= next_time:
+			delay = execute_digirom_paced(digirom, False)
+			next_time = time.monotonic() + delay
+			stats_store.flush()
+			log.flush()
 		else:
-			time.sleep(0.1)  # Just waiting for serial
+			time.sleep(POLL_TIME)  # Waiting for serial or the next execution
+	log.info(throughput.stats())
+	flush_records()
+
+def open_punchbag_tree(digiroms_file):
+	'''
+	Make the punchbag tree for the open digiroms file, with the saved index.
+	'''
+	load_punchbag()
+	return punchbag.DigiROM_Tree(digiroms_file,
+		DIGIROMS_INDEX_FILENAME, os.stat(DIGIROMS_FILENAME))
+
+def punchbag_digirom(path):
+	'''
+	Get the digirom text at `path` ("menu/.../title") in the punchbag file.
+	Raises OSError or ValueError if it cannot be found.
+	'''
+	with open(DIGIROMS_FILENAME, encoding="UTF-8") as digiroms_file:
+		tree = open_punchbag_tree(digiroms_file)
+		node = tree.find(path.split(punchbag.PATH_SEPARATOR))
+		digirom = tree.digirom(node)
+	if digirom is None:
+		raise ValueError("Not a digirom: " + path)
+	return digirom
+
+def search_punchbag(query):
+	'''
+	Search the punchbag titles for `query`.
+	Returns (COMMAND_SEARCH, text) with a line per match, "path: digirom" or "path/" for a menu,
+	or (COMMAND_ERROR, error string).
+	'''
+	lines = []
+	try:
+		with open(DIGIROMS_FILENAME, encoding="UTF-8") as digiroms_file:
+			tree = open_punchbag_tree(digiroms_file)
+			for node in tree.search(query, SEARCH_LIMIT):
+				path = punchbag.PATH_SEPARATOR.join(tree.path(node))
+				digirom = tree.digirom(node)
+				if digirom is None:
+					lines.append(path + punchbag.PATH_SEPARATOR)
+				else:
+					lines.append(f"{path}: {digirom}")
+	except (OSError, ValueError) as e:
+		return (COMMAND_ERROR, repr(e))
+	if not lines:
+		return (COMMAND_SEARCH, "No match: " + query.strip())
+	return (COMMAND_SEARCH, "\r\n".join(lines))
+
+def tree_menu_fetch(tree):
+	'''
+	Make the `fetch` function for `ui.paged_menu` over the options at the current point of `tree`.
+	'''
+	def fetch(start, count):
+		return [(node.text, node) for node in tree.children_window(start, count)]
+	return fetch
 
 def run_punchbag():
 	'''
 	Run in punchbag mode.
 	'''
-	print("Running punchbag")
+	log.info("Running punchbag")
+	load_punchbag()
 	try:
 		with open(DIGIROMS_FILENAME, encoding="UTF-8") as digiroms_file:
-			tree = punchbag.DigiROM_Tree(digiroms_file)
+			tree = open_punchbag_tree(digiroms_file)
 			while True:
+				heap_metrics.sample(modes.MODE_PUNCHBAG)
 				ui.display_text("Loading...")
-				options = tree.children()
-				names = [option.text for option in options]
-				node = ui.menu(names, options, "")
+				node = ui.paged_menu(tree.child_count(), tree_menu_fetch(tree), "")
 				if node == "":
 					if tree.depth() == 0:
 						return
 					tree.back()
 					continue
-				print("Selected:", node.text)
+				log.info("Selected: %s", node.text)
 				rom_text = tree.digirom(node)
 				if rom_text is None:
 					tree.pick(node)
 					continue
 				try:
-					rom = dmcomm.protocol.parse_command(rom_text)
+					rom = parse_command(rom_text)
 				except CommandError as e:
-					print(rom_text, repr(e))
+					log.warning("%s %r", rom_text, e)
 					ui.display_text("CommandError\nPress C to return")
-					while not ui.is_c_pressed():
-						pass
+					ui.wait_for_press("C")
 					ui.beep_cancel()
 					continue
 				status_display.change("Punchbag", node.text, "Hold C to change", rom)
+				throughput.reset()
+				next_time = 0
 				while not ui.is_c_pressed():
-					execute_digirom_loop(rom, False)
-					status_display.redraw()
+					heap_metrics.sample(modes.MODE_PUNCHBAG)
+					if time.monotonic() >= next_time:
+						delay = execute_digirom_paced(rom, False, stats_key="bag:" + node.text)
+						next_time = time.monotonic() + delay
+						status_display.redraw()
+						stats_store.flush()
+						log.flush()
+					else:
+						time.sleep(POLL_TIME)
+				log.info(throughput.stats())
+				flush_records()
 				ui.beep_cancel()
 				ui.display_text("Exiting\n(Release button)")
-				while ui.is_c_pressed():
-					pass
+				ui.wait_for_release("C")
 	except (OSError, ValueError) as e:
-		print(repr(e))
+		log.warning("%r", e)
 		ui.display_rows([str(e), "Press C to exit"])
-		while not ui.is_c_pressed():
-			pass
+		ui.wait_for_press("C")
 		ui.beep_cancel()
 
 def run_settings():
 	'''
 	Run in settings mode.
 	'''
-	print("Running settings")
+	log.info("Running settings")
 	settings_menu_configs = [
 		("Version Info", display_info),
 		("TOGGLE_SOUND", toggle_sound),
@@ -464,10 +773,9 @@ def display_info():
 	'''
 	Display settings info.
 	'''
-	print("Running display_info")
+	log.info("Running display_info")
 	ui.display_text(version.onscreen())
-	while not ui.is_c_pressed():
-		pass
+	ui.wait_for_press("C")
 	ui.beep_cancel()
 
 def toggle_sound():
@@ -501,16 +809,13 @@ def save_settings():
 	'''
 	changed = settings.save()
 	if not changed:
-		print("Settings unchanged")
+		log.info("Settings unchanged")
 	elif settings.error is None:
-		print("Settings saved!")
+		log.info("Settings saved!")
 	else:
-		print(settings.error)
+		log.warning(settings.error)
 		ui.display_text("Can't save settings\nPress C to exit")
-		while ui.is_c_pressed():
-			pass
-		while not ui.is_c_pressed():
-			pass
+		ui.wait_for_press("C")
 		ui.beep_cancel()
 
 def reboot_uf2():
@@ -543,17 +848,13 @@ def hold_c_to_reboot():
 	'''
 	Hold C to reboot.
 	'''
-	while True:
-		while not ui.is_c_pressed():
-			pass
-		time_start = time.monotonic()
-		while ui.is_c_pressed():
-			if time.monotonic() - time_start > 2:
-				ui.beep_cancel()
-				ui.display_text("Rebooting\n(Release button)")
-				while ui.is_c_pressed():
-					pass
-				mode_change_reboot(modes.MODE_MENU)
+	ui.buttons.clear()
+	while ui.buttons.held("C") <= 2:
+		ui.buttons.wait(POLL_TIME)
+	ui.beep_cancel()
+	ui.display_text("Rebooting\n(Release button)")
+	ui.wait_for_release("C")
+	mode_change_reboot(modes.MODE_MENU)
 
 def setup_battery_monitor():
 	'''
@@ -562,9 +863,9 @@ def setup_battery_monitor():
 	try:
 		info = board_config.battery_monitor
 	except AttributeError:
-		print("No battery monitor configured")
+		log.info("No battery monitor configured")
 		return None
-	print("Set up battery monitor")
+	log.info("Set up battery monitor")
 	return wificom.status.BatteryMonitor(**info)
 
 def failure_alert(message, hard_reset=False, reconnect=False):
@@ -577,13 +878,16 @@ def failure_alert(message, hard_reset=False, reconnect=False):
 	ui.led_off()
 	ui.display_text(f"{message}\n{instructions}")
 	ui.beep_failure()
+	ui.buttons.clear()
 	while True:
-		if ui.is_a_pressed(True):
-			# A for screen, C for screenless
-			break
-		if ui.is_b_pressed() and reconnect:
-			modes.set_mode(modes.MODE_WIFI)
-			break
+		event = ui.buttons.wait(POLL_TIME)
+		if event is not None and event[1] == buttons.PRESS:
+			if event[0] == "A" or not ui.has_display:
+				# A for screen, C for screenless
+				break
+			if event[0] == "B" and reconnect:
+				modes.set_mode(modes.MODE_WIFI)
+				break
 		# Short blink every 2s
 		if int(time.monotonic() * 10) % 20 == 0:
 			ui.led_bright()
@@ -600,41 +904,21 @@ def failure_alert(message, hard_reset=False, reconnect=False):
 		time.sleep(0.8)
 		supervisor.reload()
 
-def rotate_log():
-	'''
-	Rotate log file if over LOG_MAX_SIZE.
-	'''
-	try:
-		log_size = os.stat(LOG_FILENAME)[6]
-	except OSError:
-		print("No log file yet")
-		return
-	if log_size > LOG_MAX_SIZE:
-		try:
-			os.rename(LOG_FILENAME, LOG_FILENAME_OLD)
-			print("Rotated log file")
-		except OSError as e:
-			print("Cannot rotate log file: " + repr(e))
-	else:
-		print("Log file is present")
-
 def report_crash(crash_exception, connection_lost=False):
 	'''
 	Report crash which resulted in crash_exception.
 	'''
 	trace = "".join(traceback.format_exception(crash_exception))
-	print(trace)
 	message = "Connection lost" if connection_lost else "Crashed"
-	rotate_log()
 	random_number = random.randint(100, 999)
-	try:
-		with open(LOG_FILENAME, "a", encoding="utf-8") as f:
-			f.write(f"Crash ID {random_number}:\r\n{trace}\r\n")
-		print("Wrote log")
+	log.error("Crash ID %d:\r\n%s%s", random_number, trace,
+		"\r\n".join(heap_metrics.lines(LOG_HEAP_SAMPLES)))
+	if log.flush(force=True):
+		log.info("Wrote log")
 		message += f" #{random_number}"
 		hard_reset = True
-	except OSError as e:
-		print("Cannot write log: " + repr(e))
+	else:
+		log.warning(log.write_error())
 		message += ",nolog"
 		hard_reset = False
 	failure_alert(message, hard_reset, connection_lost)
@@ -644,13 +928,15 @@ def main(led_pwm):
 	WiFiCom main program.
 	'''
 	# pylint: disable=too-many-statements
-	global startup_mode, controller, settings, ui, status_display  # pylint: disable=global-statement
+	# pylint: disable=global-statement
+	global startup_mode, controller, settings, ui, status_display, stats_store
 
 	serial.timeout = 1
-	print("WiFiCom starting")
+	log.set_file(LOG_FILENAME)
+	log.info("WiFiCom starting")
 
 	gc.collect()
-	print("Free memory at start:", gc.mem_free())
+	log.info("Free memory at start: %d", gc.mem_free())
 
 	outputs_extra_power = []
 	for (pin, value) in board_config.extra_power_pins:
@@ -659,24 +945,27 @@ def main(led_pwm):
 		output.value = value
 		outputs_extra_power.append(output)
 
-	gc.collect()
-	print("Free memory before dmcomm registrations:", gc.mem_free())
+	boot_profile.step("extra power pins")
 	controller = hw.Controller()
 	for pin_description in board_config.controller_pins:
 		controller.register(pin_description)
-	gc.collect()
-	print("Free memory after dmcomm registrations:", gc.mem_free())
+	boot_profile.step("dmcomm registrations")
 
 	startup_mode = modes.get_mode()
 	mode_was_requested = modes.was_requested()
-	print("Mode: " + modes.get_mode_str())
+	log.info("Mode: %s", modes.get_mode_str())
 	modes.clear_request()
 	if startup_mode != modes.MODE_DEV:
 		supervisor.runtime.autoreload = False
 
 	settings = wificom.settings.Settings(CONFIG_FILENAME)
 	if settings.error is not None:
-		print(settings.error)
+		log.warning(settings.error)
+	log.set_console(print, VERBOSITY_LOG_LEVELS[settings.verbosity])
+	stats_store = StatsStore(STATS_FILENAME, STATS_FLUSH_TIME)
+	if stats_store.error is not None:
+		log.warning(stats_store.error)
+	boot_profile.step("settings")
 
 	if board_config.WifiCls is None:
 		board_config.ui_pins["display_scl"] = None  # no display without wifi
@@ -686,6 +975,10 @@ def main(led_pwm):
 	status_display = wificom.status.StatusDisplay(ui, settings, setup_battery_monitor())
 	version.set_display(ui.has_display)
 	version.set_settings(settings)
+	boot_profile.step("user interface")
+	log.info(boot_profile.lines()[-1])
+	if settings.log_boot_profile:
+		boot_profile.save(BOOT_PROFILE_FILENAME)
 
 	run_column = 0 if mode_was_requested else 1
 	branches = {
@@ -701,14 +994,14 @@ def main(led_pwm):
 	}
 	try:
 		if ui.has_display:
-			print("Run column: " + str(run_column))
+			log.info("Run column: %d", run_column)
 			branches[startup_mode][run_column]()
 			main_menu(False)
 		else:
-			print("Display not found: " + str(ui.display_error))
+			log.warning("Display not found: %s", ui.display_error)
 			ui.beep_ready()
 			run_serial()
-	except (ConnectionError, MMQTTException) as e:
+	except ConnectionError as e:
 		report_crash(e, True)
 	except OSError as e:
 		if e.errno == errno.EHOSTUNREACH:
@@ -716,4 +1009,4 @@ def main(led_pwm):
 		else:
 			report_crash(e)
 	except Exception as e:  #pylint: disable=broad-except
-		report_crash(e)
+		report_crash(e, MMQTTException is not None and isinstance(e, MMQTTException))
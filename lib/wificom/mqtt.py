@@ -5,8 +5,12 @@ Handle MQTT connections, subscriptions, and callbacks
 
 # pylint: disable=unused-argument
 
-import json
+import time
+from wificom import heap_metrics
+from wificom import log
 from wificom import version
+from wificom import wire
+from wificom.outbound import OutboundQueue
 from wificom.import_secrets import secrets_mqtt_username, \
 secrets_device_uuid, \
 secrets_user_uuid
@@ -16,6 +20,10 @@ _mqtt_topic_identifier = secrets_user_uuid + '-' + secrets_device_uuid
 _mqtt_topic_input = _mqtt_io_prefix + _mqtt_topic_identifier + '/wificom-input'
 _mqtt_topic_output =  _mqtt_io_prefix + _mqtt_topic_identifier + "/wificom-output"
 
+# The shortest the MQTT loop can block for: minimqtt raises MMQTTException if the loop
+# timeout is less than the client's socket_timeout, so that must not be more than this
+LOOP_TIMEOUT = 0.1
+
 class MQTT_data:  #pylint:disable=invalid-name
 	'''
 	Stores data for the MQTT connection.
@@ -26,7 +34,13 @@ class MQTT_data:  #pylint:disable=invalid-name
 		self.is_output_hidden = None
 		self.api_response = None
 		self.new_digirom = None
-		self.cached_digirom_output = None
+		self.new_digirom_time = None
+		self.encoding = wire.JSON
+		self.output_fixed = None
+		self.output_template = None
+		self.keepalive = None
+		self.last_status = None
+		self.last_status_time = None
 
 class RTB_data:  #pylint:disable=invalid-name
 	'''
@@ -42,6 +56,7 @@ class RTB_data:  #pylint:disable=invalid-name
 
 _data = MQTT_data()
 rtb = RTB_data()
+_outbox = OutboundQueue()
 
 def connect_to_mqtt(mqtt_client):
 	'''
@@ -57,10 +72,10 @@ def connect_to_mqtt(mqtt_client):
 
 	# Connect to MQTT Broker
 	try:
-		print("Connecting to MQTT Broker...")
+		log.info("Connecting to MQTT Broker...")
 		mqtt_client.connect()
 	except Exception as e:  # pylint: disable=broad-except
-		print(f"Failed to connect to MQTT Broker: {repr(e)}")
+		log.warning("Failed to connect to MQTT Broker: %r", e)
 		return False
 
 	# Use mqtt_client to subscribe to the mqtt_topic_input feed
@@ -69,16 +84,82 @@ def connect_to_mqtt(mqtt_client):
 	# Set up a callback for the topic/feed
 	mqtt_client.add_topic_callback(_mqtt_topic_input, on_app_feed_callback)
 
-	_data.cached_digirom_output = version.dictionary()
-	_data.cached_digirom_output["device_uuid"] = secrets_device_uuid
+	_data.output_fixed = version.dictionary()
+	_data.output_fixed["device_uuid"] = secrets_device_uuid
+	set_encoding(_data.encoding)
+	_data.last_status = None
 
 	return True
 
-def loop():
+def reconnect():
+	'''
+	Reconnect to the MQTT broker after the connection was lost, keeping our state
+	Resubscribe to the input topic and any real-time battle topic
+	Return True if connected
+	'''
+	_data.mqtt_client.reconnect(resubscribe=False)
+	_data.mqtt_client.subscribe(_mqtt_topic_input)
+	if rtb.topic is not None:
+		_data.mqtt_client.subscribe(rtb.host + "/f/" + rtb.topic)
+	return _data.mqtt_client.is_connected
+
+def disconnect_from_mqtt():
+	'''
+	Disconnect from the MQTT broker if connected, ignoring errors
+	'''
+	if _data.mqtt_client is None or not _data.mqtt_client.is_connected:
+		return
+	try:
+		_data.mqtt_client.disconnect()
+	except Exception as e:  # pylint: disable=broad-except
+		log.warning("Failed to disconnect from MQTT Broker: %r", e)
+
+def set_encoding(encoding):
+	'''
+	Set the encoding of outgoing messages: wire.JSON or wire.CBOR
+	'''
+	_data.encoding = encoding
+	_data.output_template = wire.make_template(encoding,
+		_data.output_fixed, ["application_uuid", "output", "heap", "outcome"])
+	_data.keepalive = wire.encode({"device_uuid": secrets_device_uuid}, encoding)
+	_data.last_status = None
+
+def get_encoding():
+	'''
+	Get the encoding of outgoing messages
+	'''
+	return _data.encoding
+
+def loop(timeout=LOOP_TIMEOUT):
 	'''
 	Loop IO MQTT client
 	'''
-	_data.mqtt_client.loop(1)
+	_data.mqtt_client.loop(timeout)
+
+def _publish(topic, message):
+	_data.mqtt_client.publish(topic, message)
+
+def flush(max_messages=None):
+	'''
+	Publish queued messages while connected. Messages stay queued if not connected,
+	or if publishing fails (and the exception propagates), to be retried later.
+	Return the number published.
+	'''
+	if not _data.mqtt_client.is_connected:
+		return 0
+	return _outbox.flush(_publish, max_messages)
+
+def pending_messages():
+	'''
+	Number of messages waiting to be published
+	'''
+	return len(_outbox)
+
+def outbound_stats():
+	'''
+	Outbound queue counters as a dictionary
+	'''
+	return _outbox.stats()
 
 def get_subscribed_output(clear_rom=True):
 	'''
@@ -91,20 +172,49 @@ def get_subscribed_output(clear_rom=True):
 
 	return returned_digirom
 
-def send_digirom_output(output):
+def get_subscribed_output_age():
 	'''
-	Send the output to the MQTT broker
+	Seconds since the latest Digirom was received, or None if there wasn't one.
+	'''
+	if _data.new_digirom_time is None:
+		return None
+	return time.monotonic() - _data.new_digirom_time
+
+def send_digirom_output(output, outcome=None):
+	'''
+	Queue the output for the MQTT broker
 	Set last_application_id and version info for use server side
+	A heartbeat (output None or "RTB") includes heap metrics,
+	and a queued heartbeat is replaced by a newer one
+	`outcome` is the outcome code of the execution, if any
 	'''
+	is_heartbeat = output is None or output == "RTB"
+	heap = heap_metrics.summary() if is_heartbeat else None
 
-	# update json object with output and application_id
-	_data.cached_digirom_output["application_uuid"] = _data.last_application_id
-	_data.cached_digirom_output["output"] = str(output)
+	# version info is pre-rendered; only application_id, output, heap and outcome are encoded here
+	mqtt_message_json = _data.output_template.render(
+		_data.last_application_id, str(output), heap, outcome)
 
-	mqtt_message_json = json.dumps(_data.cached_digirom_output)
+	_outbox.push(_mqtt_topic_output, mqtt_message_json, is_heartbeat)
+	_data.last_status = (_data.last_application_id, str(output))
+	_data.last_status_time = time.monotonic()
 
-	if _data.mqtt_client.is_connected:
-		_data.mqtt_client.publish(_mqtt_topic_output, mqtt_message_json)
+def send_digirom_output_delta(output, keepalive_time=0, outcome=None):
+	'''
+	Send the output if it or the application has changed since the last output sent.
+	Otherwise send a keepalive with only the device_uuid,
+	if `keepalive_time` seconds have passed since the last message.
+	Return "full", "keepalive" or None according to what was sent.
+	'''
+	if _data.last_status != (_data.last_application_id, str(output)):
+		send_digirom_output(output, outcome)
+		return "full"
+	now = time.monotonic()
+	if now - _data.last_status_time < keepalive_time:
+		return None
+	_outbox.push(_mqtt_topic_output, _data.keepalive, True)
+	_data.last_status_time = now
+	return "keepalive"
 
 def send_rtb_digirom_output(output):
 	'''
@@ -120,27 +230,42 @@ def send_rtb_digirom_output(output):
 			"user_type": rtb.user_type,
 		}
 
-		mqtt_message_json = json.dumps(mqtt_message)
+		mqtt_message_json = wire.encode(mqtt_message, _data.encoding)
 
 		if rtb.active:
-			_data.mqtt_client.publish(rtb.host + '/f/' + rtb.topic, mqtt_message_json)
+			_outbox.push(rtb.host + '/f/' + rtb.topic, mqtt_message_json)
 		else:
-			print("RTB not active, shouldn't be calling this callback while RTB is inactive")
+			log.warning("RTB not active, shouldn't be calling this callback while RTB is inactive")
+
+def send_rtb_timeline(outcome, timeline):
+	'''
+	Send the timeline of a real-time battle which ended with `outcome`,
+	as a list of [milliseconds, event], to the MQTT broker on the output topic
+	'''
+	mqtt_message = {
+		"application_id": 1,
+		"device_uuid": secrets_device_uuid,
+		"battle_type": rtb.battle_type,
+		"user_type": rtb.user_type,
+		"outcome": outcome,
+		"rtb_timeline": timeline,
+	}
+	_outbox.push(_mqtt_topic_output, wire.encode(mqtt_message, _data.encoding))
 
 def handle_result(result):
 	'''
 	Handle the DigiROM result according to settings
 	'''
 	if not _data.api_response:
-		print(result)
+		log.info("%s", result)
 	else:
-		print("DigiROM executed")
+		log.info("DigiROM executed")
 
 def quit_rtb():
 	'''
 	Exit from any real-time battle
 	'''
-	if rtb.topic is not None:
+	if rtb.topic is not None and _data.mqtt_client.is_connected:
 		_data.mqtt_client.unsubscribe(rtb.host + "/f/" + rtb.topic)
 	_data.api_response = None
 	rtb.user_type = None
@@ -166,20 +291,24 @@ def on_app_feed_callback(client, topic, message):
 		}
 	'''
 
-	print(f"New message on topic {topic}", end="")
-
-	# parse message as json
+	# parse message as json or cbor
 	try:
-		message_json = json.loads(message)
-	except json.decoder.JSONDecodeError:
-		print(":", message)
+		message_json = wire.decode(message)
+	except ValueError:
+		log.warning("New message on topic %s: %s", topic, message)
 		raise
 
-	if not message_json["api_response"]:
-		print(":", message, end="")
 	if _data.is_output_hidden:
-		print("check the App", end="")
-	print()
+		log.info("New message on topic %s: check the App", topic)
+	else:
+		log.info("New message on topic %s", topic)
+	if not message_json["api_response"]:
+		log.debug("Message: %s", message if wire.is_json(message) else message_json)
+
+	# Server can switch the encoding of what we send
+	encoding = message_json.get("encoding", None)
+	if encoding in wire.ENCODINGS and encoding != _data.encoding:
+		set_encoding(encoding)
 
 	# If message has an ack_id, acknowledge it
 	if "ack_id" in message_json:
@@ -189,9 +318,8 @@ def on_app_feed_callback(client, topic, message):
 			"ack_id": message_json["ack_id"]
 		}
 
-		mqtt_message_json = json.dumps(mqtt_message)
-		if _data.mqtt_client.is_connected:
-			_data.mqtt_client.publish(_mqtt_topic_output, mqtt_message_json)
+		mqtt_message_json = wire.encode(mqtt_message, _data.encoding)
+		_outbox.push(_mqtt_topic_output, mqtt_message_json)
 
 	# If message_json contains topic_action, then we have a realtime battle request
 	topic_action = message_json.get('topic_action', None)
@@ -217,10 +345,11 @@ def on_app_feed_callback(client, topic, message):
 		_data.api_response = message_json['api_response']
 		_data.last_application_id = message_json['application_id']
 		_data.new_digirom = message_json['digirom']
-		print("Received new DigiROM", end="")
-		if not _data.api_response:
-			print(":", _data.new_digirom, end="")
-		print()
+		_data.new_digirom_time = time.monotonic()
+		if _data.api_response:
+			log.info("Received new DigiROM")
+		else:
+			log.info("Received new DigiROM: %s", _data.new_digirom)
 
 def on_realtime_battle_feed_callback(client, topic, message):
 	'''
@@ -233,9 +362,10 @@ def on_realtime_battle_feed_callback(client, topic, message):
 			"user_type": "guest" # Guest or Host, each side expects the opposite for real messages
 		}
 	'''
-	print(f"New RTB message on topic {topic}: {message}")
-	# parse message as json
-	message_json = json.loads(message)
+	# parse message as json or cbor
+	message_json = wire.decode(message)
+	log.info("New RTB message on topic %s", topic)
+	log.debug("Message: %s", message if wire.is_json(message) else message_json)
 
 	if rtb.active:
 		if 'user_type' in message_json:
@@ -243,30 +373,30 @@ def on_realtime_battle_feed_callback(client, topic, message):
 				_data.last_application_id = message_json['application_id']
 				rtb.digirom = message_json['output']
 			else:
-				print('(user_type is [' + rtb.user_type + ']; ignoring message from self)')
+				log.debug("(user_type is [%s]; ignoring message from self)", rtb.user_type)
 	else:
-		print("realtime battle is not active, shouldn't be receiving data to this callback..")
+		log.warning("realtime battle is not active, shouldn't be receiving data to this callback..")
 
 def connect(client, userdata, flags, r_c):
 	'''
 	This method is called when the client connects to MQTT Broker
 	'''
-	print('Connected to MQTT Broker!')
+	log.info('Connected to MQTT Broker!')
 
 def disconnect(client, userdata, r_c):
 	'''
 	This method is called when the client disconnects from the MQTT Broker
 	'''
-	print('Disconnected from MQTT Broker!')
+	log.info('Disconnected from MQTT Broker!')
 
 def subscribe(client, userdata, topic, granted_qos):
 	'''
 	This method is called when the client subscribes to a new feed.
 	'''
-	print(f"Subscribed to {topic} with QOS level {granted_qos}")
+	log.info("Subscribed to %s with QOS level %s", topic, granted_qos)
 
 def unsubscribe(client, userdata, topic, pid):
 	'''
 	This method is called when the client unsubscribes from a feed.
 	'''
-	print(f"Unsubscribed from {topic} with PID {pid}")
+	log.info("Unsubscribed from %s with PID %s", topic, pid)
@@ -0,0 +1,146 @@
+'''
+outbound.py
+Bounded queue of messages waiting to be published.
+'''
+
+import array
+
+class OutboundQueue:
+	'''
+	Messages waiting to be published, oldest first, stored back to back
+	in a preallocated buffer of `size` bytes with at most `slots` messages.
+
+	A message pushed as `replaceable` (such as a heartbeat) replaces the newest queued
+	message if that is also replaceable and for the same topic.
+	When full, the oldest messages are dropped to make room.
+	'''
+	# pylint: disable=too-many-instance-attributes
+	def __init__(self, size=2048, slots=16):
+		self._size = size
+		self._buffer = bytearray(size)
+		self._view = memoryview(self._buffer)
+		self._slots = slots
+		self._starts = array.array("H", [0] * slots)
+		self._lengths = array.array("H", [0] * slots)
+		self._replaceable = bytearray(slots)
+		self._topics = [None] * slots
+		self._head = 0
+		self._count = 0
+		self._used = 0
+		self.pushed = 0
+		self.sent = 0
+		self.dropped = 0
+		self.coalesced = 0
+		self.failures = 0
+		self.max_depth = 0
+	def __len__(self):
+		return self._count
+	def _slot(self, i):
+		return (self._head + i) % self._slots
+	def _compact(self):
+		if self._count == 0:
+			self._used = 0
+			return
+		start = self._starts[self._head]
+		if start == 0:
+			return
+		self._view[0:self._used - start] = self._view[start:self._used]
+		self._used -= start
+		for i in range(self._count):
+			self._starts[self._slot(i)] -= start
+	def _drop_oldest(self):
+		self.pop()
+		self.dropped += 1
+	def push(self, topic, message, replaceable=False):
+		'''
+		Add a message (str or bytes) for `topic`.
+		Returns False if it was dropped because it is bigger than the buffer.
+		'''
+		if isinstance(message, str):
+			message = message.encode("utf-8")
+		length = len(message)
+		if length > self._size:
+			self.dropped += 1
+			return False
+		self.pushed += 1
+		if replaceable and self._count > 0:
+			newest = self._slot(self._count - 1)
+			if self._replaceable[newest] and self._topics[newest] == topic:
+				self._count -= 1
+				self._used = self._starts[newest]
+				self._topics[newest] = None
+				self.coalesced += 1
+		while self._count == self._slots:
+			self._drop_oldest()
+		if self._used + length > self._size:
+			self._compact()
+			while self._used + length > self._size:
+				self._drop_oldest()
+				self._compact()
+		slot = self._slot(self._count)
+		self._starts[slot] = self._used
+		self._lengths[slot] = length
+		self._replaceable[slot] = replaceable
+		self._topics[slot] = topic
+		self._view[self._used:self._used + length] = message
+		self._used += length
+		self._count += 1
+		self.max_depth = max(self.max_depth, self._count)
+		return True
+	def peek(self):
+		'''
+		Return (topic, message bytes) of the oldest message, or None if empty.
+		'''
+		if self._count == 0:
+			return None
+		start = self._starts[self._head]
+		return (self._topics[self._head], bytes(self._view[start:start + self._lengths[self._head]]))
+	def pop(self):
+		'''
+		Remove the oldest message.
+		'''
+		if self._count == 0:
+			return
+		self._topics[self._head] = None
+		self._head = (self._head + 1) % self._slots
+		self._count -= 1
+		if self._count == 0:
+			self._used = 0
+	def flush(self, publish, max_messages=None):
+		'''
+		Publish queued messages oldest first with `publish(topic, message)`.
+		A message is only removed once published; if `publish` raises,
+		the message stays queued for retrying and the exception propagates.
+		Returns the number published.
+		'''
+		published = 0
+		while self._count > 0 and (max_messages is None or published < max_messages):
+			(topic, message) = self.peek()
+			try:
+				publish(topic, message)
+			except Exception:
+				self.failures += 1
+				raise
+			self.pop()
+			self.sent += 1
+			published += 1
+		return published
+	def stats(self):
+		'''
+		Counters as a dictionary.
+		'''
+		return {
+			"depth": self._count,
+			"bytes": self.bytes_queued(),
+			"max_depth": self.max_depth,
+			"pushed": self.pushed,
+			"sent": self.sent,
+			"dropped": self.dropped,
+			"coalesced": self.coalesced,
+			"failures": self.failures,
+		}
+	def bytes_queued(self):
+		'''
+		Total size of the queued messages.
+		'''
+		return sum(self._lengths[self._slot(i)] for i in range(self._count))
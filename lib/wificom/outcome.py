@@ -0,0 +1,78 @@
+'''
+outcome.py
+Classifies the result of executing a digirom.
+'''
+
+COMPLETE = "ok"
+PARTIAL = "partial"
+NO_REPLY = "none"
+ERROR = "error"
+
+# Short forms for the screen
+SYMBOLS = {
+	COMPLETE: "ok",
+	PARTIAL: "~",
+	NO_REPLY: "-",
+	ERROR: "!",
+}
+
+def _kind(segment):
+	'''
+	Kind of a result segment: the letter before the colon, such as "s" or "r".
+	'''
+	return str(segment)[0]
+
+def classify(rom, result, error=None):
+	'''
+	Classify the `result` of executing `rom`, which raised `error` if not None:
+	* ERROR if there was an error;
+	* NO_REPLY if nothing was received;
+	* PARTIAL if the toy did not reply to every packet, or on turn 1,
+		a segment other than the first is "t";
+	* COMPLETE otherwise.
+	'''
+	if error is not None:
+		return ERROR
+	received = False
+	for (i, segment) in enumerate(result):
+		kind = _kind(segment)
+		if kind == "r":
+			received = True
+		elif kind == "t" and i > 0 and rom.turn == 1:
+			return PARTIAL
+	if not received:
+		return NO_REPLY
+	if len(result) < 2 * len(rom):
+		return PARTIAL
+	return COMPLETE
+
+class Outcome:
+	'''
+	The outcome of executing `rom` once, which raised `error` if not None.
+	`code` is the classification; the result text is only built when needed.
+	'''
+	def __init__(self, rom, error=None):
+		self._result = rom.result  # kept, since the next execution replaces it
+		self._error = error
+		self.code = classify(rom, self._result, error)
+		self._text = None
+	@property
+	def complete(self):
+		'''
+		Whether the toy completed the exchange.
+		'''
+		return self.code == COMPLETE
+	def text(self):
+		'''
+		The result as text, followed by the error if any.
+		'''
+		if self._text is None:
+			text = str(self._result)
+			if self._error is not None:
+				if len(text) > 0:
+					text += " "
+				text += repr(self._error)
+			self._text = text
+		return self._text
+	def __str__(self):
+		return self.text()
@@ -3,9 +3,18 @@ punchbag.py
 Handles the DigiROM tree.
 '''
 
+import array
+import struct
+
 NO_CONTENT = -1
 LEADING_SPACE = -2
 
+_INDEX_MAGIC = b"WCIX"
+_INDEX_VERSION = 2
+_INDEX_HEADER = "<4sBIII"  # magic, version, source size, source mtime, node count
+_INDEX_HEADER_SIZE = struct.calcsize(_INDEX_HEADER)
+PATH_SEPARATOR = "/"
+
 def count_tabs(line):
 	'''
 	Count leading tabs on line.
@@ -24,76 +33,293 @@ def count_tabs(line):
 			return tabs
 	return NO_CONTENT
 
+def words(text):
+	'''
+	Split text into lowercase words of letters and digits.
+	'''
+	result = []
+	start = None
+	text = text.lower()
+	for (i, character) in enumerate(text):
+		if character.isalpha() or character.isdigit():
+			if start is None:
+				start = i
+		elif start is not None:
+			result.append(text[start:i])
+			start = None
+	if start is not None:
+		result.append(text[start:])
+	return result
+
+def word_key(word, fill=0):
+	'''
+	The first 4 bytes of `word` as an integer, padded with `fill`, for the search index.
+	'''
+	prefix = word.encode("utf-8")[:4]
+	return int.from_bytes(prefix + bytes([fill]) * (4 - len(prefix)), "big")
+
+def _lower_bound(arr, value):
+	'''First position in sorted `arr` where the item is not less than `value`.'''
+	low = 0
+	high = len(arr)
+	while low < high:
+		middle = (low + high) // 2
+		if arr[middle] < value:
+			low = middle + 1
+		else:
+			high = middle
+	return low
+
+def source_key(stat_result):
+	'''
+	Make the (size, mtime) key for an `os.stat` result, used to validate a saved index.
+	'''
+	return (stat_result[6], int(stat_result[8]) & 0xFFFFFFFF)
+
 class DigiROM_Node:  #pylint:disable=invalid-name
 	'''
 	Node for the DigiROM tree.
 	'''
-	def __init__(self, text, pos):
+	def __init__(self, text, pos, index, leaf_pos):
 		self.text = text
 		self.pos = pos
-		self.leaf_pos = []  # List for internal use, becomes int or None before handing back
+		self.index = index
+		self.leaf_pos = leaf_pos  # int or None
 
-class DigiROM_Tree:  #pylint:disable=invalid-name
+class DigiROM_Index:  #pylint:disable=invalid-name
 	'''
-	Parser for the DigiROM tree.
+	Compact index of the content lines in a DigiROM file.
+
+	Each content line is a node, in file order. Per node we store the seek position,
+	line number, depth, and `end`: the index of the first node after its subtree.
+	The children of node `i` are `i+1`, then `end[child]` repeatedly until `end[i]`.
+
+	For searching, each word of each title (not digirom lines) has an entry
+	in `word_keys` (see `word_key`), sorted, with the node in `word_nodes`.
 	'''
-	def __init__(self, file_obj):
-		self._file_obj = file_obj
-		self._menu_path = []
-	def depth(self):
-		'''How many steps into the menu.'''
-		return len(self._menu_path)
-	def children(self):
-		'''Options at current point, as [DigiROM_Node].'''
-		# pylint: disable=too-many-branches
-		result = []
-		f = self._file_obj
-		start_tabs = len(self._menu_path) - 1
-		if start_tabs == -1:
-			pos = 0
-			f.seek(pos)
-		else:
-			pos = self._menu_path[-1]
-			f.seek(pos)
-			f.readline()
-		prev_tabs = start_tabs
-		tabs = NO_CONTENT
+	def __init__(self, count, total_lines, word_count=0):
+		self.count = count
+		self.total_lines = total_lines
+		self.offsets = array.array("I", bytes(4 * count))
+		self.lines = array.array("I", bytes(4 * count))
+		self.depths = array.array("H", bytes(2 * count))
+		self.ends = array.array("I", bytes(4 * count))
+		self.word_keys = array.array("I", bytes(4 * word_count))
+		self.word_nodes = array.array("I", bytes(4 * word_count))
+	def is_digirom(self, i):
+		'''Whether node `i` is the digirom line of a leaf.'''
+		return i > 0 and self.is_leaf(i - 1)
+	def word_range(self, word):
+		'''
+		Positions (start, end) in `word_keys` of the words which might begin with `word`.
+		'''
+		return (_lower_bound(self.word_keys, word_key(word)),
+			_lower_bound(self.word_keys, word_key(word, 0xFF) + 1))
+	def is_leaf(self, i):
+		'''Whether node `i` holds a digirom (exactly one child, which has no children).'''
+		return self.ends[i] == i + 2
+	def line_after(self, i):
+		'''Line number of the node after the subtree of `i`, or the last line if none.'''
+		end = self.ends[i]
+		if end < self.count:
+			return self.lines[end]
+		return self.total_lines
+	@staticmethod
+	def build(file_obj):
+		'''
+		Scan the whole file once and return a new index.
+		Raises ValueError for layout errors.
+		'''
+		file_obj.seek(0)
+		# First pass: validate and count nodes
+		count = 0
+		line_number = 0
+		prev_tabs = -1
 		while True:
-			if tabs != NO_CONTENT:
-				prev_tabs = tabs
-			pos = f.tell()
-			line = f.readline()
+			line = file_obj.readline()
 			if line == "":
-				# EOF
-				if prev_tabs == 0:
-					self._error("Layout error", pos)
 				break
+			line_number += 1
 			tabs = count_tabs(line)
 			if tabs == LEADING_SPACE:
-				self._error("Tabs required", pos)
+				raise ValueError(f"L{line_number}: Tabs required")
 			if tabs == NO_CONTENT:
 				continue
-			if tabs <= start_tabs:
-				break
 			tab_step = tabs - prev_tabs
 			if tab_step == 0 or tab_step > 1:
-				self._error("Layout error", pos)
-			if tabs == start_tabs + 1:
-				result.append(DigiROM_Node(line.strip(), pos))
-			elif tab_step == 1:
-				if result[-1].leaf_pos is not None:
-					result[-1].leaf_pos.append(pos)
-			else:
-				# tab_step < 0 and tabs > start_tabs + 1
-				result[-1].leaf_pos = None
-		for item in result:
-			if item.leaf_pos is not None and len(item.leaf_pos) == 1:
-				item.leaf_pos = item.leaf_pos[0]
-			else:
-				item.leaf_pos = None
-		if not result:
-			self._error("Nothing here", pos)
+				raise ValueError(f"L{line_number}: Layout error")
+			prev_tabs = tabs
+			count += 1
+		if prev_tabs == 0:
+			raise ValueError(f"L{line_number}: Layout error")
+		index = DigiROM_Index(count, line_number)
+		# Second pass: fill arrays
+		file_obj.seek(0)
+		stack = []
+		i = 0
+		line_number = 0
+		while True:
+			pos = file_obj.tell()
+			line = file_obj.readline()
+			if line == "":
+				break
+			line_number += 1
+			tabs = count_tabs(line)
+			if tabs == NO_CONTENT:
+				continue
+			while len(stack) > tabs:
+				index.ends[stack.pop()] = i
+			index.offsets[i] = pos
+			index.lines[i] = line_number
+			index.depths[i] = tabs
+			stack.append(i)
+			i += 1
+		for j in stack:
+			index.ends[j] = count
+		index.build_words(file_obj)
+		return index
+	def build_words(self, file_obj):
+		'''
+		Fill the search index from the titles in the file.
+		'''
+		entries = []
+		for i in range(self.count):
+			if self.is_digirom(i):
+				continue
+			file_obj.seek(self.offsets[i])
+			for word in words(file_obj.readline()):
+				entries.append((word_key(word) << 32) | i)
+		entries.sort()
+		self.word_keys = array.array("I", (entry >> 32 for entry in entries))
+		self.word_nodes = array.array("I", (entry & 0xFFFFFFFF for entry in entries))
+	@staticmethod
+	def load(filename, key):
+		'''
+		Load index from filename if it was saved with the same source key, else return None.
+		'''
+		try:
+			with open(filename, "rb") as f:
+				header = f.read(_INDEX_HEADER_SIZE)
+				if len(header) != _INDEX_HEADER_SIZE:
+					return None
+				(magic, version, size, mtime, count) = struct.unpack(_INDEX_HEADER, header)
+				if magic != _INDEX_MAGIC or version != _INDEX_VERSION or (size, mtime) != key:
+					return None
+				(total_lines, word_count) = struct.unpack("<II", f.read(8))
+				index = DigiROM_Index(count, total_lines, word_count)
+				for arr in (index.offsets, index.lines, index.depths, index.ends,
+						index.word_keys, index.word_nodes):
+					expected = len(arr) * arr.itemsize
+					if expected > 0 and f.readinto(arr) != expected:
+						return None
+		except (OSError, ValueError, struct.error):
+			return None
+		return index
+	def save(self, filename, key):
+		'''
+		Save index to filename. Returns False if the file cannot be written (e.g. read-only).
+		'''
+		try:
+			with open(filename, "wb") as f:
+				f.write(struct.pack(_INDEX_HEADER, _INDEX_MAGIC, _INDEX_VERSION,
+					key[0], key[1], self.count))
+				f.write(struct.pack("<II", self.total_lines, len(self.word_keys)))
+				for arr in (self.offsets, self.lines, self.depths, self.ends,
+						self.word_keys, self.word_nodes):
+					f.write(arr)
+		except OSError:
+			return False
+		return True
+
+class DigiROM_Tree:  #pylint:disable=invalid-name
+	'''
+	Parser for the DigiROM tree.
+
+	The file is scanned once into a `DigiROM_Index` on first use.
+	If `index_filename` and `source_stat` (`os.stat` of the DigiROM file) are given,
+	the index is loaded from / saved to that file, keyed by the source size and mtime.
+	'''
+	def __init__(self, file_obj, index_filename=None, source_stat=None):
+		self._file_obj = file_obj
+		self._index_filename = index_filename
+		self._source_key = None if source_stat is None else source_key(source_stat)
+		self._index = None
+		self._menu_path = []
+		self._cursor = None  # (depth, option number, node index, option count or None)
+	def depth(self):
+		'''How many steps into the menu.'''
+		return len(self._menu_path)
+	def index(self):
+		'''Get the index, loading or building it if needed. Raises ValueError on layout errors.'''
+		if self._index is not None:
+			return self._index
+		use_file = self._index_filename is not None and self._source_key is not None
+		if use_file:
+			self._index = DigiROM_Index.load(self._index_filename, self._source_key)
+		if self._index is None:
+			self._index = DigiROM_Index.build(self._file_obj)
+			if use_file:
+				self._index.save(self._index_filename, self._source_key)
+		return self._index
+	def _level(self):
+		'''(first child, end, line number for errors) at the current point.'''
+		index = self.index()
+		if len(self._menu_path) == 0:
+			return (0, index.count, index.total_lines)
+		parent = self._menu_path[-1]
+		return (parent + 1, index.ends[parent], index.line_after(parent))
+	def _node(self, i):
+		index = self.index()
+		pos = index.offsets[i]
+		f = self._file_obj
+		f.seek(pos)
+		text = f.readline().strip()
+		leaf_pos = index.offsets[i + 1] if index.is_leaf(i) else None
+		return DigiROM_Node(text, pos, i, leaf_pos)
+	def child_count(self):
+		'''Number of options at current point.'''
+		level = len(self._menu_path)
+		if self._cursor is not None and self._cursor[0] == level and self._cursor[3] is not None:
+			return self._cursor[3]
+		(first, end, error_line) = self._level()
+		ends = self.index().ends
+		count = 0
+		i = first
+		while i < end:
+			count += 1
+			i = ends[i]
+		if count == 0:
+			self._error("Nothing here", error_line)
+		self._cursor = (level, 0, first, count)
+		return count
+	def children_window(self, start, count):
+		'''
+		Up to `count` options at current point, from option number `start`, as [DigiROM_Node].
+		Only these lines are read. Moving forward from the previous window is quickest.
+		'''
+		(i, end, error_line) = self._level()
+		if i >= end:
+			self._error("Nothing here", error_line)
+		level = len(self._menu_path)
+		position = 0
+		total = None
+		if self._cursor is not None and self._cursor[0] == level:
+			total = self._cursor[3]
+			if self._cursor[1] <= start:
+				(_, position, i, _) = self._cursor
+		ends = self.index().ends
+		while position < start and i < end:
+			position += 1
+			i = ends[i]
+		self._cursor = (level, position, i, total)
+		result = []
+		while len(result) < count and i < end:
+			result.append(self._node(i))
+			i = ends[i]
 		return result
+	def children(self):
+		'''Options at current point, as [DigiROM_Node].'''
+		return self.children_window(0, self.child_count())
 	def digirom(self, node):
 		'''Get the digirom at the chosen node, or None if not existing.'''
 		if node.leaf_pos is None:
@@ -101,20 +327,76 @@ class DigiROM_Tree:  #pylint:disable=invalid-name
 		f = self._file_obj
 		f.seek(node.leaf_pos)
 		return f.readline().strip()
+	def path(self, node):
+		'''Titles from the top level down to the chosen node, as a list.'''
+		index = self.index()
+		i = node.index
+		result = [node.text]
+		depth = index.depths[i]
+		while depth > 0:
+			i -= 1
+			if index.depths[i] < depth:
+				depth = index.depths[i]
+				result.insert(0, self._node(i).text)
+		return result
+	def find(self, titles):
+		'''
+		Find the node at the path given by a list of titles from the top level (ignoring case),
+		without changing the menu position. Raises ValueError if not found.
+		'''
+		index = self.index()
+		i = 0
+		end = index.count
+		node = None
+		for title in titles:
+			title = title.strip().lower()
+			node = None
+			while i < end:
+				if not index.is_digirom(i):
+					candidate = self._node(i)
+					if candidate.text.lower() == title:
+						node = candidate
+						break
+				i = index.ends[i]
+			if node is None:
+				raise ValueError("Not found: " + PATH_SEPARATOR.join(titles))
+			(i, end) = (node.index + 1, index.ends[node.index])
+		if node is None:
+			raise ValueError("Empty path")
+		return node
+	def search(self, query, limit=None):
+		'''
+		Find titles containing a word beginning with each word of `query` (ignoring case).
+		Returns up to `limit` matching nodes as [DigiROM_Node], in file order.
+		'''
+		index = self.index()
+		query_words = words(query)
+		if not query_words:
+			return []
+		ranges = [index.word_range(word) for word in query_words]
+		(start, end) = min(ranges, key=lambda item: item[1] - item[0])
+		candidates = sorted(set(index.word_nodes[start:end]))
+		result = []
+		for i in candidates:
+			node = self._node(i)
+			title_words = words(node.text)
+			if all(any(title_word.startswith(word) for title_word in title_words)
+					for word in query_words):
+				result.append(node)
+				if limit is not None and len(result) >= limit:
+					break
+		return result
 	def pick(self, node):
 		'''Move to the menu option at the chosen node.'''
 		if node.leaf_pos is not None:
-			self._error("No menu here", node.pos)
-		self._menu_path.append(node.pos)
+			self._error("No menu here", self.index().lines[node.index])
+		self._menu_path.append(node.index)
+		self._cursor = None
 	def back(self):
 		'''Step back one menu level. Ignored if at the root.'''
 		if len(self._menu_path) > 0:
 			self._menu_path.pop()
-	def _error(self, message, pos):
-		'''Raise ValueError with start-of-line seek position converted to line number.'''
-		f = self._file_obj
-		f.seek(0)
-		line_number = 0
-		while f.tell() <= pos and f.readline() != "":
-			line_number += 1
+			self._cursor = None
+	def _error(self, message, line_number):
+		'''Raise ValueError with line number.'''
 		raise ValueError(f"L{line_number}: {message}")
@@ -1,18 +1,99 @@
 '''
 realtime.py
 Handles real-time battle logic.
+
+Each battle keeps a timeline of its events, with times since it started,
+which is passed to the outcome callback as the battle ends.
+The battle starts at the scan for the host, or when a message arrives for the guest.
+Events:
+* scan: scanning the toy;
+* scanned, scan_fail: scan was successful or not;
+* sent: message sent to the other player;
+* message: message arrived from the other player;
+* received: digirom taken from the message;
+* comm: communicating with the toy using the received digirom;
+* comm_ok, comm_fail: that was successful or not;
+* timeout: no reply from the other player in time;
+* error: unexpected message.
 '''
 
+import array
 import time
 import dmcomm.protocol
 from dmcomm import CommandError
+from wificom import digirom_cache
+from wificom import outcome
 
 STATUS_IDLE = 0
 STATUS_WAIT = 1
 STATUS_PUSH = 2
 
+EVENT_SCAN = 0
+EVENT_SCANNED = 1
+EVENT_SCAN_FAIL = 2
+EVENT_SENT = 3
+EVENT_MESSAGE = 4
+EVENT_RECEIVED = 5
+EVENT_COMM = 6
+EVENT_COMM_OK = 7
+EVENT_COMM_FAIL = 8
+EVENT_TIMEOUT = 9
+EVENT_ERROR = 10
+
+EVENT_NAMES = ("scan", "scanned", "scan_fail", "sent", "message", "received",
+	"comm", "comm_ok", "comm_fail", "timeout", "error")
+
+TIMELINE_SIZE = 32
+
 _MESSAGE_EXPIRY_TIME = 30
 
+class Timeline:
+	'''
+	Events of one battle with their times, in a fixed-size buffer.
+	Events after the first `size` are counted in `dropped`.
+	'''
+	def __init__(self, size=TIMELINE_SIZE):
+		self._times = array.array("f", [0] * size)
+		self._events = bytearray(size)
+		self._count = 0
+		self.time_start = None
+		self.dropped = 0
+	def __len__(self):
+		return self._count
+	def start(self, event):
+		'''
+		Forget any earlier events and start the timeline with `event`.
+		'''
+		self.time_start = time.monotonic()
+		self._count = 0
+		self.dropped = 0
+		self.mark(event)
+	def mark(self, event):
+		'''
+		Add `event` at the current time, if the timeline was started.
+		'''
+		if self.time_start is None:
+			return
+		if self._count == len(self._events):
+			self.dropped += 1
+			return
+		self._times[self._count] = time.monotonic() - self.time_start
+		self._events[self._count] = event
+		self._count += 1
+	def clear(self):
+		'''
+		Forget all events until the next start.
+		'''
+		self.time_start = None
+		self._count = 0
+		self.dropped = 0
+	def items(self):
+		'''
+		List of [milliseconds since start, event name].
+		'''
+		return [[round(self._times[i] * 1000), EVENT_NAMES[self._events[i]]]
+			for i in range(self._count)]
+
 class RealTime:
 	'''
 	Abstract base class for real-time battles.
@@ -21,18 +102,24 @@ class RealTime:
 	* `def message(self)` - the message to send to the other player.
 	* `def matched(self, rom_str)` - True if the incoming digirom string
 		fits the expected pattern, False otherwise.
+
+	`outcome_callback` (optional) is called with an outcome code and the timeline
+	as each battle ends. The timeline is cleared afterwards.
 	'''
-	def __init__(self, execute_callback, send_callback, receive_callback, status_callback):
+	def __init__(self, execute_callback, send_callback, receive_callback, status_callback,
+			outcome_callback=None):
 		self._execute_callback = execute_callback
 		self._send_callback = send_callback
 		self._receive_callback = receive_callback
 		self._status_callback = status_callback
+		self._outcome_callback = outcome_callback
 		self.time_start = None
 		self.result = None
 		self.status = STATUS_IDLE
 		self.received_message = None
 		self.received_digirom = None
 		self.comm_attempts = 0  # for host only
+		self.timeline = Timeline()
 	def execute(self, digirom, do_led, do_beep):
 		'''
 		Execute digirom using the execute callback, and store result.
@@ -52,6 +139,7 @@ class RealTime:
 		and `message` function as defined by subclass.
 		'''
 		self._send_callback(self.message())
+		self.timeline.mark(EVENT_SENT)
 	def receive_message(self):
 		'''
 		Receive and store message from the other player if there is one,
@@ -66,6 +154,7 @@ class RealTime:
 		message = self._receive_callback()
 		if message is not None:
 			self.received_message = (time.monotonic(), message)
+			self.timeline.mark(EVENT_MESSAGE)
 	def receive_digirom(self):
 		'''
 		Receive digirom from the other player if there is one, from the queued message.
@@ -80,11 +169,24 @@ class RealTime:
 		(_, message) = self.received_message
 		self.received_message = None
 		if not self.matched(message):
+			self.timeline.mark(EVENT_ERROR)
+			self.report(outcome.ERROR)
 			raise CommandError("Unexpected RTB message type: " + str(message))
 		self.received_digirom = dmcomm.protocol.parse_command(message)
 		if not self.modify_received_digirom():
 			self.received_digirom = None
+			self.timeline.mark(EVENT_ERROR)
+			self.report(outcome.ERROR)
 			raise CommandError("Unexpected RTB message contents: " + str(message))
+		self.timeline.mark(EVENT_RECEIVED)
+	def report(self, code):
+		'''
+		Report the outcome of a battle to the outcome callback, if there is one,
+		and clear the timeline.
+		'''
+		if self._outcome_callback is not None:
+			self._outcome_callback(code, self.timeline)
+		self.timeline.clear()
 	def update_status(self, status):
 		'''
 		Report current status to the status callback and save it here.
@@ -121,16 +223,22 @@ class RealTimeHost(RealTime):
 				self._attempt_second_comm()
 		elif self.time_start is None:
 			self.update_status(STATUS_PUSH)
-			digirom = dmcomm.protocol.parse_command(self.scan_str)
+			self.timeline.start(EVENT_SCAN)
+			digirom = digirom_cache.parse_command(self.scan_str)
 			self.execute(digirom, do_led=False, do_beep=False)
 			if self.scan_successful():
+				self.timeline.mark(EVENT_SCANNED)
 				self.send_message()
 				self.time_start = time.monotonic()
 				self.update_status(STATUS_WAIT)
+			else:
+				self.timeline.mark(EVENT_SCAN_FAIL)
 		elif time.monotonic() - self.time_start < self.wait_min:
 			self.update_status(STATUS_WAIT)
 		elif time.monotonic() - self.time_start > self.wait_max:
 			self.time_start = None
+			self.timeline.mark(EVENT_TIMEOUT)
+			self.report(outcome.NO_REPLY)
 		else:
 			self.update_status(STATUS_WAIT)
 			self.receive_digirom()
@@ -138,16 +246,21 @@ class RealTimeHost(RealTime):
 				self.comm_attempts = 0
 				self._attempt_second_comm()
 	def _attempt_second_comm(self):
+		self.timeline.mark(EVENT_COMM)
 		self.execute(self.received_digirom, do_led=True, do_beep=True)
 		if self.comm_successful():
+			self.timeline.mark(EVENT_COMM_OK)
 			self.received_digirom = None
 			self.time_start = None
+			self.report(outcome.COMPLETE)
 		else:
+			self.timeline.mark(EVENT_COMM_FAIL)
 			self.time_start = time.monotonic()
 			self.comm_attempts += 1
 			if self.comm_attempts >= self.max_attempts:
 				self.received_digirom = None
 				self.time_start = None
+				self.report(outcome.PARTIAL)
 
 class RealTimeGuest(RealTime):
 	'''
@@ -163,13 +276,21 @@ class RealTimeGuest(RealTime):
 		Update state machine. Should be called repeatedly.
 		'''
 		self.receive_message()
+		if self.received_message is not None and self.timeline.time_start is None:
+			self.timeline.start(EVENT_MESSAGE)
 		self.receive_digirom()
 		if self.received_digirom is not None:
 			self.update_status(STATUS_PUSH)
+			self.timeline.mark(EVENT_COMM)
 			self.execute(self.received_digirom, do_led=False, do_beep=True)
 			self.update_status(STATUS_WAIT)
 			if self.comm_successful():
+				self.timeline.mark(EVENT_COMM_OK)
 				self.send_message()
+				self.report(outcome.COMPLETE)
+			else:
+				self.timeline.mark(EVENT_COMM_FAIL)
+				self.report(outcome.PARTIAL)
 
 class RealTimeGuestTalis(RealTimeHost):
 	'''
@@ -0,0 +1,110 @@
+'''
+reconnect.py
+Restores a lost WiFi/MQTT connection without rebooting.
+'''
+
+import time
+from wificom import log
+
+STATE_CONNECTED = "connected"
+STATE_WIFI = "wifi"
+STATE_MQTT = "mqtt"
+
+class Reconnector:
+	'''
+	Connection state machine: connected -> (wifi ->) mqtt -> connected.
+
+	After `lost` is called, each `step` makes one attempt at the current stage once
+	its backoff delay has passed: `join_wifi()` in the wifi state, `connect_mqtt()` in
+	the mqtt state. Both return True on success or raise/return False on failure.
+	The delay starts at `min_delay` and doubles after each failure up to `max_delay`.
+	`is_wifi_joined()` decides whether the wifi stage is needed.
+	'''
+	# pylint: disable=too-many-instance-attributes,too-many-arguments
+	def __init__(self, is_wifi_joined, join_wifi, connect_mqtt,
+			min_delay=1, max_delay=32, clock=None):
+		self._is_wifi_joined = is_wifi_joined
+		self._join_wifi = join_wifi
+		self._connect_mqtt = connect_mqtt
+		self._min_delay = min_delay
+		self._max_delay = max_delay
+		self._clock = time.monotonic if clock is None else clock
+		self.state = STATE_CONNECTED
+		self._delay = min_delay
+		self._next_attempt = 0
+		self._lost_time = None
+		self.attempts = 0
+		self.outages = 0
+		self.last_recovery = None
+		self.max_recovery = 0
+		self.total_recovery = 0
+	@property
+	def connected(self):
+		'''
+		Whether the connection is up, as far as we know.
+		'''
+		return self.state == STATE_CONNECTED
+	def lost(self, error=None):
+		'''
+		Report that the connection failed with `error`. Does nothing if already reconnecting.
+		'''
+		if not self.connected:
+			return
+		log.warning("Connection lost: %r", error)
+		self.outages += 1
+		self.attempts = 0
+		self._lost_time = self._clock()
+		self._delay = self._min_delay
+		self._next_attempt = self._lost_time
+		self.state = STATE_MQTT if self._is_wifi_joined() else STATE_WIFI
+	def time_to_next_attempt(self):
+		'''
+		Seconds until `step` will try again (0 if connected or due).
+		'''
+		if self.connected:
+			return 0
+		return max(0, self._next_attempt - self._clock())
+	def _attempt(self, function):
+		self.attempts += 1
+		try:
+			if function():
+				self._delay = self._min_delay
+				return True
+		except Exception as e:  # pylint: disable=broad-except
+			log.warning("Reconnect attempt %d failed: %r", self.attempts, e)
+		self._next_attempt = self._clock() + self._delay
+		self._delay = min(self._delay * 2, self._max_delay)
+		return False
+	def step(self):
+		'''
+		Make the next attempt if due. Returns True if connected.
+		'''
+		if self.connected:
+			return True
+		if self._clock() < self._next_attempt:
+			return False
+		if self.state == STATE_WIFI:
+			if not self._attempt(self._join_wifi):
+				return False
+			self.state = STATE_MQTT
+		if not self._is_wifi_joined():
+			self.state = STATE_WIFI
+			return False
+		if not self._attempt(self._connect_mqtt):
+			return False
+		self.state = STATE_CONNECTED
+		recovery = self._clock() - self._lost_time
+		self.last_recovery = recovery
+		self.total_recovery += recovery
+		self.max_recovery = max(self.max_recovery, recovery)
+		log.info("Reconnected after %.3fs (%d attempts)", recovery, self.attempts)
+		return True
+	def stats(self):
+		'''
+		Return a short text summary of outages and time to recover.
+		'''
+		if self.outages == 0:
+			return "Reconnects: no outages"
+		recovered = self.outages - (0 if self.connected else 1)
+		mean = self.total_recovery / recovered if recovered > 0 else 0
+		return f"Reconnects: {self.outages} outages, recovery mean {mean:.3f}s max {self.max_recovery:.3f}s"
@@ -0,0 +1,132 @@
+'''
+scheduler.py
+Cooperative scheduler for the main loops.
+'''
+
+import time
+
+class Task:
+	'''
+	A task for the Scheduler: `callback` runs when `deadline` is reached,
+	then the deadline moves on by `period` seconds. Stopped when deadline is None.
+	'''
+	def __init__(self, name, callback, period):
+		self.name = name
+		self.callback = callback
+		self.period = period
+		self.deadline = None
+		self.due = None  # deadline of the latest run
+		self.runs = 0
+		self.max_lateness = 0
+		self.total_lateness = 0
+	@property
+	def running(self):
+		'''
+		Whether the task is scheduled.
+		'''
+		return self.deadline is not None
+	def stats(self):
+		'''
+		Return a short text summary of run count and lateness.
+		'''
+		mean = self.total_lateness / self.runs if self.runs > 0 else 0
+		return f"{self.name}: {self.runs} runs, late mean {mean:.3f}s max {self.max_lateness:.3f}s"
+
+class Scheduler:
+	'''
+	Runs tasks in deadline order, sleeping until the next deadline when idle.
+	Tasks must not block for long, since nothing else runs meanwhile.
+
+	`clock` and `sleep` default to `time.monotonic` and `time.sleep`.
+	'''
+	def __init__(self, clock=None, sleep=None):
+		self._clock = time.monotonic if clock is None else clock
+		self._sleep = time.sleep if sleep is None else sleep
+		self._tasks = []
+		self._stop_requested = False
+		self.running = False
+	def add(self, name, callback, period, delay=None):
+		'''
+		Create a task and return it. It starts after `delay` seconds, or stays stopped if None.
+		'''
+		task = Task(name, callback, period)
+		self._tasks.append(task)
+		if delay is not None:
+			self.schedule(task, delay)
+		return task
+	def schedule(self, task, delay=0):
+		'''
+		(Re)start `task` to run after `delay` seconds.
+		'''
+		task.deadline = self._clock() + delay
+	def wake(self, task):
+		'''
+		Run `task` as soon as possible, whether or not it was stopped.
+		'''
+		self.schedule(task, 0)
+	def cancel(self, task):
+		'''
+		Stop `task` from running until it is scheduled again.
+		'''
+		task.deadline = None
+	def stop(self):
+		'''
+		Make `run` return, skipping any other tasks which are due.
+		'''
+		self.running = False
+		self._stop_requested = True
+	def next_delay(self):
+		'''
+		Seconds until the next deadline (can be negative), or None if no tasks are scheduled.
+		'''
+		deadline = None
+		for task in self._tasks:
+			if task.deadline is not None and (deadline is None or task.deadline < deadline):
+				deadline = task.deadline
+		if deadline is None:
+			return None
+		return deadline - self._clock()
+	def run_once(self):
+		'''
+		Run every task which is due, earliest deadline first.
+		'''
+		now = self._clock()
+		due = [task for task in self._tasks if task.deadline is not None and task.deadline <= now]
+		due.sort(key=lambda task: task.deadline)
+		for task in due:
+			if self._stop_requested:
+				break
+			now = self._clock()
+			if task.deadline is None or task.deadline > now:
+				continue  # Changed by an earlier task
+			lateness = now - task.deadline
+			task.due = task.deadline
+			task.runs += 1
+			task.total_lateness += lateness
+			if lateness > task.max_lateness:
+				task.max_lateness = lateness
+			# Move on before running, so the callback can reschedule.
+			# If we are a whole period behind, don't try to catch up.
+			next_deadline = task.deadline + task.period
+			task.deadline = next_deadline if next_deadline > now else now + task.period
+			task.callback()
+	def run(self, idle_max=1):
+		'''
+		Run tasks until `stop` is called. Sleeps up to `idle_max` seconds when idle.
+		'''
+		self.running = True
+		self._stop_requested = False
+		while self.running:
+			self.run_once()
+			if not self.running:
+				break
+			delay = self.next_delay()
+			if delay is None:
+				delay = idle_max
+			if delay > 0:
+				self._sleep(min(delay, idle_max))
+	def stats(self):
+		'''
+		Return a list of text summaries for all tasks.
+		'''
+		return [task.stats() for task in self._tasks]
@@ -0,0 +1,101 @@
+'''
+serial_lines.py
+Non-blocking line reader for serial input.
+'''
+
+_TERMINATORS = b"\r\n\0"
+
+class LineReader:
+	'''
+	Reads lines from a stream with `in_waiting` and `readinto` (such as `usb_cdc.Serial`).
+
+	Only bytes already waiting are read, in bulk, into a preallocated ring buffer,
+	so `readline` never blocks. Partial lines are kept until the rest arrives.
+	Lines end with CR, LF or NUL; empty lines are skipped.
+	'''
+	def __init__(self, stream, size=1024):
+		self._stream = stream
+		self._size = size
+		self._buffer = bytearray(size)
+		self._view = memoryview(self._buffer)
+		self._line = bytearray(size)
+		self._line_view = memoryview(self._line)
+		self._start = 0
+		self._count = 0
+		self._scanned = 0
+		self._discarding = False
+	@property
+	def pending(self):
+		'''
+		Number of bytes buffered which are not yet part of a returned line.
+		'''
+		return self._count
+	def clear(self):
+		'''
+		Discard buffered data and everything waiting on the stream.
+		'''
+		self._start = 0
+		self._count = 0
+		self._scanned = 0
+		self._discarding = False
+		while self._stream.in_waiting > 0:
+			self._stream.readinto(self._view[0:min(self._stream.in_waiting, self._size)])
+	def _fill(self):
+		available = min(self._stream.in_waiting, self._size - self._count)
+		while available > 0:
+			write_pos = (self._start + self._count) % self._size
+			chunk = min(available, self._size - write_pos)
+			received = self._stream.readinto(self._view[write_pos:write_pos + chunk])
+			if not received:
+				break
+			self._count += received
+			available -= received
+	def _consume(self, length):
+		self._start = (self._start + length) % self._size
+		self._count -= length
+		self._scanned = 0
+	def _copy_line(self, length):
+		first = min(length, self._size - self._start)
+		self._line_view[0:first] = self._view[self._start:self._start + first]
+		if length > first:
+			self._line_view[first:length] = self._view[0:length - first]
+	def readline(self):
+		'''
+		Return the next complete line as a stripped string, or None if there isn't one yet.
+		Prints and drops lines which are too long or not UTF-8.
+		'''
+		self._fill()
+		while True:
+			length = None
+			for i in range(self._scanned, self._count):
+				if self._buffer[(self._start + i) % self._size] in _TERMINATORS:
+					length = i
+					break
+			if length is None:
+				self._scanned = self._count
+				if self._count == self._size:
+					if not self._discarding:
+						print(f"line too long: over {self._size} bytes")
+					self._discarding = True
+					self._consume(self._count)
+					self._fill()
+					continue
+				if self._stream.in_waiting > 0:
+					self._fill()
+					continue
+				return None
+			if self._discarding:
+				self._discarding = False
+				self._consume(length + 1)
+				continue
+			self._copy_line(length)
+			self._consume(length + 1)
+			if length == 0:
+				continue
+			try:
+				line = str(self._line_view[0:length], "utf-8").strip()
+			except UnicodeError:
+				print(f"UnicodeError: {bytes(self._line_view[0:length])}")
+				continue
+			if line != "":
+				return line
@@ -5,6 +5,10 @@ Handles the stored settings.
 
 import json
 
+VERBOSITY_QUIET = 0
+VERBOSITY_NORMAL = 1
+VERBOSITY_FULL = 2
+
 def tenths(value):
 	'''
 	Convert float to integer number of tenths.
@@ -22,6 +26,13 @@ class Settings:
 		self._sound_on = True
 		self._turn_1_delay = 3
 		self._turn_1_delay_options = [0, 3, 5, -1]
+		self._heartbeat_time = 5
+		self._delta_heartbeats = False
+		self._log_boot_profile = False
+		self._loop_time = 5
+		self._signal_loop_times = {}
+		self._burst = False
+		self._verbosity = VERBOSITY_NORMAL
 		self._try_write = True
 		self._changed = False
 		self.error = None
@@ -46,6 +57,47 @@ class Settings:
 				self._turn_1_delay_options = opts
 			else:
 				self._changed = True
+			if "heartbeat_time" in data:
+				heartbeat_time = data["heartbeat_time"]
+				if heartbeat_time + 0 <= 0:  # Type check
+					raise ValueError("heartbeat_time must be positive")
+				self._heartbeat_time = heartbeat_time
+			else:
+				self._changed = True
+			if "delta_heartbeats" in data:
+				self._delta_heartbeats = bool(data["delta_heartbeats"])
+			else:
+				self._changed = True
+			if "log_boot_profile" in data:
+				self._log_boot_profile = bool(data["log_boot_profile"])
+			else:
+				self._changed = True
+			if "loop_time" in data:
+				loop_time = data["loop_time"]
+				if loop_time + 0 <= 0:  # Type check
+					raise ValueError("loop_time must be positive")
+				self._loop_time = loop_time
+			else:
+				self._changed = True
+			if "signal_loop_times" in data:
+				signal_loop_times = data["signal_loop_times"]
+				for signal_type in signal_loop_times:
+					if signal_loop_times[signal_type] + 0 < 0:  # Type check
+						raise ValueError("signal_loop_times must not be negative")
+				self._signal_loop_times = signal_loop_times
+			else:
+				self._changed = True
+			if "burst" in data:
+				self._burst = bool(data["burst"])
+			else:
+				self._changed = True
+			if "verbosity" in data:
+				verbosity = data["verbosity"]
+				if verbosity not in (VERBOSITY_QUIET, VERBOSITY_NORMAL, VERBOSITY_FULL):
+					raise ValueError("verbosity must be 0, 1 or 2")
+				self._verbosity = verbosity
+			else:
+				self._changed = True
 			self.save()  # Save if new keys were added
 		except OSError as e:
 			if e.errno == 2:
@@ -73,6 +125,13 @@ class Settings:
 			"sound_on": self._sound_on,
 			"turn_1_delay": self._turn_1_delay,
 			"turn_1_delay_options": self._turn_1_delay_options,
+			"heartbeat_time": self._heartbeat_time,
+			"delta_heartbeats": self._delta_heartbeats,
+			"log_boot_profile": self._log_boot_profile,
+			"loop_time": self._loop_time,
+			"signal_loop_times": self._signal_loop_times,
+			"burst": self._burst,
+			"verbosity": self._verbosity,
 		}
 		try:
 			with open(self._filepath, "w", encoding="utf-8") as json_file:
@@ -127,6 +186,82 @@ class Settings:
 		except ValueError:
 			options = options[:]  # Copy
 		return [current] + options
+	@property
+	def heartbeat_time(self):
+		'''
+		Seconds between status messages on WiFi while idle.
+		'''
+		return self._heartbeat_time
+	@heartbeat_time.setter
+	def heartbeat_time(self, value):
+		if tenths(self._heartbeat_time) == tenths(value):
+			return
+		self._heartbeat_time = value
+		self._changed = True
+	@property
+	def delta_heartbeats(self):
+		'''
+		Whether to send a minimal keepalive instead of the full status when nothing changed.
+		'''
+		return self._delta_heartbeats
+	@delta_heartbeats.setter
+	def delta_heartbeats(self, value):
+		if self._delta_heartbeats == value:
+			return
+		self._delta_heartbeats = value
+		self._changed = True
+	@property
+	def log_boot_profile(self):
+		'''
+		Whether to write the startup timings to a file. Read-only.
+		'''
+		return self._log_boot_profile
+	@property
+	def loop_time(self):
+		'''
+		Seconds from one execution of a digirom to the next,
+		unless set for the signal type in `signal_loop_times`.
+		'''
+		return self._loop_time
+	@loop_time.setter
+	def loop_time(self, value):
+		if tenths(self._loop_time) == tenths(value):
+			return
+		self._loop_time = value
+		self._changed = True
+	@property
+	def burst(self):
+		'''
+		Whether to execute a digirom again straight away after a complete exchange.
+		'''
+		return self._burst
+	@burst.setter
+	def burst(self, value):
+		if self._burst == value:
+			return
+		self._burst = value
+		self._changed = True
+	@property
+	def verbosity(self):
+		'''
+		How much to show on the console: VERBOSITY_QUIET for warnings and errors,
+		VERBOSITY_NORMAL to add status messages, VERBOSITY_FULL to add full messages.
+		'''
+		return self._verbosity
+	@verbosity.setter
+	def verbosity(self, value):
+		if self._verbosity == value:
+			return
+		self._verbosity = value
+		self._changed = True
+	def digirom_period(self, signal_type, complete):
+		'''
+		Seconds from an execution of a digirom with `signal_type` to the next.
+		`complete` is whether the toy completed the exchange.
+		'''
+		if complete and self._burst:
+			return 0
+		return self._signal_loop_times.get(signal_type, self._loop_time)
 	def initial_delay(self, turn, on_serial):
 		'''
 		Delay before first execution of new digirom.
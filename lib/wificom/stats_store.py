@@ -0,0 +1,153 @@
+'''
+stats_store.py
+Counts interaction outcomes per key (signal type, punchbag entry or RTB battle type),
+kept in RAM and saved to flash in batches.
+
+Counters are in one fixed-size array, a row per key and a column per outcome code.
+Writing to flash is slow and wears it, so `flush` only writes when something changed
+and at most once per flush interval, unless forced (such as when leaving a mode).
+The drive is read-only to the code while it is writeable over USB, so writes can fail;
+after a failure, no more writes are attempted.
+'''
+
+import array
+import json
+import time
+from wificom import outcome
+
+COLUMNS = (outcome.COMPLETE, outcome.PARTIAL, outcome.NO_REPLY, outcome.ERROR)
+MAX_KEYS = 32
+MAX_KEY_LENGTH = 24
+FLUSH_INTERVAL = 300
+
+def _toml_key(key):
+	return '"' + key.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+class StatsStore:
+	'''
+	Outcome counters for up to MAX_KEYS keys. Keys are cut to MAX_KEY_LENGTH.
+	Loaded from `filepath` on init if present, so counts carry on across restarts.
+	`filepath` None keeps counts in RAM only.
+	`error` becomes a string if the file could not be read or written.
+	'''
+	def __init__(self, filepath=None, flush_interval=FLUSH_INTERVAL, clock=None):
+		self._filepath = filepath
+		self._flush_interval = flush_interval
+		self._clock = time.monotonic if clock is None else clock
+		self._keys = []
+		self._rows = {}
+		self._counts = array.array("I", [0] * (MAX_KEYS * len(COLUMNS)))
+		self._changed = False
+		self._try_write = filepath is not None
+		self._next_flush = self._clock() + flush_interval
+		self.dropped = 0
+		self.writes = 0
+		self.error = None
+		if filepath is not None:
+			self._load()
+	def __len__(self):
+		return len(self._keys)
+	def _row(self, key):
+		'''
+		Row number for `key`, added if new, or None if the table is full.
+		'''
+		key = key[:MAX_KEY_LENGTH]
+		row = self._rows.get(key)
+		if row is None and len(self._keys) < MAX_KEYS:
+			row = len(self._keys)
+			self._keys.append(key)
+			self._rows[key] = row
+		return row
+	def _load(self):
+		try:
+			with open(self._filepath, encoding="utf-8") as json_file:
+				data = json.load(json_file)
+			for key in data:
+				counts = data[key]
+				row = self._row(key)
+				if row is None:
+					break
+				for column in range(len(COLUMNS)):
+					self._counts[row * len(COLUMNS) + column] = counts[column] + 0  # Type check
+		except OSError as e:
+			if e.errno != 2:
+				self.error = f"Error reading {self._filepath}: {str(e)}"
+		except (ValueError, TypeError, IndexError, OverflowError) as e:
+			# Start again rather than losing all counts from now on
+			self.clear()
+			self.error = f"Error in {self._filepath}: {str(e)}"
+	def record(self, key, code):
+		'''
+		Count an interaction for `key` with outcome `code`, one of COLUMNS.
+		'''
+		row = self._row(key)
+		if row is None:
+			self.dropped += 1
+			return
+		self._counts[row * len(COLUMNS) + COLUMNS.index(code)] += 1
+		self._changed = True
+	def counts(self, key):
+		'''
+		Counts for `key` in the order of COLUMNS, or None if there are none.
+		'''
+		row = self._rows.get(key[:MAX_KEY_LENGTH])
+		if row is None:
+			return None
+		start = row * len(COLUMNS)
+		return list(self._counts[start:start + len(COLUMNS)])
+	def items(self):
+		'''
+		List of (key, counts) in the order the keys were first seen.
+		'''
+		return [(key, self.counts(key)) for key in self._keys]
+	def clear(self):
+		'''
+		Forget all counts. The file is updated on the next flush.
+		'''
+		self._keys = []
+		self._rows = {}
+		for i in range(len(self._counts)):
+			self._counts[i] = 0
+		self._changed = True
+	def flush(self, force=False):
+		'''
+		Write the counts to the file if they changed and the flush interval has passed,
+		or whenever they changed if `force`. Return True if written.
+		'''
+		if not self._changed or not self._try_write:
+			return False
+		now = self._clock()
+		if not force and now < self._next_flush:
+			return False
+		self._next_flush = now + self._flush_interval
+		data = {}
+		for (key, counts) in self.items():
+			data[key] = counts
+		try:
+			with open(self._filepath, "w", encoding="utf-8") as json_file:
+				json.dump(data, json_file)
+		except OSError as e:
+			self.error = "Can't save stats: " + str(e)
+			self._try_write = False
+			return False
+		self._changed = False
+		self.writes += 1
+		return True
+	def stats(self):
+		'''
+		Return a short text summary.
+		'''
+		total = [0] * len(COLUMNS)
+		for (_, counts) in self.items():
+			for column in range(len(COLUMNS)):
+				total[column] += counts[column]
+		parts = [f"{count} {code}" for (code, count) in zip(COLUMNS, total)]
+		return f"{len(self)} keys, " + ", ".join(parts) + f"; {self.writes} writes"
+	def toml(self):
+		'''
+		Counts as TOML lines: `stats."key" = [counts in the order of stats_columns]`.
+		'''
+		lines = ["stats_columns = [" + ", ".join(f'"{code}"' for code in COLUMNS) + "]"]
+		for (key, counts) in self.items():
+			lines.append(f"stats.{_toml_key(key)} = [" + ", ".join(str(n) for n in counts) + "]")
+		return "\r\n".join(lines)
@@ -5,6 +5,7 @@ Handles status monitoring.
 
 import time
 import analogio
+from wificom import outcome
 
 class BatteryMonitor:
 	'''
@@ -52,6 +53,7 @@ class StatusDisplay:
 		self._instruction = ""
 		self._status = ""
 		self._show_battery = True
+		self._outcome = None
 	def change(self, mode, desc, instruction, status, show_battery=True):
 		'''
 		Set mode, extra description (can be None), instruction,
@@ -78,10 +80,19 @@ class StatusDisplay:
 		except AttributeError:
 			pass  # Not a digirom, treat as string
 		self._status = status
+		self._outcome = None
+		self.redraw()
+	def outcome(self, code):
+		'''
+		Show the outcome code of the latest execution, then redraw if it changed.
+		'''
+		if code == self._outcome:
+			return
+		self._outcome = code
 		self.redraw()
 	def redraw(self):
 		'''
-		Redraw screen.
+		Redraw screen, changing only the rows which changed.
 		'''
 		rows = [self._mode]
 		if self._desc is not None:
@@ -90,5 +101,7 @@ class StatusDisplay:
 		rows.append(self._status)
 		if self._show_battery and self._battery_monitor is not None:
 			rows[0] += " " + self._battery_monitor.meter()
-		self._ui.display_rows(rows)
-		time.sleep(0.1)  # Avoid interfering with dmcomm. May stall for longer than specified.
+		if self._outcome is not None:
+			rows[0] += " " + outcome.SYMBOLS[self._outcome]
+		if self._ui.update_rows(rows):
+			time.sleep(0.1)  # Avoid interfering with dmcomm. May stall for longer than specified.
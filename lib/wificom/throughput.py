@@ -0,0 +1,65 @@
+'''
+throughput.py
+Measures how often the current digirom is executed.
+'''
+
+import time
+from wificom import outcome
+
+class Throughput:
+	'''
+	Counts executions, and complete exchanges with the toy, since `reset`.
+	`outcomes` counts executions by outcome code.
+	'''
+	def __init__(self, clock=None):
+		self._clock = time.monotonic if clock is None else clock
+		self.executions = 0
+		self.complete = 0
+		self.outcomes = {}
+		self._time_start = None
+		self._time_last = None
+		self.reset()
+	def reset(self):
+		'''
+		Start counting again, for a new digirom.
+		'''
+		self.executions = 0
+		self.complete = 0
+		self.outcomes = {}
+		self._time_start = self._clock()
+		self._time_last = self._time_start
+	def record(self, code):
+		'''
+		Count an execution with outcome `code` (None if it was skipped).
+		'''
+		self.executions += 1
+		if code == outcome.COMPLETE:
+			self.complete += 1
+		if code is not None:
+			self.outcomes[code] = self.outcomes.get(code, 0) + 1
+		self._time_last = self._clock()
+	def per_minute(self):
+		'''
+		Executions per minute, from the reset until the latest execution.
+		'''
+		seconds = self._time_last - self._time_start
+		if self.executions == 0 or seconds <= 0:
+			return 0
+		return self.executions * 60 / seconds
+	def stats(self):
+		'''
+		Return a short text summary.
+		'''
+		return f"Executions: {self.executions} ({self.complete} complete), {self.per_minute():.1f}/min"
+	def toml(self):
+		'''
+		Counters as TOML lines.
+		'''
+		lines = [
+			f"executions = {self.executions}",
+			f"executions_complete = {self.complete}",
+			f"executions_per_minute = {self.per_minute():.1f}",
+		]
+		for code in (outcome.PARTIAL, outcome.NO_REPLY, outcome.ERROR):
+			lines.append(f"executions_{code} = {self.outcomes.get(code, 0)}")
+		return "\r\n".join(lines)
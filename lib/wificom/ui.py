@@ -12,12 +12,19 @@ import i2cdisplaybus
 import terminalio
 import adafruit_displayio_ssd1306
 from adafruit_display_text.bitmap_label import Label
+from wificom import buttons
 from wificom.sound import PIOSound
 
 SCREEN_WIDTH=128
 SCREEN_HEIGHT=64
 SCREEN_ADDRESS=0x3c
 TEXT_ROW_Y_STEP = 15
+MENU_ROWS = 4
+
+MENU_MOVE = "move"
+MENU_ACTIVATE = "activate"
+MENU_CANCEL = "cancel"
+MENU_ERROR = "error"
 
 class UserInterface:
 	'''
@@ -50,11 +57,14 @@ class UserInterface:
 			self._buttons["C"].pull = digitalio.Pull.UP
 			self._buttons["A"] = self._buttons["C"]
 			self._buttons["B"] = self._buttons["C"]
+		self.buttons = buttons.ButtonEvents(self._read_button, "ABC" if self.has_display else "C")
 		self._speaker = PIOSound(speaker)
 		self.sound_on = True
 		self.audio_base_freq = 1000
 		self._led = led_pwm
 		self._text_y_start = random.randint(4, 13)
+		self._rows_group = None
+		self._rows_labels = []
 	@property
 	def sound_on(self):
 		'''
@@ -85,6 +95,35 @@ class UserInterface:
 			group.append(label)
 			y += TEXT_ROW_Y_STEP
 		self._display.root_group = group
+	def update_rows(self, rows):
+		'''
+		Display rows of text on the screen like `display_rows`, but keep the labels
+		between calls and only change the text of rows which changed.
+		Returns True if the screen changed. Ignored if there is no screen.
+		'''
+		if not self.has_display:
+			return False
+		if self._rows_group is None:
+			self._rows_group = displayio.Group()
+		group = self._rows_group
+		changed = self._display.root_group is not group
+		for (i, row) in enumerate(rows):
+			if i == len(self._rows_labels):
+				y = self._text_y_start + i * TEXT_ROW_Y_STEP
+				self._rows_labels.append(Label(terminalio.FONT, text="", color=0xFFFFFF, x=0, y=y))
+			label = self._rows_labels[i]
+			if i == len(group):
+				group.append(label)
+				changed = True
+			if label.text != row:
+				label.text = row
+				changed = True
+		while len(group) > len(rows):
+			group.pop()
+			changed = True
+		if self._display.root_group is not group:
+			self._display.root_group = group
+		return changed
 	def display_text(self, text, y_start=None):
 		'''
 		Display text on the screen, lines divided with linefeeds.
@@ -99,6 +138,23 @@ class UserInterface:
 			return
 		group = displayio.Group()
 		self._display.root_group = group
+	def _read_button(self, button_id):
+		return not self._buttons[button_id].value
+	def wait_for_press(self, button_id):
+		'''
+		Wait until `button_id` is pressed. If it is already held, it must be released first.
+		'''
+		self.buttons.clear()
+		while self.buttons.wait() != (button_id, buttons.PRESS):
+			pass
+	def wait_for_release(self, button_id):
+		'''
+		Wait until `button_id` is not held.
+		'''
+		self.buttons.clear()
+		if self.buttons.held(button_id) > 0:
+			while self.buttons.wait() != (button_id, buttons.RELEASE):
+				pass
 	def _is_button_pressed(self, button_id, do_no_display):
 		button = self._buttons[button_id]
 		if self._display is None and not do_no_display:
@@ -191,45 +247,122 @@ class UserInterface:
 		If a result is None, that option cannot be activated.
 		Should only be called if there is a screen.
 		'''
-		selection = 0
+		def fetch(start, count):
+			return list(zip(options[start:start + count], results[start:start + count]))
+		return self.paged_menu(len(options), fetch, cancel_result)
+	def paged_menu(self, count, fetch, cancel_result):
+		'''
+		Display a menu of `count` options and return the result of the chosen one,
+		or `cancel_result` if cancelled (not allowed if None).
+
+		`fetch(start, count)` returns up to `count` options from number `start`,
+		as [(text, result)], so only the options on screen need to be in memory.
+		If a result is None, that option cannot be activated.
+		Should only be called if there is a screen.
+		'''
+		menu = Menu(count, fetch, cancel_result)
+		self.buttons.clear()
+		self.update_rows(menu.rows())
 		while True:
-			text_rows = make_menu_text(options, selection)
-			self.display_rows(text_rows)
-			time.sleep(0.15)
-			while True:
-				if self.is_a_pressed():
-					selection += 1
-					selection %= len(options)
-					self.beep_normal()
-					break
-				if self.is_b_pressed():
-					if results[selection] is not None:
-						self.beep_activate()
-						self.clear()
-						return results[selection]
-					self.beep_error()
-					break
-				if self.is_c_pressed():
-					if cancel_result is not None:
-						self.beep_cancel()
-						self.clear()
-						return cancel_result
-					self.beep_error()
-					break
+			action = menu.handle(self.buttons.wait())
+			if action == MENU_MOVE:
+				self.beep_normal()
+				self.update_rows(menu.rows())
+			elif action == MENU_ERROR:
+				self.beep_error()
+			elif action == MENU_ACTIVATE:
+				self.beep_activate()
+				self.clear()
+				return menu.result()
+			elif action == MENU_CANCEL:
+				self.beep_cancel()
+				self.clear()
+				return cancel_result
+
+class Menu:
+	'''
+	Menu selection over `count` options from `fetch` (see `UserInterface.paged_menu`),
+	driven by button events.
+
+	A moves down, wrapping around at the end, and repeats while held. After a long press,
+	the repeats move a page at a time. Holding C moves up a page at a time.
+	B activates the selected option. Pressing and releasing C cancels.
+	'''
+	def __init__(self, count, fetch, cancel_result):
+		self.count = count
+		self._fetch = fetch
+		self.cancel_result = cancel_result
+		self.selection = 0
+		self._paging = False
+		self._c_pressed = False
+		self._c_paged = False
+	def rows(self):
+		'''
+		Text rows to display.
+		'''
+		window = self._fetch(self.selection, MENU_ROWS)
+		return make_menu_text([text for (text, _) in window],
+			self.selection + MENU_ROWS < self.count)
+	def result(self):
+		'''
+		Result of the selected option.
+		'''
+		return self._fetch(self.selection, 1)[0][1]
+	def _move(self, step):
+		last = self.count - 1
+		if step > 0:
+			self.selection = 0 if self.selection == last else min(self.selection + step, last)
+		else:
+			self.selection = last if self.selection == 0 else max(self.selection + step, 0)
+	def handle(self, event):
+		'''
+		Update for a button event (name, kind).
+		Returns MENU_MOVE, MENU_ACTIVATE, MENU_CANCEL, MENU_ERROR, or None if nothing happened.
+		'''
+		# pylint: disable=too-many-return-statements,too-many-branches
+		(button_id, kind) = event
+		if button_id == "A":
+			if kind == buttons.PRESS:
+				self._paging = False
+				self._move(1)
+				return MENU_MOVE
+			if kind == buttons.LONG_PRESS:
+				self._paging = True
+			elif kind == buttons.REPEAT:
+				self._move(MENU_ROWS if self._paging else 1)
+				return MENU_MOVE
+			return None
+		if button_id == "B":
+			if kind != buttons.PRESS:
+				return None
+			if self.result() is not None:
+				return MENU_ACTIVATE
+			return MENU_ERROR
+		if button_id == "C":
+			if kind == buttons.PRESS:
+				self._c_pressed = True
+				self._c_paged = False
+			elif kind in (buttons.LONG_PRESS, buttons.REPEAT) and self._c_pressed:
+				self._c_paged = True
+				self._move(-MENU_ROWS)
+				return MENU_MOVE
+			elif kind == buttons.RELEASE and self._c_pressed:
+				self._c_pressed = False
+				if self._c_paged:
+					return None
+				if self.cancel_result is not None:
+					return MENU_CANCEL
+				return MENU_ERROR
+		return None
 
-def make_menu_text(options, selection):
+def make_menu_text(texts, more):
 	'''
-	Create the text for the menu display.
+	Create the text for the menu display from the texts of the options from the selected one,
+	with "..." in the last row if `more` options follow.
 	'''
-	remaining = len(options) - selection
 	text_rows = ["", "", "", ""]
-	text_rows[0] = "> " + options[selection]
-	if remaining >= 2:
-		text_rows[1] = "  " + options[selection + 1]
-	if remaining >= 3:
-		text_rows[2] = "  " + options[selection + 2]
-	if remaining == 4:
-		text_rows[3] = "  " + options[selection + 3]
-	if remaining > 4:
-		text_rows[3] = "  ..."
+	for (i, text) in enumerate(texts[:MENU_ROWS]):
+		text_rows[i] = ("> " if i == 0 else "  ") + text
+	if more:
+		text_rows[MENU_ROWS - 1] = "  ..."
 	return text_rows
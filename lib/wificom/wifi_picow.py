@@ -3,6 +3,9 @@ wifi_picow.py
 Handles the WiFi connnection for Pico W.
 '''
 import ssl
+import time
+import alarm
+from wificom import modes
 from wificom.import_secrets import secrets_wireless_networks, \
 	secrets_mqtt_broker, \
 	secrets_mqtt_username, \
@@ -11,62 +14,150 @@ import wifi
 import socketpool
 import adafruit_minimqtt.adafruit_minimqtt as MQTT
 
+# Last good network, after the modes data in sleep memory:
+# magic, index in secrets, ssid checksum (2 bytes), channel, BSSID (6 bytes)
+HINT_OFFSET = modes.LENGTH
+HINT_MAGIC = 0xA7
+HINT_LENGTH = 11
+
+def _ssid_checksum(ssid):
+	return sum(ssid.encode("utf-8")) & 0xFFFF
+
+def load_hint():
+	'''
+	Return (index, channel, bssid) of the last good network, or None.
+	'''
+	data = alarm.sleep_memory[HINT_OFFSET:HINT_OFFSET + HINT_LENGTH]
+	if data[0] != HINT_MAGIC or data[1] >= len(secrets_wireless_networks):
+		return None
+	index = data[1]
+	if data[2] | (data[3] << 8) != _ssid_checksum(secrets_wireless_networks[index]['ssid']):
+		return None
+	return (index, data[4], bytes(data[5:11]))
+
+def save_hint(index, channel, bssid):
+	'''
+	Remember the network which worked.
+	'''
+	checksum = _ssid_checksum(secrets_wireless_networks[index]['ssid'])
+	data = bytes([HINT_MAGIC, index, checksum & 0xFF, checksum >> 8, channel]) + bytes(bssid)[0:6]
+	alarm.sleep_memory[HINT_OFFSET:HINT_OFFSET + HINT_LENGTH] = data
+
+def clear_hint():
+	'''
+	Forget the last good network.
+	'''
+	alarm.sleep_memory[HINT_OFFSET] = 0
+
 class Wifi:
 	'''
 	Handles WiFi connection for supported boards
 	'''
 	def __init__(self):
-		return
+		self.mqtt_client = None
+		self.timings = {}
 
-	def connect(self):
+	def is_joined(self):
 		'''
-		Connect to a supported board's WiFi network
+		Whether connected to a WiFi network
 		'''
+		return wifi.radio.ipv4_address is not None
 
-		# Initialize networking
+	def _time_phase(self, phase, time_start):
+		seconds = time.monotonic() - time_start
+		self.timings[phase] = seconds
+		print(f"WiFi {phase}: {seconds:.3f}s")
+
+	def _connect_network(self, index, channel=0, bssid=None):
+		network = secrets_wireless_networks[index]
+		try:
+			if bssid is None:
+				wifi.radio.connect(network['ssid'], network['password'])
+			else:
+				wifi.radio.connect(network['ssid'], network['password'], channel=channel, bssid=bssid)
+		except ConnectionError as e:
+			print("Failed to connect: ", e)
+		return wifi.radio.ipv4_address is not None
+
+	def _join_hint(self):
+		hint = load_hint()
+		if hint is None:
+			return False
+		(index, channel, bssid) = hint
+		print(f"Connecting to {secrets_wireless_networks[index]['ssid']} on channel {channel}...")
+		return self._connect_network(index, channel, bssid)
+
+	def _scan(self):
+		'''
+		Scan once. Return [(rssi, index, channel, bssid)] for the configured networks found,
+		strongest first.
+		'''
+		indexes = {network['ssid']: i for (i, network) in enumerate(secrets_wireless_networks)}
+		best = {}
+		for network in wifi.radio.start_scanning_networks():
+			index = indexes.get(network.ssid)
+			if index is not None and (index not in best or network.rssi > best[index][0]):
+				best[index] = (network.rssi, index, network.channel, bytes(network.bssid))
+		wifi.radio.stop_scanning_networks()
+		return sorted(best.values(), reverse=True)
+
+	def join(self):
+		'''
+		Connect to one of the configured WiFi networks. Return True if connected.
+		Try the network from last time directly, then scan once and try the
+		configured networks found, strongest first.
+		'''
 		num_retries = 3
-		connected = False
-
-		print("Scanning for networks...")
-		for network in secrets_wireless_networks:
-			retries = num_retries
-			while retries > 0:
-				# pylint: disable=consider-using-set-comprehension
-				found = set([wifi.ssid for wifi in wifi.radio.start_scanning_networks()])
-				if network['ssid'] in found:
-					print(f"Connecting to {network['ssid']} \
-						(attempt {num_retries-retries+1} of {num_retries})...")
-					try:
-						wifi.radio.connect(network['ssid'], network['password'])
-					except ConnectionError as e:
-						print("Failed to connect, retrying: ", e)
-
-					if wifi.radio.ipv4_address is not None:
-						connected = True
-						break
-					else:
-						retries -= 1
-				else:
-					retries -= 1
+		time_start = time.monotonic()
+		connected = self._join_hint()
+		self._time_phase("hint", time_start)
+
+		for attempt in range(num_retries):
 			if connected:
 				break
-
-		wifi.radio.stop_scanning_networks()
+			time_start = time.monotonic()
+			print("Scanning for networks...")
+			found = self._scan()
+			self._time_phase("scan", time_start)
+			time_start = time.monotonic()
+			for (rssi, index, channel, bssid) in found:
+				print(f"Connecting to {secrets_wireless_networks[index]['ssid']} ({rssi}dBm) \
+					(attempt {attempt+1} of {num_retries})...")
+				if self._connect_network(index, channel, bssid):
+					save_hint(index, channel, bssid)
+					connected = True
+					break
+			self._time_phase("connect", time_start)
 
 		if not connected:
+			clear_hint()
+		return connected
+
+	def connect(self):
+		'''
+		Connect to a supported board's WiFi network
+		Return the MQTT client, which is created the first time, or None on failure.
+		'''
+
+		# Initialize networking
+		if not self.is_joined() and not self.join():
 			return None
 
-		pool = socketpool.SocketPool(wifi.radio)
+		if self.mqtt_client is None:
+			time_start = time.monotonic()
+			pool = socketpool.SocketPool(wifi.radio)
 
-		mqtt_client = MQTT.MQTT(
-			broker=secrets_mqtt_broker,
-			username=secrets_mqtt_username.lower(),
-			password=secrets_mqtt_password,
-			socket_pool=pool,
-			ssl_context=ssl.create_default_context(),
-			keep_alive=15,
-			connect_retries=3,
-			#socket_timeout=0.3,  # Waiting for lib update
-		)
+			self.mqtt_client = MQTT.MQTT(
+				broker=secrets_mqtt_broker,
+				username=secrets_mqtt_username.lower(),
+				password=secrets_mqtt_password,
+				socket_pool=pool,
+				ssl_context=ssl.create_default_context(),
+				keep_alive=15,
+				connect_retries=3,
+				socket_timeout=0.1,  # Not more than mqtt.LOOP_TIMEOUT
+				use_binary_mode=True,  # Messages may be CBOR; see wire.py
+			)
+			self._time_phase("client", time_start)
 
-		return mqtt_client
+		return self.mqtt_client
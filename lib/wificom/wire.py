@@ -0,0 +1,302 @@
+'''
+wire.py
+Encoding of MQTT messages.
+
+Messages are JSON by default. The server can switch a device to CBOR by sending
+`"encoding": "cbor"` (and back with `"encoding": "json"`). In CBOR, map keys listed in
+`COMPACT_KEYS` are sent as their index in that tuple, so only ever append to it.
+Incoming messages are decoded according to their first byte,
+so either encoding is always accepted.
+'''
+
+import json
+import struct
+
+JSON = "json"
+CBOR = "cbor"
+ENCODINGS = (JSON, CBOR)
+
+COMPACT_KEYS = (
+	"device_uuid",
+	"application_uuid",
+	"application_id",
+	"output",
+	"ack_id",
+	"user_type",
+	"digirom",
+	"api_response",
+	"topic_action",
+	"topic",
+	"host",
+	"battle_type",
+	"encoding",
+	"name",
+	"version",
+	"circuitpython_version",
+	"circuitpython_board_id",
+	"has_display",
+	"turn_1_button",
+	"heap",
+	"outcome",
+	"rtb_timeline",
+)
+_KEY_IDS = {key: i for (i, key) in enumerate(COMPACT_KEYS)}
+
+_MAJOR_UINT = 0
+_MAJOR_NEGINT = 1
+_MAJOR_BYTES = 2
+_MAJOR_TEXT = 3
+_MAJOR_ARRAY = 4
+_MAJOR_MAP = 5
+_MAJOR_SIMPLE = 7
+_FALSE = 0xF4
+_TRUE = 0xF5
+_NULL = 0xF6
+_FLOAT64 = 0xFB
+
+def _cbor_head(out, major, value):
+	if value < 24:
+		out.append((major << 5) | value)
+	elif value < 0x100:
+		out.append((major << 5) | 24)
+		out.append(value)
+	elif value < 0x10000:
+		out.append((major << 5) | 25)
+		out.extend(struct.pack(">H", value))
+	elif value < 0x100000000:
+		out.append((major << 5) | 26)
+		out.extend(struct.pack(">I", value))
+	else:
+		out.append((major << 5) | 27)
+		out.extend(struct.pack(">Q", value))
+
+def _cbor_encode(out, value):
+	# pylint: disable=too-many-branches
+	if value is None:
+		out.append(_NULL)
+	elif value is True:
+		out.append(_TRUE)
+	elif value is False:
+		out.append(_FALSE)
+	elif isinstance(value, int):
+		if value >= 0:
+			_cbor_head(out, _MAJOR_UINT, value)
+		else:
+			_cbor_head(out, _MAJOR_NEGINT, -1 - value)
+	elif isinstance(value, float):
+		out.append(_FLOAT64)
+		out.extend(struct.pack(">d", value))
+	elif isinstance(value, str):
+		encoded = value.encode("utf-8")
+		_cbor_head(out, _MAJOR_TEXT, len(encoded))
+		out.extend(encoded)
+	elif isinstance(value, (bytes, bytearray)):
+		_cbor_head(out, _MAJOR_BYTES, len(value))
+		out.extend(value)
+	elif isinstance(value, (list, tuple)):
+		_cbor_head(out, _MAJOR_ARRAY, len(value))
+		for item in value:
+			_cbor_encode(out, item)
+	elif isinstance(value, dict):
+		_cbor_head(out, _MAJOR_MAP, len(value))
+		for key in value:
+			_cbor_encode(out, _KEY_IDS.get(key, key))
+			_cbor_encode(out, value[key])
+	else:
+		raise TypeError(f"can't encode {type(value)} as CBOR")
+
+def cbor_dumps(value):
+	'''
+	Encode value as CBOR bytes, with compact keys.
+	'''
+	out = bytearray()
+	_cbor_encode(out, value)
+	return bytes(out)
+
+def _cbor_decode(data, pos):
+	# pylint: disable=too-many-branches,too-many-return-statements
+	if pos >= len(data):
+		raise ValueError("CBOR truncated")
+	initial = data[pos]
+	pos += 1
+	major = initial >> 5
+	info = initial & 0x1F
+	if major == _MAJOR_SIMPLE:
+		if initial == _NULL:
+			return (None, pos)
+		if initial == _TRUE:
+			return (True, pos)
+		if initial == _FALSE:
+			return (False, pos)
+		if initial == _FLOAT64 and pos + 8 <= len(data):
+			return (struct.unpack(">d", bytes(data[pos:pos + 8]))[0], pos + 8)
+		raise ValueError(f"CBOR simple value {initial} not supported")
+	if info < 24:
+		value = info
+	elif info <= 27:
+		size = 1 << (info - 24)
+		if pos + size > len(data):
+			raise ValueError("CBOR truncated")
+		value = 0
+		for byte in data[pos:pos + size]:
+			value = (value << 8) | byte
+		pos += size
+	else:
+		raise ValueError("CBOR indefinite length not supported")
+	if major == _MAJOR_UINT:
+		return (value, pos)
+	if major == _MAJOR_NEGINT:
+		return (-1 - value, pos)
+	if major in (_MAJOR_BYTES, _MAJOR_TEXT):
+		end = pos + value
+		if end > len(data):
+			raise ValueError("CBOR truncated")
+		chunk = bytes(data[pos:end])
+		if major == _MAJOR_TEXT:
+			chunk = chunk.decode("utf-8")
+		return (chunk, end)
+	if major == _MAJOR_ARRAY:
+		result = []
+		for _ in range(value):
+			(item, pos) = _cbor_decode(data, pos)
+			result.append(item)
+		return (result, pos)
+	if major == _MAJOR_MAP:
+		result = {}
+		for _ in range(value):
+			(key, pos) = _cbor_decode(data, pos)
+			(item, pos) = _cbor_decode(data, pos)
+			if isinstance(key, int) and 0 <= key < len(COMPACT_KEYS):
+				key = COMPACT_KEYS[key]
+			result[key] = item
+		return (result, pos)
+	raise ValueError(f"CBOR major type {major} not supported")
+
+def cbor_loads(data):
+	'''
+	Decode CBOR bytes, turning compact keys back into names.
+	Raises ValueError if invalid.
+	'''
+	(value, pos) = _cbor_decode(data, 0)
+	if pos != len(data):
+		raise ValueError("CBOR trailing data")
+	return value
+
+def is_json(message):
+	'''
+	Whether the message (str or bytes) is JSON rather than CBOR.
+	'''
+	if isinstance(message, str):
+		return True
+	for byte in message:
+		if byte not in b" \t\r\n":
+			return byte == ord("{")
+	return True
+
+def decode(message):
+	'''
+	Decode a message which is JSON (str or bytes) or CBOR (bytes).
+	Raises ValueError if invalid.
+	'''
+	if is_json(message):
+		if not isinstance(message, str):
+			message = str(message, "utf-8")
+		return json.loads(message)
+	return cbor_loads(message)
+
+def encode(message, encoding):
+	'''
+	Encode a message as JSON (str) or CBOR (bytes).
+	'''
+	if encoding == CBOR:
+		return cbor_dumps(message)
+	return json.dumps(message)
+
+class _Template:
+	'''
+	Message with fixed fields rendered once, followed by variable fields
+	which are spliced into a reusable buffer on each `render`.
+
+	The encoding of each variable field's latest value is kept, so repeated values
+	(such as the application ID, or the heartbeat output) are not re-encoded.
+	'''
+	def __init__(self, prefix, key_parts, suffix, size):
+		self._key_parts = key_parts
+		self._suffix = suffix
+		self._last_values = [None] * len(key_parts)
+		self._last_encoded = [self._encode_value(None)] * len(key_parts)
+		self._prefix_length = len(prefix)
+		self._buffer = bytearray(max(size, self._prefix_length + len(suffix)))
+		self._buffer[0:self._prefix_length] = prefix
+	@staticmethod
+	def _encode_value(value):
+		raise NotImplementedError
+	def _encoded(self, i, value):
+		if value is not self._last_values[i] and value != self._last_values[i]:
+			self._last_values[i] = value
+			self._last_encoded[i] = self._encode_value(value)
+		return self._last_encoded[i]
+	def _grow(self, length):
+		new_buffer = bytearray(length + 64)
+		new_buffer[0:self._prefix_length] = self._buffer[0:self._prefix_length]
+		self._buffer = new_buffer
+	def render(self, *values):
+		'''
+		Return the complete message as bytes, with `values` for the variable keys in order.
+		'''
+		length = self._prefix_length + len(self._suffix)
+		for (i, value) in enumerate(values):
+			length += len(self._key_parts[i]) + len(self._encoded(i, value))
+		if length > len(self._buffer):
+			self._grow(length)
+		pos = self._prefix_length
+		for i in range(len(values)):
+			pos = self._write(pos, self._key_parts[i])
+			pos = self._write(pos, self._last_encoded[i])
+		pos = self._write(pos, self._suffix)
+		return bytes(memoryview(self._buffer)[0:pos])
+	def _write(self, pos, part):
+		end = pos + len(part)
+		self._buffer[pos:end] = part
+		return end
+
+class JSONTemplate(_Template):
+	'''
+	JSON object with pre-rendered fixed fields. See `_Template`.
+	'''
+	def __init__(self, fixed, variable_keys, size=512):
+		prefix = json.dumps(fixed).encode("utf-8")[:-1]  # without closing brace
+		key_parts = []
+		separator = b", " if len(fixed) > 0 else b""
+		for key in variable_keys:
+			key_parts.append(separator + json.dumps(key).encode("utf-8") + b": ")
+			separator = b", "
+		super().__init__(prefix, key_parts, b"}", size)
+	@staticmethod
+	def _encode_value(value):
+		return json.dumps(value).encode("utf-8")
+
+class CBORTemplate(_Template):
+	'''
+	CBOR map with pre-rendered fixed fields. See `_Template`.
+	All values must be passed to `render`, since the map size is fixed.
+	'''
+	def __init__(self, fixed, variable_keys, size=256):
+		prefix = bytearray()
+		_cbor_head(prefix, _MAJOR_MAP, len(fixed) + len(variable_keys))
+		for key in fixed:
+			_cbor_encode(prefix, _KEY_IDS.get(key, key))
+			_cbor_encode(prefix, fixed[key])
+		key_parts = [cbor_dumps(_KEY_IDS.get(key, key)) for key in variable_keys]
+		super().__init__(prefix, key_parts, b"", size)
+	@staticmethod
+	def _encode_value(value):
+		return cbor_dumps(value)
+
+def make_template(encoding, fixed, variable_keys):
+	'''
+	Make a template for messages in `encoding`.
+	'''
+	if encoding == CBOR:
+		return CBORTemplate(fixed, variable_keys)
+	return JSONTemplate(fixed, variable_keys)
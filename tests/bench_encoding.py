@@ -0,0 +1,130 @@
+'''
+MQTT message encoding benchmark.
+
+Compares the previous per-publish `json.dumps` of the whole output dictionary
+with the pre-rendered `wire.JSONTemplate` and `wire.CBORTemplate`, for heartbeats and results:
+bytes on the wire, peak transient memory per publish (tracemalloc), and time per publish.
+Then compares decoding an incoming command as JSON and as CBOR.
+
+Usage (from the tests directory)::
+
+	python bench_encoding.py [--count N]
+'''
+
+import argparse
+import collections
+import json
+import time
+import tracemalloc
+
+import target_paths  #pylint: disable=unused-import
+from wificom import wire
+
+RESULT = "s:FC03 r:FD02 s:FD02 r:FC03 s:0159 r:4379 s:2E49 r:0C99"
+
+def version_dictionary():
+	'''Output fields as made by version.dictionary() plus device_uuid.'''
+	result = collections.OrderedDict()
+	result["name"] = "wificom"
+	result["version"] = "v2.1.0"
+	result["circuitpython_version"] = "9.2.8 on 2025-05-28"
+	result["circuitpython_board_id"] = "raspberry_pi_pico_w"
+	result["has_display"] = True
+	result["turn_1_button"] = False
+	result["device_uuid"] = "7c3bc7c5-5a47-44f1-a2e6-d3a0c55f2bd0"
+	return result
+
+def make_dumps_encoder():
+	'''The previous encoder: mutate the cached dictionary and dump it all.'''
+	cached = version_dictionary()
+	def encode(application_id, output):
+		cached["application_uuid"] = application_id
+		cached["output"] = str(output)
+		return json.dumps(cached)
+	return encode
+
+def make_template_encoder():
+	'''The templated encoder.'''
+	template = wire.JSONTemplate(version_dictionary(), ["application_uuid", "output"])
+	def encode(application_id, output):
+		return template.render(application_id, str(output))
+	return encode
+
+def make_cbor_encoder():
+	'''The templated CBOR encoder.'''
+	template = wire.CBORTemplate(version_dictionary(), ["application_uuid", "output"])
+	def encode(application_id, output):
+		return template.render(application_id, str(output))
+	return encode
+
+ENCODERS = {
+	"json.dumps": make_dumps_encoder,
+	"template": make_template_encoder,
+	"cbor": make_cbor_encoder,
+}
+
+COMMAND = {
+	"digirom": "X1-0159-4379-2E49-@4009",
+	"application_id": "a3c3ca4e-4d5c-4a34-9a39-7c0d1f7e9b0e",
+	"api_response": False,
+	"ack_id": 123456,
+}
+
+INCOMING = {
+	"json": wire.encode(COMMAND, wire.JSON).encode("utf-8"),
+	"cbor": wire.encode(COMMAND, wire.CBOR),
+}
+
+MESSAGES = {
+	"heartbeat": ("a3c3ca4e-4d5c-4a34-9a39-7c0d1f7e9b0e", None),
+	"result": ("a3c3ca4e-4d5c-4a34-9a39-7c0d1f7e9b0e", RESULT),
+}
+
+def measure_time(encode, message, count):
+	'''Return (microseconds per call, encoded size).'''
+	(application_id, output) = message
+	encoded = encode(application_id, output)  # warm up
+	start = time.perf_counter()
+	for _ in range(count):
+		encode(application_id, output)
+	seconds = time.perf_counter() - start
+	return (seconds / count * 1e6, len(encoded))
+
+def measure_peak(encode, message, count):
+	'''
+	Peak transient memory in bytes while encoding (tracemalloc),
+	i.e. the heap needed per publish over what is already allocated.
+	'''
+	(application_id, output) = message
+	encode(application_id, output)  # warm up
+	tracemalloc.start()
+	for _ in range(count):
+		encode(application_id, output)
+	(_, peak) = tracemalloc.get_traced_memory()
+	tracemalloc.stop()
+	return peak
+
+def main():
+	'''Run the benchmark.'''
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+	parser.add_argument("--count", type=int, default=2000)
+	args = parser.parse_args()
+	print(f"{'encoder':12}{'message':11}{'bytes':>6} {'peak B':>8} {'us/msg':>8}")
+	for (encoder_name, make_encoder) in ENCODERS.items():
+		for (message_name, message) in MESSAGES.items():
+			encode = make_encoder()
+			(microseconds, size) = measure_time(encode, message, args.count)
+			peak = measure_peak(encode, message, args.count)
+			print(f"{encoder_name:12}{message_name:11}{size:6} {peak:8} {microseconds:8.2f}")
+	print()
+	print(f"{'decoding':12}{'message':11}{'bytes':>6} {'us/msg':>17}")
+	for (encoding, data) in INCOMING.items():
+		assert wire.decode(data) == COMMAND
+		start = time.perf_counter()
+		for _ in range(args.count):
+			wire.decode(data)
+		microseconds = (time.perf_counter() - start) / args.count * 1e6
+		print(f"{encoding:12}{'command':11}{len(data):6} {microseconds:17.2f}")
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,286 @@
+'''
+Command-to-result latency benchmark for WiFi, serial and punchbag modes.
+
+Drives the real mode functions in the host-side simulator with scripted inputs,
+and reports p50/p95/p99 per stage:
+
+* receive: command sent -> received by the device (MQTT callback / serial line / menu pick)
+* pickup: received -> parse starts
+* parse: parse_command
+* delay: parse done -> execution starts (initial delay, scheduling)
+* execute: controller.execute
+* publish: execution done -> result published from the outbound queue (WiFi only)
+* total: command sent -> result published (or executed, if not WiFi)
+
+Latencies are in simulated device time. Host time spent in the parse/execute/publish
+code is reported separately ("host" columns) as a CPU-cost indicator.
+
+Usage (from the tests directory)::
+
+	python bench_latency.py [--count N] [--seed S] [--save FILE] [--baseline FILE]
+
+`--save` adds this run to a JSON file keyed by version; `--baseline` compares against
+the latest run in that file and exits with status 1 if any p95 got worse by more
+than `--threshold` percent.
+'''
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import random
+import sys
+
+import target_paths
+from simulator import Simulator
+
+STAGES = ("receive", "pickup", "parse", "delay", "execute", "publish", "total")
+HOST_STAGES = ("parse", "execute", "publish")
+
+WIFI_DIGIROMS = [
+	("V1-FC03-FD02", ["FC03", "FD02"]),
+	("V2-0000-0000", ["1234", "5678"]),
+	("X1-0159-4379-2E49-@4009", ["0069", "2169", "8009", "0C99"]),
+	("DL2-1301002000AA-1301002000AA", ["1301002000AA", "1301002000AA"]),
+	("IC2-C067-4257", ["C067", "4257"]),
+]
+
+def percentile(values, pct):
+	'''Nearest-rank percentile of values, or None if empty.'''
+	if not values:
+		return None
+	ordered = sorted(values)
+	rank = max(1, math.ceil(pct / 100 * len(ordered)))
+	return ordered[rank - 1]
+
+def summarize(samples):
+	'''{stage: [values]} -> {stage: {"p50", "p95", "p99", "n"}}.'''
+	summary = {}
+	for (stage, values) in samples.items():
+		if values:
+			summary[stage] = {
+				"n": len(values),
+				"p50": percentile(values, 50),
+				"p95": percentile(values, 95),
+				"p99": percentile(values, 99),
+			}
+	return summary
+
+def first_after(calls, time_min, condition=None):
+	'''First probed call starting at or after time_min and matching condition.'''
+	for call in calls:
+		if call[0] >= time_min and (condition is None or condition(call)):
+			return call
+	return None
+
+def collect(sim, sent, is_wifi):
+	'''
+	Match each sent command [(time, digirom, received)] to its probed stages.
+	Returns ({stage: [seconds]}, {stage: [host seconds]}).
+	'''
+	samples = {stage: [] for stage in STAGES}
+	host = {stage: [] for stage in HOST_STAGES}
+	parses = sim.probed("parse")
+	executions = sim.probed("execute")
+	publishes = sim.probed("publish")
+	for (time_sent, digirom, received) in sent:
+		if received is None:
+			continue
+		parse = first_after(parses, received[1], lambda call, rom=digirom: call[3][0] == rom)
+		if parse is None:
+			continue
+		execution = first_after(executions, parse[1],
+			lambda call, rom=digirom: str(call[3][1]) == rom)
+		if execution is None:
+			continue
+		samples["receive"].append(received[0] - time_sent)
+		samples["pickup"].append(parse[0] - received[1])
+		samples["parse"].append(parse[1] - parse[0])
+		samples["delay"].append(execution[0] - parse[1])
+		samples["execute"].append(execution[1] - execution[0])
+		host["parse"].append(parse[2])
+		host["execute"].append(execution[2])
+		end = execution[1]
+		if is_wifi:
+			publish = first_after(publishes, execution[1], lambda call: call[4])
+			if publish is None:
+				continue
+			samples["publish"].append(publish[1] - execution[1])
+			host["publish"].append(publish[2])
+			end = publish[1]
+		samples["total"].append(end - time_sent)
+	return (samples, host)
+
+def add_probes(sim):
+	'''Probe the stages shared by all modes.'''
+	sim.probe(sys.modules["dmcomm.protocol"], "parse_command", "parse")
+	sim.probe(sys.modules["dmcomm.hardware"].Controller, "execute", "execute")
+	sim.probe(sim.module("mqtt"), "flush", "publish")
+
+def bench_wifi(count, rng):
+	'''Commands sent over MQTT at random intervals.'''
+	with Simulator() as sim:
+		add_probes(sim)
+		sim.probe(sim.module("mqtt"), "on_app_feed_callback", "receive")
+		commands = []
+		time_send = 15.0
+		for _ in range(count):
+			(digirom, replies) = rng.choice(WIFI_DIGIROMS)
+			sim.toy.respond(digirom, replies)
+			time_send += rng.uniform(10, 14)
+			sim.send_command(digirom, at=time_send)
+			commands.append((time_send, digirom))
+		sim.run(sim.module("modes").MODE_WIFI, duration=time_send + 15)
+		receives = sim.probed("receive")
+		sent = []
+		for (time_sent, digirom) in commands:
+			received = first_after(receives, time_sent,
+				lambda call, rom=digirom: json.loads(call[3][2])["digirom"] == rom)
+			sent.append((time_sent, digirom, received and (received[0], received[1])))
+		return collect(sim, sent, True)
+
+def bench_serial(count, rng):
+	'''Commands sent over serial at random intervals, with random chunking.'''
+	with Simulator(secrets=False) as sim:
+		add_probes(sim)
+		sim.probe(sim.main, "serial_readline", "receive")
+		commands = []
+		time_send = 2.0
+		for _ in range(count):
+			(digirom, replies) = rng.choice(WIFI_DIGIROMS)
+			sim.toy.respond(digirom, replies)
+			time_send += rng.uniform(6, 9)
+			line = digirom + "\r\n"
+			split = rng.randrange(1, len(line))
+			sim.serial.feed(line[:split], at=time_send)
+			sim.serial.feed(line[split:], at=time_send + 0.002)
+			commands.append((time_send, digirom))
+		sim.run(sim.module("modes").MODE_SERIAL, duration=time_send + 10)
+		receives = sim.probed("receive")
+		sent = []
+		for (time_sent, digirom) in commands:
+			received = first_after(receives, time_sent, lambda call, rom=digirom: call[4] == rom)
+			sent.append((time_sent, digirom, received and (received[1], received[1])))
+		return collect(sim, sent, False)
+
+def bench_punchbag(count, rng):
+	'''Entries picked from the punchbag menu, then exited with C.'''
+	with open(os.path.join(target_paths.punchbag_data, "valid.txt"), encoding="UTF-8") as f:
+		digiroms = f.read()
+	with Simulator(secrets=False, digiroms=digiroms) as sim:
+		add_probes(sim)
+		punchbag = sim.module("punchbag")
+		sim.probe(punchbag.DigiROM_Tree, "digirom", "receive")
+		sim.toy.default_response = ["FD02"]
+		sim.buttons.press("B", at=1)  # Classic Punchbags
+		presses = []
+		time_cycle = 2.0
+		for _ in range(count):
+			steps = rng.randrange(4)
+			for step in range(steps):
+				sim.buttons.press("A", at=time_cycle + step * 0.5)
+			time_pick = time_cycle + steps * 0.5
+			sim.buttons.press("B", at=time_pick)
+			sim.buttons.press("C", at=time_pick + 6, duration=5.5)
+			presses.append(time_pick)
+			time_cycle = time_pick + 12.5
+		sim.run(sim.module("modes").MODE_PUNCHBAG, duration=time_cycle)
+		receives = sim.probed("receive")
+		sent = []
+		for time_pick in presses:
+			received = first_after(receives, time_pick, lambda call: call[4] is not None)
+			digirom = received and received[4]
+			sent.append((time_pick, digirom, received and (received[1], received[1])))
+		return collect(sim, sent, False)
+
+SCENARIOS = {
+	"wifi": bench_wifi,
+	"serial": bench_serial,
+	"punchbag": bench_punchbag,
+}
+
+def format_ms(value):
+	'''Seconds as a fixed-width milliseconds string.'''
+	return "       -" if value is None else f"{value * 1000:8.1f}"
+
+def format_us(value):
+	'''Seconds as a fixed-width microseconds string.'''
+	return "       -" if value is None else f"{value * 1_000_000:8.1f}"
+
+def report(results):
+	'''Print a table of the results.'''
+	print(f"{'scenario':10}{'stage':9}{'n':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}"
+		f"  {'host p50 us':>11} {'p95 us':>8} {'p99 us':>8}")
+	for (scenario, result) in results.items():
+		for stage in STAGES:
+			stats = result["device"].get(stage)
+			if stats is None:
+				continue
+			host = result["host"].get(stage, {})
+			print(f"{scenario:10}{stage:9}{stats['n']:4} {format_ms(stats['p50'])} "
+				f"{format_ms(stats['p95'])} {format_ms(stats['p99'])}"
+				f"     {format_us(host.get('p50'))} {format_us(host.get('p95'))} "
+				f"{format_us(host.get('p99'))}")
+
+def compare(results, baseline, threshold):
+	'''Print regressions in device p95 against baseline. Returns True if any.'''
+	regressed = False
+	for (scenario, result) in results.items():
+		for (stage, stats) in result["device"].items():
+			try:
+				before = baseline[scenario]["device"][stage]["p95"]
+			except KeyError:
+				continue
+			after = stats["p95"]
+			if after > before * (1 + threshold / 100) and after - before > 0.001:
+				print(f"REGRESSION {scenario}/{stage}: p95 {format_ms(before)} -> {format_ms(after)} ms")
+				regressed = True
+	return regressed
+
+def current_version():
+	'''Version string from version_info.py.'''
+	sys.path.insert(0, os.path.dirname(target_paths.lib_dir))
+	import version_info  #pylint: disable=import-outside-toplevel
+	return version_info.version
+
+def main():
+	'''Run the benchmarks.'''
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+	parser.add_argument("--count", type=int, default=40, help="commands per scenario")
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--scenario", choices=list(SCENARIOS), action="append")
+	parser.add_argument("--save", help="JSON file to add results to")
+	parser.add_argument("--baseline", help="JSON file with earlier results to compare against")
+	parser.add_argument("--threshold", type=float, default=10, help="allowed p95 increase, percent")
+	parser.add_argument("--verbose", action="store_true", help="show device console output")
+	args = parser.parse_args()
+	results = {}
+	for name in args.scenario or SCENARIOS:
+		console = io.StringIO()
+		with contextlib.redirect_stdout(sys.stdout if args.verbose else console):
+			(samples, host) = SCENARIOS[name](args.count, random.Random(args.seed))
+		results[name] = {"device": summarize(samples), "host": summarize(host)}
+	report(results)
+	regressed = False
+	if args.baseline is not None:
+		with open(args.baseline, encoding="utf-8") as f:
+			history = json.load(f)
+		if history:
+			(version, baseline) = history[-1]
+			print(f"Comparing with {version}")
+			regressed = compare(results, baseline, args.threshold)
+	if args.save is not None:
+		try:
+			with open(args.save, encoding="utf-8") as f:
+				history = json.load(f)
+		except OSError:
+			history = []
+		history.append([current_version(), results])
+		with open(args.save, "w", encoding="utf-8") as f:
+			json.dump(history, f, indent=1)
+	sys.exit(1 if regressed else 0)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,106 @@
+'''
+Aggregates real-time battle timelines, to find where battles are slow or time out.
+
+At the end of each battle, the device publishes a message on its output topic with
+`battle_type`, `user_type`, `outcome` and `rtb_timeline`, a list of [milliseconds, event]
+(see `wificom.realtime`). This reads those messages, one JSON object per line
+(other lines are skipped), and reports per battle type and side:
+
+* outcomes: how many battles ended each way;
+* phases: p50/p95/max time between consecutive events, such as "sent>message"
+	(waiting for the other player) or "comm>comm_fail" (second comm with the toy);
+* endings: for battles which did not complete, the phase they ended in,
+	such as "sent>timeout" (the other player never replied).
+
+Usage (from the tests directory)::
+
+	python rtb_timelines.py [--json] FILE [FILE ...]
+
+`-` reads from standard input.
+'''
+
+import argparse
+import json
+import sys
+
+from bench_latency import percentile
+
+def load(lines):
+	'''Battles from lines of JSON messages, as [dict].'''
+	battles = []
+	for line in lines:
+		try:
+			message = json.loads(line)
+		except ValueError:
+			continue
+		if isinstance(message, dict) and message.get("rtb_timeline"):
+			battles.append(message)
+	return battles
+
+def phases(timeline):
+	'''[(name, milliseconds)] for each pair of consecutive events in a timeline.'''
+	return [(f"{event}>{next_event}", next_ms - ms)
+		for ((ms, event), (next_ms, next_event)) in zip(timeline, timeline[1:])]
+
+def aggregate(battles):
+	'''
+	{"battle_type/user_type": {"outcomes": {code: n}, "phases": {name: stats},
+	"endings": {name: n}}}, where stats has "n", "p50", "p95" and "max" in milliseconds.
+	'''
+	groups = {}
+	for battle in battles:
+		key = f"{battle.get('battle_type')}/{battle.get('user_type')}"
+		group = groups.setdefault(key, {"outcomes": {}, "phases": {}, "endings": {}})
+		code = battle.get("outcome")
+		group["outcomes"][code] = group["outcomes"].get(code, 0) + 1
+		battle_phases = phases(battle["rtb_timeline"])
+		for (name, ms) in battle_phases:
+			group["phases"].setdefault(name, []).append(ms)
+		if code != "ok":
+			ending = battle_phases[-1][0] if battle_phases else battle["rtb_timeline"][0][1]
+			group["endings"][ending] = group["endings"].get(ending, 0) + 1
+	for group in groups.values():
+		for (name, values) in group["phases"].items():
+			group["phases"][name] = {
+				"n": len(values),
+				"p50": percentile(values, 50),
+				"p95": percentile(values, 95),
+				"max": max(values),
+			}
+	return groups
+
+def report(groups):
+	'''Print the aggregate as tables.'''
+	for (key, group) in sorted(groups.items()):
+		total = sum(group["outcomes"].values())
+		outcomes = ", ".join(f"{n} {code}" for (code, n) in sorted(group["outcomes"].items()))
+		print(f"{key}: {total} battles ({outcomes})")
+		print(f"  {'phase':22}{'n':>5} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8}")
+		for (name, stats) in sorted(group["phases"].items(), key=lambda item: -item[1]["p95"]):
+			print(f"  {name:22}{stats['n']:5} {stats['p50']:8} {stats['p95']:8} {stats['max']:8}")
+		if group["endings"]:
+			print("  ended without completing in:")
+			for (name, n) in sorted(group["endings"].items(), key=lambda item: -item[1]):
+				print(f"  {name:22}{n:5}")
+
+def main():
+	'''Aggregate the timelines in the files given.'''
+	parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[1])
+	parser.add_argument("files", nargs="+", help="files of JSON messages, or - for stdin")
+	parser.add_argument("--json", action="store_true", help="print the aggregate as JSON")
+	args = parser.parse_args()
+	battles = []
+	for filename in args.files:
+		if filename == "-":
+			battles.extend(load(sys.stdin))
+		else:
+			with open(filename, encoding="utf-8") as f:
+				battles.extend(load(f))
+	groups = aggregate(battles)
+	if args.json:
+		print(json.dumps(groups, indent=1))
+	else:
+		report(groups)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,264 @@
+'''
+Host-side simulator for WiFiCom.
+
+Runs the real `wificom.main` under CPython with stand-in hardware:
+a scripted toy behind a fake dmcomm Controller, virtual buttons, an in-memory
+display, fake serial, and an in-process MQTT broker, all on a virtual clock.
+
+Usage::
+
+	with Simulator() as sim:
+		sim.serial.feed("V1-FC03-FD02\\n", at=1)
+		sim.buttons.press("C", at=10, duration=1)
+		sim.run(modes.MODE_SERIAL, duration=15)
+		print(sim.executions)
+'''
+
+import importlib
+import importlib.abc
+import importlib.machinery
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from simulator.clock import VirtualClock, SimulationEnd
+from simulator.hardware import VirtualButtons, InMemoryDisplay, FakeSerial, FakePWM, \
+	SimulatedReset, SimulatedReload
+from simulator.network import Broker, Network
+from simulator import dmcomm_fake, hardware, network
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.realpath(__file__))))
+LIB_DIR = os.path.join(ROOT_DIR, "lib")
+
+SECRETS = {
+	"wireless_networks": [{"ssid": "SimNet", "password": "password"}],
+	"user_uuid": "sim-user",
+	"device_uuid": "sim-device",
+	"broker": "broker.sim",
+	"mqtt_username": "SimUser",
+	"mqtt_password": "secret",
+}
+
+class _PatchingFinder(importlib.abc.MetaPathFinder):
+	'''Calls `patch(module)` after each wificom module is imported, including lazy imports.'''
+	def __init__(self, patch):
+		self._patch = patch
+	def find_spec(self, fullname, path, target=None):
+		'''Find the module normally, then wrap its loader.'''
+		if not (fullname.startswith("wificom.") or fullname == "board_config"):
+			return None
+		spec = importlib.machinery.PathFinder.find_spec(fullname, path, target)
+		if spec is None or spec.loader is None:
+			return spec
+		loader = spec.loader
+		patch = self._patch
+		class PatchingLoader(importlib.abc.Loader):
+			'''Loader which patches after executing the module.'''
+			def create_module(self, spec):
+				return loader.create_module(spec)
+			def exec_module(self, module):
+				loader.exec_module(module)
+				patch(module)
+		spec.loader = PatchingLoader()
+		return spec
+
+class Simulator:
+	'''
+	Simulated WiFiCom. Use as a context manager: on entry, stand-in modules are installed
+	and the working directory becomes a temporary CIRCUITPY drive; on exit, both are restored.
+	'''
+	# pylint: disable=too-many-instance-attributes
+	def __init__(self, realtime=False, secrets=True, digiroms=None, board_id="raspberry_pi_pico_w"):
+		self.clock = VirtualClock(realtime)
+		self.board_id = board_id
+		self.has_display = True
+		self.buttons = VirtualButtons(self.clock)
+		self.display = InMemoryDisplay(self.clock)
+		self.serial = FakeSerial(self.clock)
+		self.led = FakePWM()
+		self.sleep_memory = bytearray(256)
+		self.heap_size = 150_000
+		self.sounds = []
+		self.toy = dmcomm_fake.Toy()
+		self.executions = []  # (start, end, digirom, result)
+		self.probes = []  # (label, start, end, host_seconds, args, return_value)
+		self.broker = Broker(self.clock)
+		self._broker_up = True
+		self.outages = []  # (start, end, wifi)
+		self.networks = [Network("SimNet", "password")]
+		self.wifi_scan_time = 1.5
+		self.wifi_connect_time = 2.0
+		self.mqtt_connect_time = 1.0
+		self.publish_time = 0.005
+		self.secrets = dict(SECRETS) if secrets is True else secrets
+		self.digiroms = digiroms
+		self.main = None
+		self.exit_reason = None
+		self._saved_modules = None
+		self._saved_cwd = None
+		self._saved_path = None
+		self._saved_meta_path = None
+		self._replacements = None
+		self.drive = None
+	def __enter__(self):
+		self._saved_modules = dict(sys.modules)
+		self._saved_cwd = os.getcwd()
+		self._saved_path = list(sys.path)
+		self.drive = tempfile.mkdtemp(prefix="wificom_sim_")
+		if self.secrets:
+			self.write_file("secrets.json", json.dumps(self.secrets))
+		if self.digiroms is not None:
+			self.write_file("digiroms.txt", self.digiroms)
+		os.chdir(self.drive)
+		for path in (ROOT_DIR, LIB_DIR):
+			if path not in sys.path:
+				sys.path.insert(0, path)
+		for name in list(sys.modules):
+			if name == "wificom" or name.startswith("wificom.") or name == "board_config":
+				del sys.modules[name]
+		for maker in (hardware.make_modules, dmcomm_fake.make_modules, network.make_modules):
+			sys.modules.update(maker(self))
+		self._replacements = (
+			("time", sys.modules["time"], self.clock.module()),
+			("gc", sys.modules["gc"], hardware.make_gc(self)),
+		)
+		self._saved_meta_path = list(sys.meta_path)
+		sys.meta_path.insert(0, _PatchingFinder(self._patch_module))
+		#pylint: disable=import-outside-toplevel
+		import wificom.boot_profile
+		import wificom.main
+		self.main = wificom.main
+		# Module-level steps ran before the clock was patched
+		wificom.boot_profile.start()
+		return self
+	def __exit__(self, exc_type, exc_value, exc_traceback):
+		os.chdir(self._saved_cwd)
+		sys.path[:] = self._saved_path
+		sys.meta_path[:] = self._saved_meta_path
+		sys.modules.clear()
+		sys.modules.update(self._saved_modules)
+		shutil.rmtree(self.drive, ignore_errors=True)
+	def _patch_module(self, mod):
+		'''
+		Give a wificom module the virtual clock as `time`,
+		and a `gc` with the CircuitPython memory functions.
+		'''
+		for (attr, real, fake) in self._replacements:
+			if getattr(mod, attr, None) is real:
+				setattr(mod, attr, fake)
+	def write_file(self, filename, content):
+		'''Write a file on the simulated drive.'''
+		mode = "wb" if isinstance(content, bytes) else "w"
+		with open(os.path.join(self.drive, filename), mode) as f:  #pylint: disable=unspecified-encoding
+			f.write(content)
+	def read_file(self, filename):
+		'''Read a text file on the simulated drive, or None if missing.'''
+		try:
+			with open(os.path.join(self.drive, filename), encoding="utf-8") as f:
+				return f.read()
+		except OSError:
+			return None
+	def module(self, name):
+		'''Get a wificom module, e.g. "mqtt", importing it if the device hasn't yet.'''
+		return importlib.import_module("wificom." + name)
+	def set_mode(self, mode, requested=True):
+		'''Set the startup mode in sleep memory.'''
+		self.module("modes").set_mode(mode, requested)
+	def run(self, mode=None, duration=60):
+		'''
+		Run `main.main` for up to `duration` seconds (from now), starting in `mode` if given.
+		Returns the reason it stopped: "end", "reset" or "reload".
+		'''
+		if mode is not None:
+			self.set_mode(mode)
+		self.clock.end_time = self.clock.monotonic() + duration
+		try:
+			self.main.main(self.led)
+			self.exit_reason = "returned"
+		except SimulationEnd:
+			self.exit_reason = "end"
+		except SimulatedReset:
+			self.exit_reason = "reset"
+		except SimulatedReload:
+			self.exit_reason = "reload"
+		finally:
+			self.clock.end_time = None
+		return self.exit_reason
+	def outage(self, at, duration, wifi=False):
+		'''Make the broker (and WiFi if `wifi`) unreachable from time `at` for `duration` seconds.'''
+		self.outages.append((at, at + duration, wifi))
+	def in_outage(self, wifi=False):
+		'''Whether there is an outage now (of WiFi if `wifi`, else of anything).'''
+		now = self.clock.monotonic()
+		return any(start <= now < end and (is_wifi or not wifi)
+			for (start, end, is_wifi) in self.outages)
+	@property
+	def broker_up(self):
+		'''Whether the broker is reachable.'''
+		return self._broker_up and not self.in_outage()
+	@broker_up.setter
+	def broker_up(self, value):
+		self._broker_up = value
+	def probe(self, obj, name, label):
+		'''
+		Wrap `obj.name` (a function) to record each call in `self.probes` as
+		(label, virtual start, virtual end, host seconds, args, return value).
+		Must be done before the code under test looks the function up.
+		'''
+		original = getattr(obj, name)
+		def wrapper(*args, **kwargs):
+			start = self.clock.monotonic()
+			host_start = time.perf_counter()
+			result = None
+			try:
+				result = original(*args, **kwargs)
+				return result
+			finally:
+				host_seconds = time.perf_counter() - host_start
+				self.probes.append((label, start, self.clock.monotonic(), host_seconds, args, result))
+		setattr(obj, name, wrapper)
+	def probed(self, label):
+		'''Recorded calls for `label`, as [(start, end, host_seconds, args, return_value)].'''
+		return [item[1:] for item in self.probes if item[0] == label]
+	def crash_log(self):
+		'''Contents of the log file, or None if nothing crashed.'''
+		text = self.read_file(self.main.LOG_FILENAME)
+		if text is None or "Crash ID" not in text:
+			return None
+		return text
+	@property
+	def topic_input(self):
+		'''The topic the device listens on.'''
+		return self.module("mqtt")._mqtt_topic_input  #pylint: disable=protected-access
+	@property
+	def topic_output(self):
+		'''The topic the device publishes on.'''
+		return self.module("mqtt")._mqtt_topic_output  #pylint: disable=protected-access
+	def send_command(self, digirom, at=None, application_id="sim-app", api_response=False, **extra):
+		'''Send a command as the server would. Returns the message sent.'''
+		# pylint: disable=too-many-arguments
+		message = {
+			"digirom": digirom,
+			"application_id": application_id,
+			"api_response": api_response,
+		}
+		message.update(extra)
+		text = json.dumps(message)
+		self.broker.publish(self.topic_input, text, at)
+		return text
+	def send_cbor(self, message, at=None):
+		'''Send a message dict to the device as CBOR. Returns the bytes sent.'''
+		data = self.module("wire").cbor_dumps(message)
+		self.broker.publish(self.topic_input, data, at)
+		return data
+	def outputs(self):
+		'''Messages published by the device on its output topic (JSON or CBOR), as [(time, dict)].'''
+		decode = self.module("wire").decode
+		return [(t, decode(message)) for (t, message) in self.broker.messages(self.topic_output)]
+	def executions_of(self, digirom):
+		'''Executions of `digirom`, as [(start, end, result)].'''
+		return [(start, end, result) for (start, end, rom, result) in self.executions
+			if rom.upper() == digirom.upper()]
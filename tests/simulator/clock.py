@@ -0,0 +1,56 @@
+'''Virtual clock for the simulator.'''
+
+import time
+import types
+
+class SimulationEnd(BaseException):
+	'''
+	Raised from the clock when the simulation time limit is reached.
+	BaseException so that the broad `except Exception` in main does not catch it.
+	'''
+
+class VirtualClock:
+	'''
+	Monotonic clock which only moves when code sleeps or polls.
+
+	If `realtime` is True, the clock follows the host's monotonic clock instead
+	(sleeps really sleep), which is useful for measuring host CPU time.
+	'''
+	def __init__(self, realtime=False):
+		self.realtime = realtime
+		self._now = 0.0
+		self._real_start = time.monotonic()
+		self.end_time = None
+	def monotonic(self):
+		'''Current time in seconds.'''
+		if self.realtime:
+			self._now = time.monotonic() - self._real_start
+		self._check_end()
+		return self._now
+	def sleep(self, seconds):
+		'''Advance the clock.'''
+		if seconds < 0:
+			raise ValueError("sleep length must be non-negative")
+		if self.realtime:
+			time.sleep(seconds)
+		else:
+			self._now += seconds
+		self._check_end()
+	def advance(self, seconds):
+		'''Advance the clock without sleeping, e.g. for the cost of a hardware operation.'''
+		if self.realtime:
+			return
+		self._now += seconds
+		self._check_end()
+	def _check_end(self):
+		if self.end_time is not None and self._now >= self.end_time:
+			raise SimulationEnd(f"simulation ended at {self._now:.3f}s")
+	def module(self):
+		'''A replacement for the `time` module backed by this clock.'''
+		fake = types.ModuleType("time")
+		fake.monotonic = self.monotonic
+		fake.sleep = self.sleep
+		fake.monotonic_ns = lambda: int(self.monotonic() * 1_000_000_000)
+		fake.time = time.time
+		fake.localtime = time.localtime
+		return fake
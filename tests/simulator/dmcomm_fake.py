@@ -0,0 +1,187 @@
+'''Stand-in for dmcomm: digirom parsing and a Controller driving a scripted toy.'''
+
+import types
+
+SIGNAL_TYPES = ("V", "X", "Y", "IC", "DL", "FL", "LT", "BC", "C")
+OTHER_OPS = "IPT"
+
+class CommandError(Exception):
+	'''dmcomm.CommandError'''
+
+class ReceiveError(Exception):
+	'''dmcomm.ReceiveError'''
+
+def _hex_data(text):
+	digits = "".join(c for c in text if c in "0123456789ABCDEFabcdef")
+	if len(digits) < 2 or len(digits) % 2 != 0:
+		return None
+	return [int(digits[i:i + 2], 16) for i in range(0, len(digits), 2)]
+
+class Packet:
+	'''One packet in a digirom, with `data` as a list of bytes (or None).'''
+	def __init__(self, text):
+		self.text = text
+		self.data = _hex_data(text)
+	def __str__(self):
+		return self.text
+
+class ResultSegment:
+	'''One sent ("s") or received ("r") item in a result.'''
+	def __init__(self, kind, text):
+		self.kind = kind
+		self.text = text
+		self.data = _hex_data(text)
+	def __str__(self):
+		return f"{self.kind}:{self.text}"
+
+class Result:
+	'''The result of executing a digirom.'''
+	def __init__(self):
+		self._segments = []
+	def append(self, segment):
+		'''Add a segment.'''
+		self._segments.append(segment)
+	def __len__(self):
+		return len(self._segments)
+	def __getitem__(self, i):
+		return self._segments[i]
+	def __iter__(self):
+		return iter(self._segments)
+	def __str__(self):
+		return " ".join(str(segment) for segment in self._segments)
+
+class DigiROM:
+	'''A parsed digirom.'''
+	def __init__(self, text, signal_type, turn, packets):
+		self.text = text
+		self.signal_type = signal_type
+		self.turn = turn
+		self._packets = [Packet(packet) for packet in packets]
+		self.result = None
+		self.op = None
+	def prepare(self):
+		'''Reset result before execution.'''
+		self.result = Result()
+	def __len__(self):
+		return len(self._packets)
+	def __getitem__(self, i):
+		return self._packets[i]
+	def __str__(self):
+		return self.text
+
+class OtherCommand:
+	'''A command which is not a digirom.'''
+	def __init__(self, op, text):
+		self.op = op
+		self.text = text
+		self.signal_type = None
+		self.turn = None
+		self.result = None
+
+def parse_command(text):
+	'''Parse a command string like dmcomm.protocol.parse_command.'''
+	text = text.strip()
+	parts = text.upper().split("-")
+	head = parts[0]
+	if len(head) == 1 and head in OTHER_OPS:
+		return OtherCommand(head, text)
+	signal_type = head.rstrip("0123456789")
+	turn_str = head[len(signal_type):]
+	if signal_type not in SIGNAL_TYPES or turn_str not in ("0", "1", "2"):
+		raise CommandError("op=" + head)
+	packets = parts[1:]
+	for packet in packets:
+		if packet == "":
+			raise CommandError("empty packet")
+	return DigiROM(text, signal_type, int(turn_str), packets)
+
+class Toy:
+	'''
+	Scripted toy on the other end of the prongs/infrared.
+
+	`responses` maps a digirom string to a list of reply strings, or an Exception to raise.
+	`default_response` is used for digiroms not in `responses` (None: toy absent).
+	Execution takes `execute_time + packet_time * packets` seconds of virtual time.
+	'''
+	def __init__(self):
+		self.responses = {}
+		self.default_response = None
+		self.execute_time = 0.1
+		self.packet_time = 0.05
+	def respond(self, digirom_text, replies):
+		'''Set the replies for a digirom.'''
+		self.responses[digirom_text.upper()] = replies
+	def replies(self, digirom):
+		'''Get the replies for a digirom.'''
+		response = self.responses.get(str(digirom).upper(), self.default_response)
+		if callable(response):
+			response = response(digirom)
+		return response
+
+def make_modules(sim):
+	'''
+	Build the dmcomm package for simulator `sim`, as {name: module}.
+	'''
+	dmcomm = types.ModuleType("dmcomm")
+	dmcomm.__path__ = []
+	dmcomm.CommandError = CommandError
+	dmcomm.ReceiveError = ReceiveError
+	protocol = types.ModuleType("dmcomm.protocol")
+	protocol.parse_command = parse_command
+	protocol.DigiROM = DigiROM
+	protocol.OtherCommand = OtherCommand
+	hardware = types.ModuleType("dmcomm.hardware")
+
+	def pin_class(name):
+		def __init__(self, *args, **kwargs):
+			self.args = args
+			self.kwargs = kwargs
+		return type(name, (), {"__init__": __init__})
+	for name in ("ProngOutput", "ProngInput", "InfraredOutput",
+			"InfraredInputModulated", "InfraredInputRaw", "TalisInputOutput"):
+		setattr(hardware, name, pin_class(name))
+
+	class Controller:
+		'''Controller which executes digiroms against `sim.toy`.'''
+		def __init__(self):
+			self.pins = []
+		def register(self, pin_description):
+			'''Register a pin.'''
+			self.pins.append(pin_description)
+		def execute(self, digirom):
+			'''Execute digirom, filling in its result.'''
+			start = sim.clock.monotonic()
+			digirom.prepare()
+			error = None
+			try:
+				replies = sim.toy.replies(digirom)
+				if isinstance(replies, Exception):
+					raise replies
+				self._exchange(digirom, replies or [])
+			except (CommandError, ReceiveError) as e:
+				error = e
+			sim.clock.advance(sim.toy.execute_time + sim.toy.packet_time * len(digirom.result))
+			sim.executions.append((start, sim.clock.monotonic(), str(digirom), str(digirom.result)))
+			if error is not None:
+				raise error
+		@staticmethod
+		def _exchange(digirom, replies):
+			result = digirom.result
+			if digirom.turn == 0:
+				for reply in replies:
+					result.append(ResultSegment("r", reply))
+				return
+			for (i, packet) in enumerate(digirom):
+				if digirom.turn == 2:
+					if i >= len(replies):
+						return
+					result.append(ResultSegment("r", replies[i]))
+				result.append(ResultSegment("s", str(packet)))
+				if digirom.turn == 1:
+					if i >= len(replies):
+						return
+					result.append(ResultSegment("r", replies[i]))
+	hardware.Controller = Controller
+	dmcomm.protocol = protocol
+	dmcomm.hardware = hardware
+	return {"dmcomm": dmcomm, "dmcomm.protocol": protocol, "dmcomm.hardware": hardware}
@@ -0,0 +1,293 @@
+'''Stand-ins for the CircuitPython hardware modules used by WiFiCom.'''
+
+import gc
+import sys
+import types
+
+BUTTON_PINS = {"A": "GP9", "B": "GP8", "C": "GP3"}
+
+class SimulatedReset(BaseException):
+	'''Raised by `microcontroller.reset()`.'''
+
+class SimulatedReload(BaseException):
+	'''Raised by `supervisor.reload()`.'''
+
+class Pin:
+	'''A board pin.'''
+	def __init__(self, name):
+		self.name = name
+	def __repr__(self):
+		return f"board.{self.name}"
+
+class VirtualButtons:
+	'''
+	Buttons A/B/C which can be pressed from code or scripted by time.
+
+	Every read costs `poll_cost` seconds of virtual time, so busy-wait loops make progress.
+	'''
+	def __init__(self, clock, poll_cost=0.001):
+		self._clock = clock
+		self.poll_cost = poll_cost
+		self._held = set()
+		self._script = []  # (start, end, button_id)
+		self.reads = 0
+	def press(self, button_id, at, duration=0.1):
+		'''Press `button_id` at time `at` for `duration` seconds.'''
+		self._script.append((at, at + duration, button_id))
+	def hold(self, button_id, held=True):
+		'''Hold or release `button_id` until changed.'''
+		if held:
+			self._held.add(button_id)
+		else:
+			self._held.discard(button_id)
+	def is_pressed(self, button_id):
+		'''Read the button state.'''
+		self.reads += 1
+		self._clock.advance(self.poll_cost)
+		if button_id in self._held:
+			return True
+		now = self._clock.monotonic()
+		for (start, end, scripted_id) in self._script:
+			if scripted_id == button_id and start <= now < end:
+				return True
+		return False
+
+class InMemoryDisplay:
+	'''Records the text rows shown on the screen.'''
+	def __init__(self, clock):
+		self._clock = clock
+		self._root_group = None
+		self.history = []  # (time, rows)
+		self.updates = 0
+	@property
+	def root_group(self):
+		'''The displayio group being shown.'''
+		return self._root_group
+	@root_group.setter
+	def root_group(self, group):
+		self._root_group = group
+		self.updates += 1
+		self.history.append((self._clock.monotonic(), self.rows()))
+	def rows(self):
+		'''Text rows currently shown.'''
+		if self._root_group is None:
+			return []
+		return [getattr(item, "text", "") for item in self._root_group]
+	def text(self):
+		'''Text currently shown, rows joined with linefeeds.'''
+		return "\n".join(self.rows())
+
+class FakeSerial:
+	'''
+	USB CDC serial stand-in with scripted input and captured output.
+	'''
+	def __init__(self, clock):
+		self._clock = clock
+		self._buffer = bytearray()
+		self._script = []  # (time, bytes)
+		self.output = bytearray()
+		self.timeout = 1
+		self.write_timeout = None
+		self.accept = None  # bytes taken per write without waiting, None for all
+	def feed(self, data, at=None):
+		'''Make `data` arrive at time `at` (now if None).'''
+		if isinstance(data, str):
+			data = data.encode("utf-8")
+		if at is None:
+			self._buffer.extend(data)
+		else:
+			self._script.append((at, bytes(data)))
+			self._script.sort(key=lambda item: item[0])
+	def _arrive(self):
+		now = self._clock.monotonic()
+		while self._script and self._script[0][0] <= now:
+			self._buffer.extend(self._script.pop(0)[1])
+	@property
+	def in_waiting(self):
+		'''Bytes available now.'''
+		self._arrive()
+		return len(self._buffer)
+	def read(self, size=1):
+		'''Read up to `size` bytes which are available.'''
+		self._arrive()
+		data = bytes(self._buffer[0:size])
+		del self._buffer[0:size]
+		return data
+	def readinto(self, buf):
+		'''Read up to len(buf) available bytes into buf.'''
+		self._arrive()
+		length = min(len(buf), len(self._buffer))
+		buf[0:length] = self._buffer[0:length]
+		del self._buffer[0:length]
+		return length
+	def write(self, data):
+		'''Capture output, only up to `accept` bytes if not waiting.'''
+		count = len(data)
+		if self.write_timeout == 0 and self.accept is not None:
+			count = min(count, self.accept)
+		self.output.extend(data[0:count])
+		return count
+
+class FakePWM:
+	'''LED PWM stand-in.'''
+	def __init__(self):
+		self.duty_cycle = 0
+		self.frequency = 1000
+
+def make_modules(sim):
+	'''
+	Build the hardware modules for simulator `sim`, as {name: module}.
+	'''
+	# pylint: disable=too-many-locals,too-many-statements
+	modules = {}
+	def module(name):
+		mod = types.ModuleType(name)
+		modules[name] = mod
+		return mod
+
+	board = module("board")
+	board.board_id = sim.board_id
+	for i in range(30):
+		setattr(board, f"GP{i}", Pin(f"GP{i}"))
+	for name in ("LED", "VOLTAGE_MONITOR", "SCK1", "MOSI1", "MISO1", "CS1"):
+		setattr(board, name, Pin(name))
+
+	digitalio = module("digitalio")
+	class Direction:
+		'''digitalio.Direction'''
+		INPUT = "input"
+		OUTPUT = "output"
+	class Pull:
+		'''digitalio.Pull'''
+		UP = "up"
+		DOWN = "down"
+	button_ids = {pin: button_id for (button_id, pin) in BUTTON_PINS.items()}
+	class DigitalInOut:
+		'''digitalio.DigitalInOut, reading virtual buttons where assigned.'''
+		def __init__(self, pin):
+			self._pin = pin
+			self._value = False
+			self.direction = Direction.INPUT
+			self.pull = None
+		@property
+		def value(self):
+			'''Pin value; buttons read low when pressed.'''
+			button_id = button_ids.get(self._pin.name)
+			if button_id is not None:
+				return not sim.buttons.is_pressed(button_id)
+			return self._value
+		@value.setter
+		def value(self, value):
+			self._value = value
+		def deinit(self):
+			'''Release the pin.'''
+	digitalio.Direction = Direction
+	digitalio.Pull = Pull
+	digitalio.DigitalInOut = DigitalInOut
+
+	displayio = module("displayio")
+	class Group(list):
+		'''displayio.Group'''
+	displayio.Group = Group
+	displayio.release_displays = lambda: None
+
+	busio = module("busio")
+	busio.I2C = lambda scl, sda: (scl, sda)
+	i2cdisplaybus = module("i2cdisplaybus")
+	i2cdisplaybus.I2CDisplayBus = lambda i2c, device_address: (i2c, device_address)
+	terminalio = module("terminalio")
+	terminalio.FONT = object()
+	ssd1306 = module("adafruit_displayio_ssd1306")
+	def make_display(display_bus, width, height):  #pylint: disable=unused-argument
+		if not sim.has_display:
+			raise RuntimeError("No display connected")
+		return sim.display
+	ssd1306.SSD1306 = make_display
+
+	module("adafruit_display_text")
+	bitmap_label = module("adafruit_display_text.bitmap_label")
+	class Label:
+		'''Text label.'''
+		def __init__(self, font, text="", color=0xFFFFFF, x=0, y=0):
+			self.font = font
+			self.text = text
+			self.color = color
+			self.x = x
+			self.y = y
+	bitmap_label.Label = Label
+	modules["adafruit_display_text"].bitmap_label = bitmap_label
+
+	analogio = module("analogio")
+	class AnalogIn:
+		'''analogio.AnalogIn'''
+		def __init__(self, pin):
+			self.pin = pin
+			self.value = 0xFFFF
+	analogio.AnalogIn = AnalogIn
+
+	rp2pio = module("rp2pio")
+	class StateMachine:
+		'''PIO state machine, recording sound writes.'''
+		def __init__(self, program, frequency, first_set_pin, set_pin_count):
+			self.program = program
+			self.frequency = frequency
+			self.pin = first_set_pin
+			self.pin_count = set_pin_count
+		def background_write(self, data):
+			'''Record sound data.'''
+			sim.sounds.append((sim.clock.monotonic(), list(data)))
+		def deinit(self):
+			'''Release hardware.'''
+	rp2pio.StateMachine = StateMachine
+
+	pwmio = module("pwmio")
+	pwmio.PWMOut = lambda pin, duty_cycle=0, frequency=1000, variable_frequency=False: FakePWM()
+
+	microcontroller = module("microcontroller")
+	class RunMode:
+		'''microcontroller.RunMode'''
+		NORMAL = "normal"
+		UF2 = "uf2"
+	def reset():
+		raise SimulatedReset()
+	microcontroller.RunMode = RunMode
+	microcontroller.reset = reset
+	microcontroller.on_next_reset = lambda run_mode: None
+
+	supervisor = module("supervisor")
+	def reload():
+		raise SimulatedReload()
+	supervisor.reload = reload
+	supervisor.runtime = types.SimpleNamespace(autoreload=True, serial_connected=True)
+	supervisor.status_bar = types.SimpleNamespace(console=True, display=True)
+
+	usb_cdc = module("usb_cdc")
+	usb_cdc.console = sim.serial
+	usb_cdc.data = None
+
+	alarm = module("alarm")
+	alarm.sleep_memory = sim.sleep_memory
+
+	storage = module("storage")
+	storage.remount = lambda path, readonly=False: None
+	usb_hid = module("usb_hid")
+	usb_hid.disable = lambda: None
+	return modules
+
+def make_gc(sim):
+	'''
+	Build a `gc` module with CircuitPython's `mem_free` and `mem_alloc`.
+	Memory figures are nominal: `sim.heap_size` less the host's growth in allocated blocks
+	since the simulator started, at 16 bytes per block.
+	'''
+	baseline = sys.getallocatedblocks()
+	fake = types.ModuleType("gc")
+	fake.collect = gc.collect
+	fake.enable = gc.enable
+	fake.disable = gc.disable
+	fake.isenabled = gc.isenabled
+	def mem_alloc():
+		return min(max(0, sys.getallocatedblocks() - baseline) * 16, sim.heap_size)
+	fake.mem_alloc = mem_alloc
+	fake.mem_free = lambda: sim.heap_size - mem_alloc()
+	return fake
@@ -0,0 +1,223 @@
+'''Stand-ins for WiFi and an in-process MQTT broker.'''
+
+import types
+
+class MMQTTException(Exception):
+	'''adafruit_minimqtt.MMQTTException'''
+
+class Broker:
+	'''
+	In-process MQTT broker. Messages can be published now or scheduled
+	for a later virtual time, and every publish is logged.
+	'''
+	def __init__(self, clock):
+		self._clock = clock
+		self._clients = []
+		self._scheduled = []  # (time, topic, message)
+		self.published = []  # (time, topic, message)
+		self.latency = 0.01
+	def attach(self, client):
+		'''Attach a client.'''
+		self._clients.append(client)
+	def publish(self, topic, message, at=None):
+		'''Publish to subscribers at time `at` (now if None), plus broker latency.'''
+		now = self._clock.monotonic()
+		if at is None:
+			at = now
+		self.published.append((at, topic, message))
+		self._scheduled.append((at + self.latency, topic, message))
+		self._scheduled.sort(key=lambda item: item[0])
+	def next_delivery(self):
+		'''Time of the next scheduled delivery, or None.'''
+		if not self._scheduled:
+			return None
+		return self._scheduled[0][0]
+	def deliver(self):
+		'''Deliver messages which are due to subscribed clients.'''
+		now = self._clock.monotonic()
+		while self._scheduled and self._scheduled[0][0] <= now:
+			(_, topic, message) = self._scheduled.pop(0)
+			for client in self._clients:
+				if client.is_connected and topic in client.subscriptions:
+					client.receive(topic, message)
+	def messages(self, topic):
+		'''Messages published on `topic`, as [(time, message)].'''
+		return [(t, message) for (t, msg_topic, message) in self.published if msg_topic == topic]
+
+class MQTT:
+	'''
+	MQTT client like adafruit_minimqtt's, connected to the simulator's broker.
+	`loop(timeout)` blocks for `timeout` virtual seconds, delivering messages as they arrive.
+	'''
+	def __init__(self, sim, broker=None, username=None, password=None, socket_pool=None,
+			ssl_context=None, keep_alive=60, connect_retries=5, socket_timeout=1, use_binary_mode=False, **kwargs):
+		# pylint: disable=too-many-arguments,unused-argument
+		self._sim = sim
+		self.broker = broker
+		self.username = username
+		self.keep_alive = keep_alive
+		self._socket_timeout = socket_timeout
+		self._use_binary_mode = use_binary_mode
+		self._connected = False
+		self.subscriptions = set()
+		self._topic_callbacks = {}
+		self.on_connect = None
+		self.on_disconnect = None
+		self.on_subscribe = None
+		self.on_unsubscribe = None
+		self.on_message = None
+		sim.broker.attach(self)
+	@property
+	def is_connected(self):
+		'''Whether connected to the broker.'''
+		return self._connected
+	def connect(self):
+		'''Connect to the broker.'''
+		if not self._sim.broker_up:
+			raise MMQTTException("Broker unreachable")
+		self._sim.clock.advance(self._sim.mqtt_connect_time)
+		self._connected = True
+		if self.on_connect is not None:
+			self.on_connect(self, None, 0, 0)
+	def disconnect(self):
+		'''Disconnect from the broker.'''
+		self._connected = False
+		if self.on_disconnect is not None:
+			self.on_disconnect(self, None, 0)
+	def reconnect(self, resubscribe=True):  #pylint: disable=unused-argument
+		'''Reconnect to the broker.'''
+		self.connect()
+	def ping(self):
+		'''Ping the broker.'''
+		self._check_connected()
+	def _check_connected(self):
+		if not self._connected:
+			raise MMQTTException("MiniMQTT is not connected")
+		if not self._sim.broker_up:
+			self._connected = False
+			raise MMQTTException("Connection lost")
+	def subscribe(self, topic, qos=0):
+		'''Subscribe to a topic.'''
+		self._check_connected()
+		self.subscriptions.add(topic)
+		if self.on_subscribe is not None:
+			self.on_subscribe(self, None, topic, qos)
+	def unsubscribe(self, topic):
+		'''Unsubscribe from a topic.'''
+		self._check_connected()
+		self.subscriptions.discard(topic)
+		if self.on_unsubscribe is not None:
+			self.on_unsubscribe(self, None, topic, 0)
+	def add_topic_callback(self, topic, callback):
+		'''Set the callback for a topic.'''
+		self._topic_callbacks[topic] = callback
+	def remove_topic_callback(self, topic):
+		'''Remove the callback for a topic.'''
+		self._topic_callbacks.pop(topic, None)
+	def publish(self, topic, msg, retain=False, qos=0):  #pylint: disable=unused-argument
+		'''Publish a message.'''
+		self._check_connected()
+		self._sim.clock.advance(self._sim.publish_time)
+		self._sim.broker.publish(topic, msg)
+	def receive(self, topic, message):
+		'''Called by the broker to deliver a message.'''
+		callback = self._topic_callbacks.get(topic, self.on_message)
+		if self._use_binary_mode:
+			message = bytearray(message.encode("utf-8") if isinstance(message, str) else message)
+		elif not isinstance(message, str):
+			message = str(message, "utf-8")
+		if callback is not None:
+			callback(self, topic, message)
+	def loop(self, timeout=0):
+		'''Process incoming messages for `timeout` seconds.'''
+		if timeout < self._socket_timeout:
+			raise MMQTTException("loop timeout must be >= socket_timeout")
+		self._check_connected()
+		clock = self._sim.clock
+		end = clock.monotonic() + timeout
+		while True:
+			self._sim.broker.deliver()
+			now = clock.monotonic()
+			next_delivery = self._sim.broker.next_delivery()
+			if next_delivery is None or next_delivery >= end:
+				if end > now:
+					clock.sleep(end - now)
+				self._sim.broker.deliver()
+				return
+			if next_delivery > now:
+				clock.sleep(next_delivery - now)
+
+class Network:
+	'''A WiFi network visible to the radio.'''
+	def __init__(self, ssid, password, rssi=-60, channel=6, bssid=b"\x02\x00\x00\x00\x00\x01"):
+		# pylint: disable=too-many-arguments
+		self.ssid = ssid
+		self.password = password
+		self.rssi = rssi
+		self.channel = channel
+		self.bssid = bssid
+
+class Radio:
+	'''wifi.radio stand-in.'''
+	def __init__(self, sim):
+		self._sim = sim
+		self._address = None
+		self.ssid = None
+		self.channel = None
+		self.scans = 0
+		self.connects = 0
+	@property
+	def ipv4_address(self):
+		'''Address while connected, None otherwise (including during a WiFi outage).'''
+		if self._sim.in_outage(wifi=True):
+			self._address = None
+		return self._address
+	def start_scanning_networks(self, start_channel=1, stop_channel=11):  #pylint: disable=unused-argument
+		'''Scan and return visible networks.'''
+		self.scans += 1
+		self._sim.clock.advance(self._sim.wifi_scan_time)
+		if self._sim.in_outage(wifi=True):
+			return iter([])
+		return iter(list(self._sim.networks))
+	def stop_scanning_networks(self):
+		'''Stop scanning.'''
+	def disconnect(self):
+		'''Leave the network.'''
+		self._address = None
+	def connect(self, ssid, password=None, channel=0, bssid=None, timeout=None):
+		'''Connect to a network.'''
+		# pylint: disable=too-many-arguments,unused-argument
+		self.connects += 1
+		self._sim.clock.advance(self._sim.wifi_connect_time)
+		if self._sim.in_outage(wifi=True):
+			raise ConnectionError("No network with that ssid")
+		for network in self._sim.networks:
+			if network.ssid == ssid and network.password == password:
+				if channel not in (0, network.channel) or bssid not in (None, network.bssid):
+					break
+				self._address = "192.168.0.2"
+				self.ssid = ssid
+				self.channel = network.channel
+				return
+		raise ConnectionError("No network with that ssid")
+
+def make_modules(sim):
+	'''
+	Build the networking modules for simulator `sim`, as {name: module}.
+	'''
+	wifi = types.ModuleType("wifi")
+	wifi.radio = Radio(sim)
+	socketpool = types.ModuleType("socketpool")
+	socketpool.SocketPool = lambda radio: ("pool", radio)
+	minimqtt_pkg = types.ModuleType("adafruit_minimqtt")
+	minimqtt_pkg.__path__ = []
+	minimqtt = types.ModuleType("adafruit_minimqtt.adafruit_minimqtt")
+	minimqtt.MMQTTException = MMQTTException
+	minimqtt.MQTT = lambda **kwargs: MQTT(sim, **kwargs)
+	minimqtt_pkg.adafruit_minimqtt = minimqtt
+	return {
+		"wifi": wifi,
+		"socketpool": socketpool,
+		"adafruit_minimqtt": minimqtt_pkg,
+		"adafruit_minimqtt.adafruit_minimqtt": minimqtt,
+	}
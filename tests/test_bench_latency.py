@@ -0,0 +1,22 @@
+'''Smoke test for the latency benchmark, so it keeps working as the loops change.'''
+
+import random
+import pytest
+import bench_latency
+
+@pytest.mark.parametrize("scenario", list(bench_latency.SCENARIOS))
+def test_scenario(scenario):
+	'''Each scenario matches every command to its stages.'''
+	(samples, host) = bench_latency.SCENARIOS[scenario](3, random.Random(1))
+	assert len(samples["total"]) == 3
+	assert len(host["execute"]) == 3
+	summary = bench_latency.summarize(samples)
+	assert summary["total"]["p50"] <= summary["total"]["p99"]
+
+def test_percentile():
+	'''Nearest-rank percentile.'''
+	values = list(range(1, 101))
+	assert bench_latency.percentile(values, 50) == 50
+	assert bench_latency.percentile(values, 99) == 99
+	assert bench_latency.percentile([5], 95) == 5
+	assert bench_latency.percentile([], 50) is None
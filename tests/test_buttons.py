@@ -0,0 +1,67 @@
+'''Tests for buttons module.'''
+
+import types
+import pytest
+import target_paths  #pylint: disable=unused-import
+from wificom import buttons
+from wificom.buttons import ButtonEvents
+
+@pytest.fixture(name="fake")
+def fixture_fake():
+	'''Fake clock and button states: `fake.now`, `fake.held` (set of names).'''
+	return types.SimpleNamespace(now=0.0, held=set())
+
+@pytest.fixture(name="events")
+def fixture_events(fake):
+	'''ButtonEvents for A and B, on the fake clock.'''
+	def sleep(seconds):
+		fake.now += seconds
+	return ButtonEvents(lambda name: name in fake.held, "AB", lambda: fake.now, sleep)
+
+def run(fake, events, until):
+	'''Scan every 10ms until time `until`, returning [(time, name, kind)].'''
+	result = []
+	while fake.now < until:
+		fake.now = round(fake.now + 0.01, 3)
+		event = events.get()
+		while event is not None:
+			result.append((fake.now,) + event)
+			event = events.get()
+	return result
+
+def test_debounce(fake, events):
+	'''Bounces shorter than the debounce time are ignored.'''
+	fake.held.add("A")
+	fake.now = 0.01
+	events.scan()
+	fake.held.clear()
+	assert run(fake, events, 0.1) == []
+	fake.held.add("A")
+	[(press_time, name, kind)] = run(fake, events, 0.2)
+	assert (name, kind) == ("A", buttons.PRESS)
+	assert 0.12 <= press_time <= 0.14
+	fake.held.clear()
+	[(release_time, name, kind)] = run(fake, events, 0.3)
+	assert (name, kind) == ("A", buttons.RELEASE)
+	assert 0.22 <= release_time <= 0.24
+
+def test_long_press_and_repeat(fake, events):
+	'''Holding gives repeats after a delay, and one long press.'''
+	fake.held.add("B")
+	kinds = [kind for (_, name, kind) in run(fake, events, 1.2) if name == "B"]
+	assert kinds[0] == buttons.PRESS
+	assert kinds.count(buttons.LONG_PRESS) == 1
+	assert kinds.count(buttons.REPEAT) == 5  # about 0.5, 0.65, 0.8, 0.95, 1.1 after press
+	assert 1.15 <= events.held("B") <= 1.19
+	assert events.held("A") == 0
+
+def test_held_at_start(fake, events):
+	'''A button held when cleared must be released before it counts.'''
+	fake.held.add("A")
+	events.clear()
+	assert run(fake, events, 2) == []
+	fake.held.clear()
+	run(fake, events, 2.1)
+	fake.held.add("A")
+	assert events.wait(timeout=1) == ("A", buttons.PRESS)
+	assert events.wait(timeout=0.1) is None
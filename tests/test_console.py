@@ -0,0 +1,68 @@
+'''Tests for console module.'''
+
+import types
+import target_paths  #pylint: disable=unused-import
+from wificom.console import BufferedConsole
+
+class SlowHost:  #pylint: disable=too-few-public-methods
+	'''Takes up to `accept` bytes per write, advancing the clock by `cost` seconds.'''
+	def __init__(self, accept, cost=0.001):
+		self.accept = accept
+		self.cost = cost
+		self.now = 0
+		self.received = bytearray()
+	def write(self, data):
+		'''Write what fits.'''
+		self.now += self.cost
+		count = min(self.accept, len(data))
+		self.received.extend(data[0:count])
+		return count
+
+def make_console(host, size=64):
+	'''A console writing to `host`, on its clock.'''
+	def sleep(seconds):
+		host.now += seconds
+	return BufferedConsole(host.write, size, lambda: host.now, sleep)
+
+def test_pump_partial_writes():
+	'''Lines are written as the host takes them; write time is measured.'''
+	host = SlowHost(accept=4)
+	console = make_console(host)
+	console.print("hello", 1)
+	assert console.pump() == 4
+	assert len(console) == 5
+	assert console.flush()
+	assert host.received == b"hello 1\r\n"
+	assert (console.pumps, console.written) == (3, 9)
+	assert abs(console.max_pump_time - 0.001) < 1e-9
+	assert console.pump() == 0
+
+def test_coalesce_and_drop():
+	'''Repeats are counted; lines which don't fit are dropped and counted once there is room.'''
+	host = SlowHost(accept=0)
+	console = make_console(host, size=24)
+	for _ in range(3):
+		console.put("same")
+	console.put("a" * 30)
+	console.put("b" * 10)
+	console.put("c" * 10)
+	# The note of repeats doesn't fit after "same", so the other lines are dropped
+	assert (console.coalesced, console.dropped) == (2, 3)
+	host.accept = 100
+	for _ in range(3):
+		console.pump()
+	for _ in range(2):
+		console.put("d")
+		console.pump()
+	assert host.received.decode().split("\r\n") == \
+		["same", "(repeated 2 times)", "(3 lines dropped)", "d", "d", ""]
+	assert console.stats().startswith("Console: 8 lines, 2 coalesced, 3 dropped,")
+
+def test_flush_timeout():
+	'''Flush gives up when the host takes nothing.'''
+	host = SlowHost(accept=0)
+	console = make_console(host)
+	console.put("stuck")
+	assert not console.flush(timeout=0.5)
+	assert 0.5 <= host.now < 0.6
+	assert len(console) == 7
@@ -0,0 +1,56 @@
+'''Tests for digirom_cache module.'''
+
+import types
+import pytest
+import target_paths  #pylint: disable=unused-import
+from wificom.digirom_cache import DigiROMCache
+
+class ParseError(Exception):
+	'''Stands in for CommandError.'''
+
+@pytest.fixture(name="parsed")
+def fixture_parsed():
+	'''List of texts parsed so far.'''
+	return []
+
+@pytest.fixture(name="cache")
+def fixture_cache(parsed):
+	'''Cache of size 2 with a fake parser, which fails on "bad".'''
+	def parse(text):
+		if text == "bad":
+			raise ParseError(text)
+		parsed.append(text)
+		return types.SimpleNamespace(text=text, result=None)
+	return DigiROMCache(parse, size=2)
+
+def test_hit_reuses_with_result_cleared(cache, parsed):
+	'''A repeated text is not parsed again, and its old result is cleared.'''
+	rom = cache.parse("V1-0000")
+	rom.result = ["old"]
+	again = cache.parse("V1-0000")
+	assert again is rom
+	assert again.result is None
+	assert parsed == ["V1-0000"]
+	assert cache.stats() == {"size": 1, "hits": 1, "misses": 1}
+
+def test_least_recently_used_evicted(cache, parsed):
+	'''When full, the text used longest ago is dropped.'''
+	cache.parse("a")
+	cache.parse("b")
+	cache.parse("a")
+	cache.parse("c")
+	assert len(cache) == 2
+	cache.parse("a")
+	cache.parse("b")
+	assert parsed == ["a", "b", "c", "b"]
+	assert (cache.hits, cache.misses) == (2, 4)
+
+def test_errors_not_cached(cache):
+	'''Parse errors propagate every time.'''
+	for _ in range(2):
+		with pytest.raises(ParseError):
+			cache.parse("bad")
+	assert len(cache) == 0
+	assert cache.misses == 2
+	cache.clear()
+	assert len(cache) == 0
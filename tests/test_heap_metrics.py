@@ -0,0 +1,50 @@
+'''Tests for heap_metrics module.'''
+
+import types
+import pytest
+import target_paths  #pylint: disable=unused-import
+from wificom import heap_metrics
+
+@pytest.fixture(name="heap")
+def fixture_heap(monkeypatch):
+	'''heap_metrics with fresh state, a fake clock and a fake heap of `heap.free` bytes.'''
+	fake = types.SimpleNamespace(now=100.0, free=50_000)
+	monkeypatch.setattr(heap_metrics, "_state", heap_metrics._State())  #pylint: disable=protected-access
+	monkeypatch.setattr(heap_metrics, "time", types.SimpleNamespace(monotonic=lambda: fake.now))
+	monkeypatch.setattr(heap_metrics, "gc", types.SimpleNamespace(mem_free=lambda: fake.free))
+	monkeypatch.setattr(heap_metrics, "largest_block", lambda upper=None: fake.free // 2)
+	return fake
+
+def test_record_interval(heap):
+	'''Samples update the summary every time, but the ring at most once per interval.'''
+	for (step, free) in enumerate([50_000, 40_000, 45_000, 30_000, 35_000]):
+		heap.now = 100 + step * 0.5
+		heap.free = free
+		heap_metrics.sample("w")
+	summary = heap_metrics.summary()
+	assert summary["free"] == 35_000
+	assert summary["min_free"] == 30_000
+	assert summary["gcs"] == 2
+	recorded = heap_metrics.samples()
+	assert [(t, mode, free) for (t, mode, free, _, _) in recorded] == \
+		[(100, "w", 50_000), (101, "w", 45_000), (102, "w", 35_000)]
+	assert recorded[0][3] == 25_000
+	assert "heap_min_free = 30000" in heap_metrics.toml().split("\r\n")
+
+def test_ring_wraps(heap):
+	'''Only the latest RING_SIZE samples are kept.'''
+	for step in range(heap_metrics.RING_SIZE + 5):
+		heap.now = 100 + step * heap_metrics.RECORD_INTERVAL
+		heap.free = 10_000 + step
+		heap_metrics.sample("s")
+	recorded = heap_metrics.samples()
+	assert len(recorded) == heap_metrics.RING_SIZE
+	assert recorded[0][2] == 10_005
+	assert recorded[-1][2] == 10_000 + heap_metrics.RING_SIZE + 4
+	lines = heap_metrics.lines(3)
+	assert len(lines) == 5
+	assert lines[-1].split()[1:3] == ["s", str(10_000 + heap_metrics.RING_SIZE + 4)]
+
+def test_largest_block():
+	'''Binary search finds an allocatable size no more than the upper bound.'''
+	assert 0 < heap_metrics.largest_block(10_000) <= 10_000
@@ -0,0 +1,92 @@
+'''Tests for log module.'''
+
+import os
+import types
+import pytest
+import target_paths  #pylint: disable=unused-import
+from wificom import log
+
+@pytest.fixture(name="clock")
+def fixture_clock(monkeypatch):
+	'''log with fresh state, a fake clock at `clock.now`, and console lines in `clock.console`.'''
+	fake = types.SimpleNamespace(now=100.0, console=[])
+	monkeypatch.setattr(log, "_state", log._State())  #pylint: disable=protected-access
+	monkeypatch.setattr(log, "time", types.SimpleNamespace(monotonic=lambda: fake.now))
+	log.set_console(fake.console.append)
+	return fake
+
+class Formatted:  #pylint: disable=too-few-public-methods
+	'''An argument which counts how often it is formatted.'''
+	count = 0
+	def __str__(self):
+		Formatted.count += 1
+		return "formatted"
+
+def test_levels_and_lazy_format(clock):
+	'''Records below the level are dropped; messages are only formatted when needed.'''
+	log.set_level(log.INFO)
+	log.debug("hidden %d", 1)
+	Formatted.count = 0
+	log.set_console(clock.console.append, log.WARNING)
+	log.info("quiet %s", Formatted())
+	assert Formatted.count == 0
+	log.warning("loud %s", Formatted())
+	log.error("bad %d", "x")  # Wrong type: shown as message and arguments
+	assert clock.console == ["loud formatted", "bad %d ('x',)"]
+	assert log.lines() == ["100.0 I quiet formatted", "100.0 W loud formatted",
+		"100.0 E bad %d ('x',)"]
+	assert log.lines(log.WARNING, count=1) == ["100.0 E bad %d ('x',)"]
+	assert log.dump(log.ERROR).split("\r\n") == \
+		["Log: 3 records, 0 dropped, 0 lost", "100.0 E bad %d ('x',)"]
+
+def test_rate_limit(clock):
+	'''A burst over the limit is dropped, except errors; the limit recovers over time.'''
+	for i in range(log.RATE_BURST + 5):
+		log.debug("spam %d", i)
+	log.error("still here")
+	assert log.stats().startswith(f"Log: {log.RATE_BURST + 1} records, 5 dropped")
+	clock.now += 1
+	for i in range(log.RATE_LIMIT):
+		log.debug("later %d", i)
+	assert log.stats().startswith(f"Log: {log.RATE_BURST + 1 + log.RATE_LIMIT} records, 5 dropped")
+
+def test_flush_and_rotate(clock, tmp_path, monkeypatch):
+	'''Warnings are written in batches; the file rotates through the segments.'''
+	monkeypatch.setattr(log, "SEGMENT_SIZE", 100)
+	filename = str(tmp_path / "log.txt")
+	log.set_file(filename)
+	log.info("not written")
+	log.warning("first")
+	assert log.flush()
+	log.warning("second")
+	assert not log.flush()  # Too soon
+	clock.now += log.FLUSH_INTERVAL
+	assert log.flush()
+	with open(filename, encoding="utf-8", newline="") as log_file:
+		assert log_file.read() == "100.0 W first\r\n100.0 W second\r\n"
+	for i in range(8):
+		log.warning("x" * 40 + str(i))
+		assert log.flush(force=True)
+	assert log.segment_name(1) == str(tmp_path / "log_1.txt")
+	names = sorted(os.listdir(tmp_path))
+	assert names == ["log.txt", "log_1.txt", "log_2.txt"]
+	with open(log.segment_name(0), encoding="utf-8") as log_file:
+		assert log_file.read().endswith("x7\n")
+
+def test_lost_and_write_error(clock, tmp_path):
+	'''Unwritten records overwritten in the ring are counted; failed writes are kept for later.'''
+	filename = str(tmp_path / "missing" / "log.txt")
+	log.set_file(filename)
+	for i in range(log.RING_SIZE + 3):
+		clock.now += 1
+		log.warning("w%d", i)
+	assert not log.flush(force=True)
+	assert log.write_error().startswith("Cannot write log: ")
+	assert log.stats().endswith(", 3 lost, " + log.write_error())
+	os.mkdir(tmp_path / "missing")
+	assert log.flush(force=True)
+	assert log.write_error() is None
+	with open(filename, encoding="utf-8") as log_file:
+		lines = log_file.read().splitlines()
+	assert len(lines) == log.RING_SIZE
+	assert lines[0].endswith(" W w3")
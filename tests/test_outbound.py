@@ -0,0 +1,71 @@
+'''Tests for outbound module.'''
+
+import pytest
+import target_paths  #pylint: disable=unused-import
+from wificom.outbound import OutboundQueue
+
+def drain(queue):
+	'''Flush everything, returning [(topic, message)].'''
+	published = []
+	queue.flush(lambda topic, message: published.append((topic, message)))
+	return published
+
+def test_fifo():
+	'''Messages come out in order, as bytes.'''
+	queue = OutboundQueue(size=64, slots=4)
+	queue.push("a", "one")
+	queue.push("b", b"two")
+	assert len(queue) == 2
+	assert queue.peek() == ("a", b"one")
+	assert drain(queue) == [("a", b"one"), ("b", b"two")]
+	assert len(queue) == 0
+	assert queue.peek() is None
+	assert queue.stats()["sent"] == 2
+
+def test_coalesce():
+	'''A replaceable message replaces the newest one if also replaceable, for the same topic.'''
+	queue = OutboundQueue(size=64, slots=4)
+	queue.push("t", "ping1", True)
+	queue.push("t", "ping2", True)
+	queue.push("t", "result")
+	queue.push("t", "ping3", True)
+	queue.push("u", "ping4", True)
+	assert drain(queue) == [("t", b"ping2"), ("t", b"result"), ("t", b"ping3"), ("u", b"ping4")]
+	assert queue.stats()["coalesced"] == 1
+
+def test_drop_oldest():
+	'''When slots or bytes run out, the oldest messages are dropped.'''
+	queue = OutboundQueue(size=10, slots=3)
+	for message in ["aaa", "bbb", "ccc", "ddd"]:
+		queue.push("t", message)
+	assert queue.stats()["dropped"] == 1
+	queue.push("t", "eeeeee")
+	assert drain(queue) == [("t", b"ddd"), ("t", b"eeeeee")]
+	assert queue.stats()["dropped"] == 3
+	assert not queue.push("t", "x" * 11)
+	assert queue.stats()["dropped"] == 4
+
+def test_compact():
+	'''Space freed at the front is reused.'''
+	queue = OutboundQueue(size=10, slots=4)
+	queue.push("t", "aaaa")
+	queue.push("t", "bbbb")
+	queue.pop()
+	queue.push("t", "cccccc")
+	assert queue.stats()["dropped"] == 0
+	assert queue.bytes_queued() == 10
+	assert drain(queue) == [("t", b"bbbb"), ("t", b"cccccc")]
+
+def test_retry():
+	'''A message which fails to publish stays queued.'''
+	queue = OutboundQueue()
+	queue.push("t", "one")
+	queue.push("t", "two")
+	def fail(topic, message):
+		raise OSError("disconnected")
+	with pytest.raises(OSError):
+		queue.flush(fail)
+	assert len(queue) == 2
+	assert queue.stats()["failures"] == 1
+	assert queue.flush(lambda topic, message: None, max_messages=1) == 1
+	assert drain(queue) == [("t", b"two")]
@@ -0,0 +1,48 @@
+'''Tests for outcome module.'''
+
+import target_paths  #pylint: disable=unused-import
+from wificom import outcome
+
+class FakeDigiROM:  #pylint: disable=too-few-public-methods
+	'''Just enough of a digirom to classify: `turn`, packet count and `result`.'''
+	def __init__(self, turn, packets, result):
+		self.turn = turn
+		self.packets = packets
+		self.result = result
+	def __len__(self):
+		return self.packets
+
+def classify(turn, packets, result, error=None):
+	'''Classify `result`, a list of segment texts.'''
+	return outcome.Outcome(FakeDigiROM(turn, packets, result), error).code
+
+def test_classify():
+	'''Outcome codes come from segment kinds, counts and errors.'''
+	assert classify(2, 2, ["r:1", "s:2", "r:3", "s:4"]) == outcome.COMPLETE
+	assert classify(2, 2, ["r:1", "s:2"]) == outcome.PARTIAL
+	assert classify(2, 2, []) == outcome.NO_REPLY
+	assert classify(1, 1, ["s:1"]) == outcome.NO_REPLY
+	assert classify(1, 1, ["s:1", "r:2"]) == outcome.COMPLETE
+	assert classify(1, 1, ["s:1", "r:2", "t"]) == outcome.PARTIAL
+	assert classify(0, 1, ["t", "r:2"]) == outcome.COMPLETE
+	assert classify(2, 2, ["r:1", "s:2", "r:3", "s:4"], ValueError("x")) == outcome.ERROR
+
+class CountingResult(list):
+	'''A result which counts how often it is turned into text.'''
+	texts = 0
+	def __str__(self):
+		CountingResult.texts += 1
+		return " ".join(self)
+
+def test_text_lazy():
+	'''The text is built once, only when asked for, from the result at the time of execution.'''
+	CountingResult.texts = 0
+	rom = FakeDigiROM(2, 1, CountingResult(["r:1", "s:2"]))
+	result = outcome.Outcome(rom, ValueError("bad"))
+	rom.result = CountingResult(["r:9"])
+	assert CountingResult.texts == 0
+	assert result.text() == "r:1 s:2 ValueError('bad')"
+	assert str(result) == result.text()
+	assert CountingResult.texts == 1
+	assert outcome.Outcome(FakeDigiROM(2, 1, CountingResult()), ValueError("e")).text() \
+		== "ValueError('e')"
@@ -0,0 +1,116 @@
+'''Tests for punchbag module (saved index).'''
+
+import os
+import pytest
+import target_paths
+from wificom import punchbag
+
+VALID = os.path.join(target_paths.punchbag_data, "valid.txt")
+
+def open_tree(index_filename):
+	'''Open "valid.txt" with the index saved at `index_filename`.'''
+	#pylint: disable=consider-using-with
+	data_file = open(VALID, encoding="UTF-8")
+	return (data_file, punchbag.DigiROM_Tree(data_file, index_filename, os.stat(VALID)))
+
+def texts(tree):
+	'''Texts of the children at the current point.'''
+	return [child.text for child in tree.children()]
+
+def test_index_saved_and_reused(tmp_path):
+	'''Index is written on first use and loaded on the next.'''
+	index_filename = str(tmp_path / "digiroms.idx")
+	(data_file, tree) = open_tree(index_filename)
+	with data_file:
+		expected = texts(tree)
+	assert os.path.exists(index_filename)
+	(data_file, tree) = open_tree(index_filename)
+	with data_file:
+		tree.index()
+		assert tree.index().count > 0
+		assert texts(tree) == expected
+		tree.pick(tree.children()[0])
+		assert "DMOG you win" in texts(tree)
+
+def test_index_stale(tmp_path):
+	'''Index saved for a different source key is rebuilt.'''
+	index_filename = str(tmp_path / "digiroms.idx")
+	with open(VALID, encoding="UTF-8") as data_file:
+		index = punchbag.DigiROM_Index.build(data_file)
+	assert index.save(index_filename, (1, 2))
+	assert punchbag.DigiROM_Index.load(index_filename, (1, 2)) is not None
+	assert punchbag.DigiROM_Index.load(index_filename, (1, 3)) is None
+	(data_file, tree) = open_tree(index_filename)
+	with data_file:
+		assert texts(tree)[-1] == "Data Link 2000pt"
+
+def test_index_corrupt(tmp_path):
+	'''Truncated index is ignored.'''
+	index_filename = tmp_path / "digiroms.idx"
+	index_filename.write_bytes(b"WCIX")
+	assert punchbag.DigiROM_Index.load(str(index_filename), (1, 2)) is None
+
+def test_nothing_here(tmp_path):
+	'''Menu with no children reports the line where it ends.'''
+	data_path = tmp_path / "data.txt"
+	data_path.write_text("A\n\tB\n\t\tV1-0000\n\tC\n# comment\nD\n\tV1-0000\n", encoding="UTF-8")
+	with open(data_path, encoding="UTF-8") as data_file:
+		tree = punchbag.DigiROM_Tree(data_file)
+		tree.pick(tree.children()[0])
+		node_c = tree.children()[1]
+		assert node_c.text == "C"
+		tree.pick(node_c)
+		with pytest.raises(ValueError, match="L6: Nothing here"):
+			tree.children()
+
+def test_no_menu_here():
+	'''Picking a leaf reports its line.'''
+	with open(VALID, encoding="UTF-8") as data_file:
+		tree = punchbag.DigiROM_Tree(data_file)
+		leaf = tree.children()[-1]
+		with pytest.raises(ValueError, match="L47: No menu here"):
+			tree.pick(leaf)
+
+def test_children_window():
+	'''Windows of children match the full list, moving forwards and backwards.'''
+	with open(VALID, encoding="UTF-8") as data_file:
+		tree = punchbag.DigiROM_Tree(data_file)
+		tree.pick(tree.children()[0])
+		expected = texts(tree)
+		assert tree.child_count() == len(expected)
+		for start in list(range(len(expected) + 1)) + [3, 1, 0]:
+			window = [node.text for node in tree.children_window(start, 2)]
+			assert window == expected[start:start + 2]
+		tree.back()
+		assert tree.child_count() == len(texts(tree))
+
+def test_search(tmp_path):
+	'''Search matches word prefixes in titles, ignoring case, and survives saving the index.'''
+	index_filename = str(tmp_path / "digiroms.idx")
+	for _ in range(2):
+		(data_file, tree) = open_tree(index_filename)
+		with data_file:
+			found = tree.search("you WIN")
+			assert [node.text for node in found] == \
+				["DMOG you win", "PenOG you win", "PenX you win", "iC you win"]
+			assert tree.path(found[2]) == ["Classic Punchbags", "Make", "It", "Longer", "PenX you win"]
+			assert tree.digirom(found[0]) == "V1-FC03-FD02"
+			assert [node.text for node in tree.search("pen lo", limit=1)] == ["PenOG you lose"]
+			assert [node.text for node in tree.search("d-scan")] == ["D-Scanner"]
+			assert tree.search("fc03") == []  # digiroms are not indexed
+			assert tree.search("  ") == []
+			assert tree.search("youwin") == []
+
+def test_find():
+	'''Nodes are found by a path of titles, ignoring case, without moving the menu.'''
+	with open(VALID, encoding="UTF-8") as data_file:
+		tree = punchbag.DigiROM_Tree(data_file)
+		node = tree.find(["Classic Punchbags", "make", "It ", "Longer", "PenX you lose"])
+		assert tree.digirom(node) == "X1-0159-4379-2AA9-@41F9"
+		assert tree.depth() == 0
+		assert tree.digirom(tree.find(["Infrared"])) is None
+		missing = ["Classic Punchbags", "Nope"]
+		too_long = ["Classic Punchbags", "DMOG you win", "V1-FC03-FD02"]
+		for titles in (missing, too_long, []):
+			with pytest.raises(ValueError):
+				tree.find(titles)
@@ -0,0 +1,80 @@
+'''Tests for reconnect module.'''
+
+import target_paths  #pylint: disable=unused-import
+from wificom.reconnect import Reconnector, STATE_WIFI, STATE_MQTT
+
+class FakeLink:
+	'''WiFi and MQTT which come back at set times.'''
+	def __init__(self):
+		self.now = 0.0
+		self.wifi_up = True
+		self.wifi_back = 0
+		self.mqtt_back = 0
+		self.calls = []
+	def clock(self):
+		'''Current time.'''
+		return self.now
+	def is_joined(self):
+		'''WiFi state.'''
+		return self.wifi_up
+	def join(self):
+		'''Join WiFi, taking 2 seconds.'''
+		self.calls.append(("wifi", self.now))
+		self.now += 2
+		self.wifi_up = self.now >= self.wifi_back
+		return self.wifi_up
+	def connect(self):
+		'''Connect MQTT, taking 1 second.'''
+		self.calls.append(("mqtt", self.now))
+		self.now += 1
+		if self.now < self.mqtt_back:
+			raise OSError("broker unreachable")
+		return True
+
+def make(link):
+	'''Reconnector for link.'''
+	return Reconnector(link.is_joined, link.join, link.connect, clock=link.clock)
+
+def run_until_connected(reconnector, link, step=0.25):
+	'''Step until connected.'''
+	while not reconnector.step():
+		link.now += step
+
+def test_backoff():
+	'''Failed MQTT attempts back off exponentially.'''
+	link = FakeLink()
+	link.mqtt_back = 20
+	reconnector = make(link)
+	assert reconnector.step()
+	reconnector.lost(OSError("gone"))
+	assert reconnector.state == STATE_MQTT
+	run_until_connected(reconnector, link)
+	starts = [t for (_, t) in link.calls]
+	gaps = [round(b - a) for (a, b) in zip(starts, starts[1:])]
+	assert gaps == [2, 3, 5, 9]
+	assert reconnector.connected
+	assert reconnector.last_recovery == link.now
+	assert "1 outages" in reconnector.stats()
+
+def test_wifi_first():
+	'''If WiFi dropped too, it is rejoined before MQTT.'''
+	link = FakeLink()
+	link.wifi_up = False
+	link.wifi_back = 5
+	reconnector = make(link)
+	reconnector.lost()
+	assert reconnector.state == STATE_WIFI
+	run_until_connected(reconnector, link)
+	assert [name for (name, _) in link.calls] == ["wifi", "wifi", "mqtt"]
+
+def test_lost_twice():
+	'''Reporting the same outage again does not restart it.'''
+	link = FakeLink()
+	link.mqtt_back = 3
+	reconnector = make(link)
+	reconnector.lost()
+	assert not reconnector.step()
+	reconnector.lost()
+	assert reconnector.outages == 1
+	run_until_connected(reconnector, link)
+	assert reconnector.attempts == 2
@@ -0,0 +1,45 @@
+'''Tests for the RTB timeline aggregation tool.'''
+
+import contextlib
+import io
+import json
+import rtb_timelines
+
+def battle(outcome, timeline, user_type="host"):
+	'''A published timeline message, as a line of JSON.'''
+	return json.dumps({"device_uuid": "d", "battle_type": "legendz", "user_type": user_type,
+		"outcome": outcome, "rtb_timeline": timeline})
+
+LINES = [
+	battle("ok", [[0, "scan"], [300, "scanned"], [300, "sent"], [4000, "message"],
+		[9000, "received"], [9000, "comm"], [9800, "comm_ok"]]),
+	'{"device_uuid": "d", "output": "RTB"}',
+	"not json",
+	battle("none", [[0, "scan"], [300, "scanned"], [300, "sent"], [25300, "timeout"]]),
+	battle("none", [[0, "scan"], [200, "scanned"], [200, "sent"], [25200, "timeout"]]),
+	battle("partial", [[0, "message"], [5, "received"], [5, "comm"], [900, "comm_fail"]],
+		user_type="guest"),
+]
+
+def test_aggregate():
+	'''Outcomes, phase times and endings are grouped per battle type and side.'''
+	battles = rtb_timelines.load(LINES)
+	assert len(battles) == 4
+	groups = rtb_timelines.aggregate(battles)
+	host = groups["legendz/host"]
+	assert host["outcomes"] == {"ok": 1, "none": 2}
+	assert host["phases"]["sent>timeout"] == {"n": 2, "p50": 25000, "p95": 25000, "max": 25000}
+	assert host["phases"]["scan>scanned"]["n"] == 3
+	assert host["phases"]["scan>scanned"]["max"] == 300
+	assert host["endings"] == {"sent>timeout": 2}
+	assert groups["legendz/guest"]["endings"] == {"comm>comm_fail": 1}
+
+def test_report():
+	'''The report lists the slowest phases first.'''
+	output = io.StringIO()
+	with contextlib.redirect_stdout(output):
+		rtb_timelines.report(rtb_timelines.aggregate(rtb_timelines.load(LINES)))
+	lines = output.getvalue().splitlines()
+	assert "legendz/host: 3 battles (2 none, 1 ok)" in lines
+	host_start = lines.index("legendz/host: 3 battles (2 none, 1 ok)")
+	assert lines[host_start + 2].split()[0] == "sent>timeout"
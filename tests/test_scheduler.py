@@ -0,0 +1,76 @@
+'''Tests for scheduler module.'''
+
+import target_paths  #pylint: disable=unused-import
+from wificom.scheduler import Scheduler
+
+class FakeClock:
+	'''Clock which only moves when slept or advanced.'''
+	def __init__(self):
+		self.now = 0.0
+		self.sleeps = []
+	def monotonic(self):
+		'''Current time.'''
+		return self.now
+	def sleep(self, seconds):
+		'''Advance time.'''
+		self.sleeps.append(seconds)
+		self.now += seconds
+
+def make_scheduler():
+	'''Make scheduler with fake clock.'''
+	clock = FakeClock()
+	return (clock, Scheduler(clock.monotonic, clock.sleep))
+
+def test_periods():
+	'''Tasks run at their periods, and run returns after stop.'''
+	(clock, scheduler) = make_scheduler()
+	runs = []
+	scheduler.add("a", lambda: runs.append(("a", clock.now)), 1, 0)
+	scheduler.add("b", lambda: runs.append(("b", clock.now)), 2.5, 0.5)
+	def stop():
+		scheduler.stop()
+	scheduler.add("stop", stop, 1, 4.2)
+	scheduler.run()
+	assert runs == [("a", 0), ("b", 0.5), ("a", 1), ("a", 2), ("a", 3), ("b", 3), ("a", 4)]
+	assert clock.now == 4.2
+
+def test_stopped_task():
+	'''Task with no delay stays stopped until scheduled or woken.'''
+	(clock, scheduler) = make_scheduler()
+	runs = []
+	task = scheduler.add("a", lambda: runs.append(clock.now), 5)
+	scheduler.run_once()
+	assert not task.running
+	assert scheduler.next_delay() is None
+	scheduler.schedule(task, 2)
+	clock.now = 2
+	scheduler.run_once()
+	scheduler.cancel(task)
+	clock.now = 7
+	scheduler.run_once()
+	scheduler.wake(task)
+	scheduler.run_once()
+	assert runs == [2, 7]
+
+def test_wake_from_task():
+	'''A task can wake another task, which then runs on the next pass without sleeping.'''
+	(clock, scheduler) = make_scheduler()
+	runs = []
+	handler = scheduler.add("handler", lambda: runs.append(clock.now), 10)
+	scheduler.add("poller", lambda: scheduler.wake(handler), 10, 0)
+	scheduler.run_once()
+	assert scheduler.next_delay() == 0
+	scheduler.run_once()
+	assert runs == [0]
+	assert handler.deadline == 10
+
+def test_lateness():
+	'''Lateness is recorded, and late tasks don't try to catch up.'''
+	(clock, scheduler) = make_scheduler()
+	task = scheduler.add("a", lambda: None, 1, 0)
+	clock.now = 3.5
+	scheduler.run_once()
+	assert task.runs == 1
+	assert task.max_lateness == 3.5
+	assert task.deadline == 4.5
+	assert "a: 1 runs" in scheduler.stats()[0]
@@ -0,0 +1,91 @@
+'''Tests for serial_lines module.'''
+
+import target_paths  #pylint: disable=unused-import
+from wificom.serial_lines import LineReader
+
+class FakeStream:
+	'''Stream with data arriving in chunks.'''
+	def __init__(self):
+		self.data = bytearray()
+		self.reads = 0
+	def feed(self, data):
+		'''Add data as if received.'''
+		self.data.extend(data)
+	@property
+	def in_waiting(self):
+		'''Bytes available.'''
+		return len(self.data)
+	def readinto(self, buf):
+		'''Read up to len(buf) bytes, like usb_cdc.Serial.'''
+		self.reads += 1
+		length = min(len(buf), len(self.data))
+		buf[0:length] = self.data[0:length]
+		del self.data[0:length]
+		return length
+
+def test_line_endings():
+	'''CR, LF, CRLF and NUL all end lines; empty lines are skipped.'''
+	stream = FakeStream()
+	reader = LineReader(stream)
+	stream.feed(b"V1-0000\r\nX1-1111\r\0IC2-2222\n\n  P \n")
+	assert reader.readline() == "V1-0000"
+	assert reader.readline() == "X1-1111"
+	assert reader.readline() == "IC2-2222"
+	assert reader.readline() == "P"
+	assert reader.readline() is None
+
+def test_partial_line():
+	'''Partial line is kept until the rest arrives.'''
+	stream = FakeStream()
+	reader = LineReader(stream)
+	stream.feed(b"V1-FC")
+	assert reader.readline() is None
+	assert reader.pending == 5
+	stream.feed(b"03-FD02\n")
+	assert reader.readline() == "V1-FC03-FD02"
+	assert reader.pending == 0
+
+def test_bulk_read():
+	'''Waiting data is read in bulk, not byte by byte.'''
+	stream = FakeStream()
+	reader = LineReader(stream)
+	stream.feed(b"V2-" + b"0123" * 50 + b"\n")
+	assert reader.readline() == "V2-" + "0123" * 50
+	assert stream.reads == 1
+
+def test_wraparound():
+	'''Lines which wrap around the end of the ring buffer are intact.'''
+	stream = FakeStream()
+	reader = LineReader(stream, size=16)
+	for i in range(20):
+		line = f"V1-{i:04X}-AB"
+		stream.feed(line.encode() + b"\r\n")
+		assert reader.readline() == line
+		assert reader.readline() is None
+
+def test_too_long():
+	'''Line which overflows the buffer is dropped, and the next line is read.'''
+	stream = FakeStream()
+	reader = LineReader(stream, size=16)
+	stream.feed(b"X" * 40 + b"\nV1-0000\n")
+	assert reader.readline() == "V1-0000"
+
+def test_unicode_error():
+	'''Invalid UTF-8 line is dropped.'''
+	stream = FakeStream()
+	reader = LineReader(stream)
+	stream.feed(b"\xff\xfe\nV1-0000\n")
+	assert reader.readline() == "V1-0000"
+
+def test_clear():
+	'''Clear discards buffered and waiting data.'''
+	stream = FakeStream()
+	reader = LineReader(stream, size=16)
+	stream.feed(b"abc")
+	reader.readline()
+	stream.feed(b"x" * 100)
+	reader.clear()
+	assert reader.pending == 0
+	assert stream.in_waiting == 0
+	stream.feed(b"V1-0000\n")
+	assert reader.readline() == "V1-0000"
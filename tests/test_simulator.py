@@ -0,0 +1,443 @@
+'''Tests running the main loops in the host-side simulator.'''
+
+import json
+import os
+import sys
+import target_paths
+from simulator import Simulator, SECRETS
+
+#pylint: disable=import-outside-toplevel
+
+def test_wifi_digirom():
+	'''WiFi mode: digirom from MQTT is executed and results are published.'''
+	with Simulator() as sim:
+		modes = sim.module("modes")
+		sim.toy.respond("V1-FC03-FD02", ["FC03", "FD02"])
+		sim.send_command("V1-FC03-FD02", at=8)
+		assert sim.run(modes.MODE_WIFI, duration=20) == "end"
+		assert sim.crash_log() is None
+		executions = sim.executions_of("V1-FC03-FD02")
+		assert len(executions) >= 2
+		assert executions[0][2] == "s:FC03 r:FC03 s:FD02 r:FD02"
+		# Turn 1 delay is 3 seconds by default
+		assert 11 < executions[0][0] < 12.5
+		results = [msg for (t, msg) in sim.outputs() if msg["output"] == executions[0][2]]
+		assert results[0]["application_uuid"] == "sim-app"
+		assert results[0]["device_uuid"] == "sim-device"
+
+def test_result_outcome():
+	'''WiFi mode: the outcome code drives beeps, the screen and the published results.'''
+	with Simulator() as sim:
+		sim.toy.respond("V2-FC03-FD02", ["FC03"])
+		sim.send_command("V1-FC03-FD02", at=8)
+		sim.send_command("V2-FC03-FD02", at=14)
+		sim.probe(sim.module("ui").UserInterface, "beep_error", "error")
+		sim.probe(sim.module("ui").UserInterface, "beep_ready", "ready")
+		sim.run(sim.module("modes").MODE_WIFI, duration=20)
+		outcomes = {msg["output"]: msg["outcome"] for (t, msg) in sim.outputs()
+			if msg.get("outcome") is not None}
+		assert outcomes == {"s:FC03": "none", "r:FC03 s:FC03": "partial"}
+		assert len(sim.probed("error")) == 1
+		assert [start for (start, *_) in sim.probed("ready") if start > 8] == []
+		assert sim.display.rows()[0] == "WiFi ~"
+		assert sim.main.throughput.outcomes == {"partial": 1}
+
+def test_wifi_cbor():
+	'''WiFi mode: a CBOR command switches replies to CBOR; JSON is still accepted.'''
+	with Simulator() as sim:
+		modes = sim.module("modes")
+		sim.toy.respond("V1-FC03-FD02", ["FC03", "FD02"])
+		sim.send_cbor({"digirom": "V1-FC03-FD02", "application_id": "app-cbor",
+			"api_response": False, "encoding": "cbor", "ack_id": 5}, at=8)
+		sim.send_command("V1-0000-0000", at=25, application_id="app-json")
+		sim.run(modes.MODE_WIFI, duration=30)
+		assert sim.crash_log() is None
+		assert len(sim.executions_of("V1-FC03-FD02")) >= 1
+		assert len(sim.executions_of("V1-0000-0000")) >= 1
+		published = [message for (t, message) in sim.broker.messages(sim.topic_output) if t > 8]
+		assert published
+		assert all(isinstance(message, bytes) and message[0:1] != b"{" for message in published)
+		outputs = [msg for (t, msg) in sim.outputs() if t > 8]
+		assert {"application_uuid": None, "device_uuid": "sim-device", "ack_id": 5} in outputs
+		assert any(msg.get("application_uuid") == "app-json" for msg in outputs)
+
+def test_wifi_delta_heartbeats():
+	'''WiFi mode: with delta heartbeats, unchanged status is sent as a keepalive.'''
+	with Simulator() as sim:
+		sim.write_file("config.json", json.dumps({"delta_heartbeats": True, "heartbeat_time": 2}))
+		modes = sim.module("modes")
+		sim.toy.respond("V1-FC03-FD02", ["FC03", "FD02"])
+		sim.send_command("V1-FC03-FD02", at=15, api_response=True)
+		sim.run(modes.MODE_WIFI, duration=35)
+		assert sim.crash_log() is None
+		outputs = sim.outputs()
+		idle = [msg for (t, msg) in outputs if t < 15]
+		assert idle[0]["output"] == "None"
+		assert idle[1:] == [{"device_uuid": "sim-device"}] * len(idle[1:])
+		assert 3 <= len(idle) <= 6
+		looping = [msg for (t, msg) in outputs if t > 18]
+		results = [msg for msg in looping if "output" in msg]
+		assert len(results) == 1
+		assert results[0]["output"] == "s:FC03 r:FC03 s:FD02 r:FD02"
+		# Same result every 5 seconds: sent once, then keepalives
+		assert looping[0] == results[0]
+		assert looping[1:] == [{"device_uuid": "sim-device"}] * (len(looping) - 1)
+		assert len(looping) == len(sim.executions_of("V1-FC03-FD02"))
+
+def test_wifi_outage():
+	'''WiFi mode: after an outage, reconnects without rebooting, keeping the digirom.'''
+	with Simulator() as sim:
+		modes = sim.module("modes")
+		sim.toy.respond("V1-FC03-FD02", ["FC03", "FD02"])
+		sim.send_command("V1-FC03-FD02", at=8)
+		sim.outage(at=20, duration=10, wifi=True)
+		assert sim.run(modes.MODE_WIFI, duration=45) == "end"
+		assert sim.crash_log() is None
+		executions = sim.executions_of("V1-FC03-FD02")
+		during = [start for (start, _, _) in executions if 20 <= start < 30]
+		assert during
+		# Result from during the outage is published once reconnected
+		result_times = [t for (t, msg) in sim.outputs() if msg.get("output") == executions[0][2]]
+		assert any(t > 30 for t in result_times)
+		assert len(result_times) == len(executions)
+		assert executions[-1][0] > 40
+
+def test_wifi_reenter():
+	'''WiFi mode: leaving and coming back reconnects without rebooting.'''
+	with Simulator() as sim:
+		modes = sim.module("modes")
+		sim.buttons.press("C", at=10, duration=0.5)
+		sim.buttons.press("B", at=12)  # WiFi
+		sim.send_command("V1-FC03-FD02", at=20)
+		assert sim.run(modes.MODE_WIFI, duration=30) == "end"
+		assert sim.crash_log() is None
+		assert sim.module("wifi_picow").wifi.radio.connects == 1
+		assert len(sim.executions_of("V1-FC03-FD02")) >= 1
+
+def test_wifi_network_choice():
+	'''WiFi: one scan picks the strongest configured network, which is tried first next time.'''
+	from simulator.network import Network
+	secrets = dict(SECRETS)
+	secrets["wireless_networks"] = [
+		{"ssid": "Weak", "password": "pw1"},
+		{"ssid": "Strong", "password": "pw2"},
+	]
+	with Simulator(secrets=secrets) as sim:
+		sim.networks = [Network("Other", "x", rssi=-40), Network("Weak", "pw1", rssi=-80),
+			Network("Strong", "pw2", rssi=-50, channel=11, bssid=b"\x02\x00\x00\x00\x00\x02")]
+		sim.run(sim.module("modes").MODE_WIFI, duration=8)
+		radio = sim.module("wifi_picow").wifi.radio
+		assert (radio.ssid, radio.channel, radio.scans, radio.connects) == ("Strong", 11, 1, 1)
+		wifi_connection = sim.main.wifi_connection
+		assert set(wifi_connection.timings) == {"hint", "scan", "connect", "client"}
+		radio.disconnect()
+		assert wifi_connection.join()
+		assert (radio.ssid, radio.scans, radio.connects) == ("Strong", 1, 2)
+		# Hint no longer valid
+		sim.networks[2].channel = 6
+		radio.disconnect()
+		assert wifi_connection.join()
+		assert (radio.ssid, radio.channel, radio.scans, radio.connects) == ("Strong", 6, 2, 4)
+
+def test_status_display_incremental():
+	'''WiFi mode: the status screen is shown once, then only changed rows are updated.'''
+	with Simulator() as sim:
+		sim.send_command("V1-FC03-FD02", at=8)
+		sim.run(sim.module("modes").MODE_WIFI, duration=20)
+		shown = [rows for (_, rows) in sim.display.history if rows[0] == "WiFi"]
+		assert len(shown) == 1
+		assert sim.display.rows() == ["WiFi -", "Hold C to exit", "V1: wait for start"]
+		ui = sim.main.ui
+		labels = list(sim.display.root_group)
+		assert not ui.update_rows(sim.display.rows())
+		assert ui.update_rows(["WiFi", "Hold C to exit", "Paused"])
+		assert list(sim.display.root_group) == labels
+		assert ui.update_rows(["WiFi", "Paused"])
+		assert sim.display.rows() == ["WiFi", "Paused"]
+		ui.display_text("Other")
+		assert ui.update_rows(["WiFi", "Paused"])
+		assert sim.display.rows() == ["WiFi", "Paused"]
+
+def test_wifi_exit():
+	'''WiFi mode: holding C goes back to the menu.'''
+	with Simulator() as sim:
+		modes = sim.module("modes")
+		sim.buttons.press("C", at=10, duration=0.5)
+		sim.run(modes.MODE_WIFI, duration=12)
+		assert sim.display.rows()[0] == "> WiFi"
+
+def test_serial_digirom():
+	'''Serial mode: digirom from serial is executed every 5 seconds.'''
+	with Simulator(secrets=False) as sim:
+		modes = sim.module("modes")
+		sim.toy.respond("X2-0069-2169-8009", ["0159", "4379"])
+		sim.serial.feed("X2-0069-2169-8009\r\n", at=1)
+		sim.run(modes.MODE_SERIAL, duration=13)
+		executions = sim.executions_of("X2-0069-2169-8009")
+		assert len(executions) == 3
+		assert executions[0][2] == "r:0159 s:0069 r:4379 s:2169"
+		assert 2 <= executions[0][0] < 2.5
+		assert 4.9 < executions[1][0] - executions[0][0] < 5.1
+
+def test_digirom_cache():
+	'''Serial mode: a repeated command is parsed once.'''
+	with Simulator(secrets=False) as sim:
+		sim.toy.respond("V1-FC03-FD02", ["FC03", "FD02"])
+		sim.probe(sys.modules["dmcomm.protocol"], "parse_command", "parse")
+		sim.serial.feed("V1-FC03-FD02\r\n", at=1)
+		sim.serial.feed("I\r\n", at=3)
+		sim.serial.feed("V1-FC03-FD02\r\n", at=5)
+		sim.run(sim.module("modes").MODE_SERIAL, duration=16)
+		assert len(sim.executions_of("V1-FC03-FD02")) >= 2
+		assert [args[0] for (_, _, _, args, _) in sim.probed("parse")] == ["V1-FC03-FD02", "I"]
+		assert sim.module("digirom_cache").stats() == {"size": 2, "hits": 1, "misses": 2}
+
+def test_serial_loop_timing():
+	'''Serial mode: loop time per signal type, burst after complete exchanges, early wakeup.'''
+	with Simulator(secrets=False) as sim:
+		sim.write_file("config.json", json.dumps({"burst": True, "signal_loop_times": {"X": 2}}))
+		sim.toy.respond("V2-FC03-FD02", ["FC03", "FD02"])
+		sim.serial.feed("V2-FC03-FD02\r\n", at=1)
+		sim.serial.feed("X2-0069\r\n", at=5)
+		sim.serial.feed("V2-FC03\r\n", at=9.1)
+		sim.run(sim.module("modes").MODE_SERIAL, duration=12)
+		bursts = sim.executions_of("V2-FC03-FD02")
+		assert len(bursts) >= 5
+		assert all(later[0] - earlier[1] < 0.5 for (earlier, later) in zip(bursts, bursts[1:]))
+		no_reply = [start for (start, _, _) in sim.executions_of("X2-0069")]
+		assert len(no_reply) == 2 and 2 <= no_reply[1] - no_reply[0] < 2.1
+		# Picked up without waiting for the next execution at about 10.9
+		assert sim.executions_of("V2-FC03")[0][0] < 10.8
+		assert sim.main.throughput.executions == 1
+
+def test_lazy_imports():
+	'''Serial mode doesn't import WiFi or punchbag modules; the boot profile can be logged.'''
+	with Simulator(secrets=False) as sim:
+		sim.write_file("config.json", json.dumps({"log_boot_profile": True}))
+		sim.toy.respond("V1-FC03-FD02", ["FC03", "FD02"])
+		sim.serial.feed("V1-FC03-FD02\r\n", at=1)
+		sim.run(sim.module("modes").MODE_SERIAL, duration=8)
+		assert len(sim.executions_of("V1-FC03-FD02")) == 1
+		for name in ("mqtt", "realtime", "punchbag", "wifi_picow", "scheduler", "import_secrets"):
+			assert "wificom." + name not in sys.modules
+		profile = sim.read_file("boot_profile.txt").splitlines()
+		assert profile[0].startswith("Boot extra power pins:")
+		assert profile[-1].startswith("Boot total:")
+
+def test_heap_metrics():
+	'''Heap metrics are in the I command output, heartbeats and the crash log.'''
+	with Simulator() as sim:
+		sim.send_command("I", at=8)
+		sim.send_command("V1-FC03-FD02", at=12)
+		def crash(rom, do_led=True, do_beep=True):
+			raise RuntimeError("crash for test")
+		sim.main.execute_digirom = crash
+		sim.run(sim.module("modes").MODE_WIFI, duration=20)
+		outputs = [msg for (t, msg) in sim.outputs()]
+		assert outputs[0]["heap"]["free"] > 0
+		info = [msg["output"] for msg in outputs if "heap_free" in str(msg.get("output"))]
+		assert "heap_min_free = " in info[0]
+		assert [msg["heap"] for msg in outputs if msg.get("output") == info[0]] == [None]
+		log = sim.crash_log()
+		assert "RuntimeError: crash for test" in log
+		assert "Heap samples (time mode free largest gcs):" in log
+		assert log.rstrip().splitlines()[-1].split()[1] == "w"
+
+def test_interaction_stats():
+	'''WiFi mode: outcomes are counted per signal type, reported by I and saved on exit.'''
+	with Simulator() as sim:
+		sim.toy.respond("V1-FC03-FD02", ["FC03", "FD02"])
+		sim.send_command("V1-FC03-FD02", at=8)
+		sim.send_command("I", at=19)
+		sim.buttons.press("C", at=22, duration=0.5)
+		sim.run(sim.module("modes").MODE_WIFI, duration=24)
+		info = [msg["output"] for (t, msg) in sim.outputs() if "stats_columns" in msg["output"]]
+		assert 'stats."sig:V" = [2, 0, 0, 0]' in info[0].split("\r\n")
+		assert json.loads(sim.read_file("stats.json")) == {"sig:V": [2, 0, 0, 0]}
+
+def test_log_command():
+	'''WiFi mode: the log buffer is sent for the "!" command; warnings are written on exit.'''
+	with Simulator() as sim:
+		sim.send_command("!", at=8)
+		sim.send_command("!w", at=9)
+		sim.buttons.press("C", at=12, duration=0.5)
+		sim.run(sim.module("modes").MODE_WIFI, duration=14)
+		dumps = [msg["output"].split("\r\n") for (t, msg) in sim.outputs()
+			if msg["output"].startswith("Log: ")]
+		assert any(line.endswith(" I Running WiFi") for line in dumps[0])
+		assert not any(" I " in line for line in dumps[1])
+		assert "W config.json not found" in sim.read_file(sim.main.LOG_FILENAME)
+		assert sim.crash_log() is None
+
+def test_console_verbosity():
+	'''WiFi mode: console output follows the verbosity setting and never waits for the host.'''
+	for (verbosity, accept) in ((0, None), (2, None), (1, 0)):
+		with Simulator() as sim:
+			sim.write_file("config.json", json.dumps({"verbosity": verbosity}))
+			sim.send_command("V1-FC03-FD02", at=8)
+			sim.serial.accept = accept
+			sim.buttons.press("C", at=20, duration=0.5)
+			sim.run(sim.module("modes").MODE_WIFI, duration=22)
+			output = sim.serial.output.decode()
+			assert ("Received new DigiROM" in output) == (verbosity == 2)
+			assert ('Message: ' in output and 'V1-FC03-FD02' in output) == (verbosity == 2)
+			assert len(sim.executions_of("V1-FC03-FD02")) == 2
+			if accept == 0:
+				console_stats = [line for line in sim.module("log").lines() if "Console: " in line]
+				assert " 0 bytes;" in console_stats[0]
+
+def test_rtb_guest_timeline():
+	'''WiFi mode: a RTB guest publishes the timeline of each battle as it ends.'''
+	with Simulator() as sim:
+		sim.send_command(None, at=8, topic_action="subscribe", topic="rtb-sim", user_type="guest",
+			host="sim-host", battle_type="digimon-penx-battle")
+		message = {"application_id": 1, "user_type": "host",
+			"output": "X2-0069-2169-8009-@4^3^F9"}
+		sim.toy.respond(message["output"], ["0069", "2169", "8009"])
+		sim.broker.publish("sim-host/f/rtb-sim", json.dumps(message), at=12)
+		sim.run(sim.module("modes").MODE_WIFI, duration=16)
+		assert sim.crash_log() is None
+		timelines = [msg for (t, msg) in sim.outputs() if "rtb_timeline" in msg]
+		assert len(timelines) == 1
+		assert timelines[0]["battle_type"] == "digimon-penx-battle"
+		assert timelines[0]["user_type"] == "guest"
+		assert timelines[0]["outcome"] == "partial"
+		events = [event for (_, event) in timelines[0]["rtb_timeline"]]
+		assert events == ["message", "received", "comm", "comm_fail"]
+		times = [ms for (ms, _) in timelines[0]["rtb_timeline"]]
+		assert times == sorted(times) and times[-1] >= 100  # the execution takes virtual time
+		assert sim.main.stats_store.counts("rtb:digimon-penx-battle") == [0, 1, 0, 0]
+
+def test_rtb_host_timeline():
+	'''RTB host: the timeline follows the scan, the wait and each attempt at the second comm.'''
+	with Simulator() as sim:
+		realtime = sim.module("realtime")
+		ended = []
+		replies = []
+		def execute(digirom, do_led, do_beep):  #pylint: disable=unused-argument
+			digirom.prepare()
+			sim.clock.advance(0.5)
+		class Host(realtime.RealTimeHost):  #pylint: disable=missing-class-docstring
+			scan_str = "V2"
+			wait_min = 2
+			wait_max = 10
+			max_attempts = 2
+			retry_delay = 1
+			def scan_successful(self):  #pylint: disable=missing-function-docstring
+				return True
+			def message(self):  #pylint: disable=missing-function-docstring
+				return "V1-0000"
+			def matched(self, rom_str):  #pylint: disable=missing-function-docstring
+				return rom_str.startswith("V1-")
+			def comm_successful(self):  #pylint: disable=missing-function-docstring
+				return False
+		host = Host(execute, lambda message: None, lambda: replies.pop() if replies else None,
+			lambda status, changed: None,
+			lambda code, timeline: ended.append((code, timeline.items())))
+		host.loop()  # scan and send
+		sim.clock.advance(1)
+		replies.append("V1-1234")
+		host.loop()  # message arrives, but too soon to use
+		sim.clock.advance(2)
+		host.loop()  # first attempt
+		sim.clock.advance(1)
+		host.loop()  # second attempt, then give up
+		assert [code for (code, _) in ended] == ["partial"]
+		assert ended[0][1] == [[0, "scan"], [500, "scanned"], [500, "sent"], [1500, "message"],
+			[3500, "received"], [3500, "comm"], [4000, "comm_fail"],
+			[5000, "comm"], [5500, "comm_fail"]]
+		assert len(host.timeline) == 0
+		host.loop()  # next battle
+		sim.clock.advance(11)
+		host.loop()
+		assert ended[1] == ("none", [[0, "scan"], [500, "scanned"], [500, "sent"],
+			[11500, "timeout"]])
+
+def test_menu_events():
+	'''Menu: moves on button events, idles between scans, pages after a long press.'''
+	with Simulator() as sim:
+		sim.buttons.press("A", at=1)
+		sim.buttons.press("C", at=2)
+		sim.run(sim.module("modes").MODE_MENU, duration=5)
+		assert sim.display.rows()[0] == "> Serial"
+		assert sim.buttons.reads < 3000  # busy-waiting would read every 1ms
+		ui = sim.module("ui")
+		buttons = sim.module("buttons")
+		results = [None, 1] + [2] * 8
+		menu = ui.Menu(10, lambda start, count: [(str(i), results[i])
+			for i in range(start, min(start + count, 10))], None)
+		assert menu.handle(("B", buttons.PRESS)) == ui.MENU_ERROR
+		assert menu.handle(("A", buttons.PRESS)) == ui.MENU_MOVE
+		assert menu.handle(("B", buttons.PRESS)) == ui.MENU_ACTIVATE
+		assert menu.handle(("A", buttons.REPEAT)) == ui.MENU_MOVE
+		assert menu.selection == 2
+		assert menu.handle(("A", buttons.LONG_PRESS)) is None
+		menu.handle(("A", buttons.REPEAT))
+		assert menu.selection == 6
+		menu.handle(("A", buttons.REPEAT))
+		menu.handle(("A", buttons.REPEAT))
+		assert menu.selection == 0
+		assert menu.rows() == ["> 0", "  1", "  2", "  ..."]
+		# Holding C pages backwards; a short press of C cancels (not allowed here)
+		assert menu.handle(("C", buttons.PRESS)) is None
+		assert menu.handle(("C", buttons.REPEAT)) == ui.MENU_MOVE
+		assert menu.selection == 9
+		assert menu.rows() == ["> 9", "", "", ""]
+		menu.handle(("C", buttons.LONG_PRESS))
+		assert menu.selection == 5
+		assert menu.handle(("C", buttons.RELEASE)) is None
+		menu.handle(("C", buttons.PRESS))
+		assert menu.handle(("C", buttons.RELEASE)) == ui.MENU_ERROR
+		assert menu.handle(("C", buttons.RELEASE)) is None
+
+def test_punchbag_large_menu():
+	'''Punchbag mode: holding C on the first of many options pages back to the last.'''
+	digiroms = "".join(f"Item {i}\n\tV1-{i:04X}\n" for i in range(200))
+	with Simulator(secrets=False, digiroms=digiroms) as sim:
+		sim.buttons.press("C", at=1, duration=0.6)
+		sim.buttons.press("B", at=2.5)
+		sim.run(sim.module("modes").MODE_PUNCHBAG, duration=5)
+		assert sim.crash_log() is None
+		assert sim.display.rows()[:2] == ["Punchbag -", "Item 199"]
+		assert len(sim.executions_of("V1-00C7")) == 1
+
+def test_punchbag_search():
+	'''Punchbag titles can be searched over MQTT, which saves the index for next time.'''
+	with open(os.path.join(target_paths.punchbag_data, "valid.txt"), encoding="UTF-8") as f:
+		digiroms = f.read()
+	with Simulator(digiroms=digiroms) as sim:
+		sim.send_command("?penx WIN", at=8)
+		sim.send_command("?nothing", at=9)
+		sim.run(sim.module("modes").MODE_WIFI, duration=12)
+		outputs = [msg["output"] for (t, msg) in sim.outputs() if t >= 8]
+		assert "Classic Punchbags/Make/It/Longer/PenX you win: X1-0159-4379-2E49-@4009" in outputs
+		assert "No match: nothing" in outputs
+		assert os.path.exists(os.path.join(sim.drive, sim.main.DIGIROMS_INDEX_FILENAME))
+
+def test_punchbag_path():
+	'''A punchbag digirom can be run by its path over serial; unknown paths are errors.'''
+	with open(os.path.join(target_paths.punchbag_data, "valid.txt"), encoding="UTF-8") as f:
+		digiroms = f.read()
+	with Simulator(secrets=False, digiroms=digiroms) as sim:
+		sim.toy.respond("V1-FC03-FD02", ["FC03", "FD02"])
+		sim.serial.feed("/classic punchbags/DMOG YOU WIN\r\n", at=1)
+		sim.serial.feed("/Classic Punchbags/Missing\r\n", at=4)
+		sim.run(sim.module("modes").MODE_SERIAL, duration=6)
+		assert len(sim.executions_of("V1-FC03-FD02")) == 1
+		assert sim.display.rows()[-1] == "Paused"
+
+def test_punchbag():
+	'''Punchbag mode: pick a digirom from the menu and run it.'''
+	with open(os.path.join(target_paths.punchbag_data, "valid.txt"), encoding="UTF-8") as f:
+		digiroms = f.read()
+	with Simulator(secrets=False, digiroms=digiroms) as sim:
+		modes = sim.module("modes")
+		sim.buttons.press("B", at=1)  # Classic Punchbags
+		sim.buttons.press("A", at=2)  # DMOG you lose
+		sim.buttons.press("B", at=3)
+		sim.run(modes.MODE_PUNCHBAG, duration=10)
+		assert sim.crash_log() is None
+		assert len(sim.executions_of("V1-FC03-FE01")) >= 1
+		assert sim.display.rows()[:2] == ["Punchbag -", "DMOG you lose"]
+		count = len(sim.executions_of("V1-FC03-FE01"))
+		assert sim.main.stats_store.counts("bag:DMOG you lose") == [0, 0, count, 0]
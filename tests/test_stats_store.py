@@ -0,0 +1,63 @@
+'''Tests for stats_store module.'''
+
+import json
+import types
+import target_paths  #pylint: disable=unused-import
+from wificom import outcome
+from wificom import stats_store
+from wificom.stats_store import StatsStore
+
+def test_record_and_flush(tmp_path):
+	'''Counts are written when changed, at most once per interval unless forced, and reloaded.'''
+	filepath = str(tmp_path / "stats.json")
+	clock = types.SimpleNamespace(now=0)
+	store = StatsStore(filepath, 10, lambda: clock.now)
+	assert not store.flush(force=True)  # Nothing to write
+	store.record("sig:V", outcome.COMPLETE)
+	store.record("sig:V", outcome.NO_REPLY)
+	store.record('bag:Say "hi"', outcome.ERROR)
+	assert store.counts("sig:V") == [1, 0, 1, 0]
+	assert not store.flush()
+	clock.now = 10
+	assert store.flush()
+	store.record("sig:V", outcome.PARTIAL)
+	assert not store.flush()
+	assert store.flush(force=True)
+	assert store.writes == 2
+	with open(filepath, encoding="utf-8") as json_file:
+		assert json.load(json_file)["sig:V"] == [1, 1, 1, 0]
+	loaded = StatsStore(filepath)
+	assert loaded.error is None
+	assert loaded.items() == store.items()
+	assert 'stats."bag:Say \\"hi\\"" = [0, 0, 0, 1]' in loaded.toml().split("\r\n")
+	assert loaded.stats() == "2 keys, 1 ok, 1 partial, 1 none, 1 error; 0 writes"
+
+def test_table_full():
+	'''Keys past MAX_KEYS are dropped; long keys are cut.'''
+	store = StatsStore()
+	for i in range(stats_store.MAX_KEYS + 2):
+		store.record(f"key {i}", outcome.COMPLETE)
+	assert (len(store), store.dropped) == (stats_store.MAX_KEYS, 2)
+	long_key = "x" * (stats_store.MAX_KEY_LENGTH + 5)
+	store.clear()
+	store.record(long_key, outcome.COMPLETE)
+	assert store.items() == [("x" * stats_store.MAX_KEY_LENGTH, [1, 0, 0, 0])]
+	assert not store.flush(force=True)  # No file
+
+def test_bad_files(tmp_path):
+	'''A corrupt file is replaced; after a failed write, no more writes are tried.'''
+	filepath = tmp_path / "stats.json"
+	filepath.write_text('{"sig:V": [1, "x"]}', encoding="utf-8")
+	store = StatsStore(str(filepath))
+	assert store.error.startswith("Error in")
+	assert len(store) == 0
+	assert store.flush(force=True)
+	assert json.loads(filepath.read_text(encoding="utf-8")) == {}
+	store = StatsStore(str(tmp_path / "missing" / "stats.json"))
+	assert store.error is None
+	store.record("sig:V", outcome.COMPLETE)
+	assert not store.flush(force=True)
+	assert store.error.startswith("Can't save stats")
+	store.record("sig:V", outcome.COMPLETE)
+	assert not store.flush(force=True)
+	assert store.writes == 0
@@ -0,0 +1,22 @@
+'''Tests for throughput module.'''
+
+import types
+import target_paths  #pylint: disable=unused-import
+from wificom import outcome
+from wificom.throughput import Throughput
+
+def test_counts_and_rate():
+	'''Executions per minute run from the reset to the latest execution.'''
+	clock = types.SimpleNamespace(now=10.0)
+	throughput = Throughput(lambda: clock.now)
+	assert throughput.per_minute() == 0
+	for code in (outcome.COMPLETE, outcome.PARTIAL, outcome.COMPLETE, None):
+		clock.now += 1.5
+		throughput.record(code)
+	assert (throughput.executions, throughput.complete) == (4, 2)
+	assert throughput.outcomes == {outcome.COMPLETE: 2, outcome.PARTIAL: 1}
+	assert throughput.per_minute() == 40
+	assert throughput.stats() == "Executions: 4 (2 complete), 40.0/min"
+	assert "executions_partial = 1" in throughput.toml()
+	throughput.reset()
+	assert "executions = 0" in throughput.toml()
@@ -0,0 +1,82 @@
+'''Tests for wire module.'''
+
+import collections
+import json
+import pytest
+import target_paths  #pylint: disable=unused-import
+from wificom import wire
+from wificom.wire import JSONTemplate
+
+def make_fixed():
+	'''Fixed fields like the version info.'''
+	fixed = collections.OrderedDict()
+	fixed["name"] = "wificom"
+	fixed["version"] = "source"
+	fixed["has_display"] = True
+	fixed["device_uuid"] = "abc"
+	return fixed
+
+def test_render_matches_json():
+	'''Rendered message is the same JSON as dumping the whole dictionary.'''
+	template = JSONTemplate(make_fixed(), ["application_uuid", "output"])
+	for (app_id, output) in [(None, "None"), ("app-1", 's:FC03 r:"FD02"\n'), (12, "None")]:
+		expected = make_fixed()
+		expected["application_uuid"] = app_id
+		expected["output"] = output
+		rendered = template.render(app_id, output)
+		assert isinstance(rendered, bytes)
+		assert json.loads(rendered) == expected
+		assert list(json.loads(rendered, object_pairs_hook=collections.OrderedDict)) == list(expected)
+
+def test_grow():
+	'''Output longer than the buffer still renders.'''
+	template = JSONTemplate(make_fixed(), ["output"], size=16)
+	output = "r:" + "AB" * 500
+	assert json.loads(template.render(output))["output"] == output
+	assert json.loads(template.render("short"))["output"] == "short"
+
+def test_no_fixed_fields():
+	'''Template with only variable fields.'''
+	template = JSONTemplate({}, ["a", "b"])
+	assert json.loads(template.render(1, [2])) == {"a": 1, "b": [2]}
+
+def test_cbor_round_trip():
+	'''CBOR encodes and decodes the types used in messages, with compact keys.'''
+	message = {
+		"digirom": "V1-FC03-FD02",
+		"application_id": "app-1",
+		"api_response": False,
+		"ack_id": 123456,
+		"unknown_key": [None, True, -1, -300, 2 ** 40, 1.5, b"\x01\x02", "é" * 30],
+	}
+	encoded = wire.cbor_dumps(message)
+	assert wire.cbor_loads(encoded) == message
+	# Known keys are single bytes
+	assert b"digirom" not in encoded
+	assert b"unknown_key" in encoded
+
+def test_cbor_errors():
+	'''Invalid CBOR raises ValueError.'''
+	encoded = wire.cbor_dumps({"digirom": "V1-FC03"})
+	for data in (encoded[:-1], encoded + b"\x00", b"\xff", b"\xbf"):
+		with pytest.raises(ValueError):
+			wire.cbor_loads(data)
+
+def test_decode_sniffs_encoding():
+	'''decode accepts JSON as str or bytes, and CBOR.'''
+	message = {"digirom": None, "api_response": True}
+	assert wire.decode(json.dumps(message)) == message
+	assert wire.decode(bytearray(b" " + json.dumps(message).encode())) == message
+	assert wire.decode(wire.encode(message, wire.CBOR)) == message
+	assert not wire.is_json(wire.encode(message, wire.CBOR))
+
+def test_cbor_template():
+	'''CBOR template renders the same map as encoding the whole dictionary.'''
+	template = wire.CBORTemplate(make_fixed(), ["application_uuid", "output"])
+	for (app_id, output) in [(None, "None"), ("app-1", "r:" + "AB" * 200), ("app-1", "None")]:
+		expected = make_fixed()
+		expected["application_uuid"] = app_id
+		expected["output"] = output
+		rendered = template.render(app_id, output)
+		assert rendered == wire.cbor_dumps(expected)
+		assert wire.decode(rendered) == expected